@@ -0,0 +1,41 @@
+"""
+The whole run.py flow for one station, without downloading
+"""
+import os
+
+from .common import clear_processed, prepare_workdir, scales, synthetic_icao
+
+stations = ['SBGR'] + [synthetic_icao(scale) for scale in scales]
+
+
+class EndToEnd:
+    # cold: nothing processed nor rendered; warm: processed data, aggregates and figures are up to date
+    params = [stations, ['cold', 'warm']]
+    param_names = ['station', 'state']
+    timeout = 3600
+    number = 1
+    repeat = 1
+    warmup_time = 0
+
+    def setup(self, station, state):
+        self.workdir = prepare_workdir()
+        import matplotlib
+        matplotlib.use('Agg')
+        import run
+        self.run = run
+        clear_processed(station)
+        if state == 'warm':
+            self.run_station(station)
+
+    def run_station(self, station):
+        try:
+            self.run.main([station, '--offline', '--workers', '1', '--render-workers', '1',
+                           '--root', str(self.workdir)])
+        finally:
+            os.chdir(self.workdir)
+
+    def time_run(self, station, state):
+        self.run_station(station)
+
+    def peakmem_run(self, station, state):
+        self.run_station(station)
@@ -0,0 +1,86 @@
+"""
+Decoding raw ISD groups into the processed columns
+"""
+import pandas as pd
+
+from .common import fixture_year, prepare_workdir, scales, synthetic_icao
+
+
+class ExtractData:
+    params = [scales]
+    param_names = ['scale']
+    timeout = 1200
+    number = 1
+    repeat = 3
+    warmup_time = 0
+
+    def setup(self, scale):
+        prepare_workdir()
+        from d01_data.get_data import GetIsdData
+        icao = synthetic_icao(scale)
+        self.isd = GetIsdData(icao)
+        self.raw = pd.read_csv(f'{self.isd.raw_path}/{fixture_year}.csv', index_col='DATE', dtype=str)
+
+    def time_extract_data(self, scale):
+        self.isd.extract_data(self.raw)
+
+    def peakmem_extract_data(self, scale):
+        self.isd.extract_data(self.raw)
+
+
+class ExtractArchived:
+    """
+    Extracting a station again with other cleaning rules, from the raw CSV files and from the raw archive
+    """
+    params = [scales]
+    param_names = ['scale']
+    timeout = 1200
+    number = 1
+    repeat = 3
+    warmup_time = 0
+
+    def setup(self, scale):
+        prepare_workdir()
+        from d01_data.decode_isd import IsdDecoder
+        from d01_data.get_data import GetIsdData
+        icao = synthetic_icao(scale)
+        decoder = IsdDecoder(visibility_cap=5000)
+        self.csv = GetIsdData(icao, decoder=decoder)
+        self.archived = GetIsdData(icao, decoder=decoder, archive=True)
+        # The archive is created once, outside of the timings
+        for _ in self.archived.stream_data(columns=['visibility']):
+            pass
+
+    def time_extract_csv(self, scale):
+        for _ in self.csv.stream_data():
+            pass
+
+    def time_extract_archived(self, scale):
+        for _ in self.archived.stream_data():
+            pass
+
+    def time_extract_archived_column(self, scale):
+        for _ in self.archived.stream_data(columns=['visibility']):
+            pass
+
+
+class ParseMetar:
+    """
+    Parsing the METAR messages of the REM column into the MetarParser columns
+    """
+    params = [scales]
+    param_names = ['scale']
+    timeout = 1200
+    number = 1
+    repeat = 3
+    warmup_time = 0
+
+    def setup(self, scale):
+        prepare_workdir()
+        from d01_data.get_data import GetIsdData
+        icao = synthetic_icao(scale)
+        self.remarks = pd.read_csv(f'{GetIsdData(icao).raw_path}/{fixture_year}.csv', usecols=['REM'], dtype=str)['REM']
+
+    def time_parse_metar(self, scale):
+        from d01_data.decode_isd import MetarParser
+        MetarParser(self.remarks).parse()
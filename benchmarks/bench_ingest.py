@@ -0,0 +1,50 @@
+"""
+Reading the raw ISD files: the legacy unify_files and the cached, chunked load_processed
+"""
+from .common import clear_processed, prepare_workdir, scales, synthetic_icao
+
+stations = ['SBGR'] + [synthetic_icao(scale) for scale in scales]
+
+
+class UnifyFiles:
+    params = [stations]
+    param_names = ['station']
+    timeout = 1800
+    number = 1
+    repeat = 1
+    warmup_time = 0
+
+    def setup(self, station):
+        prepare_workdir()
+        from d01_data.get_data import GetIsdData
+        self.isd = GetIsdData(station)
+
+    def time_unify_files(self, station):
+        self.isd.unify_files()
+
+    def peakmem_unify_files(self, station):
+        self.isd.unify_files()
+
+
+class LoadProcessed:
+    # cold: nothing cached, every year is extracted; warm: every year comes from the cache
+    params = [stations, ['cold', 'warm']]
+    param_names = ['station', 'cache']
+    timeout = 1800
+    number = 1
+    repeat = 3
+    warmup_time = 0
+
+    def setup(self, station, cache):
+        prepare_workdir()
+        from d01_data.get_data import GetIsdData
+        self.isd = GetIsdData(station)
+        clear_processed(station)
+        if cache == 'warm':
+            self.isd.load_processed()
+
+    def time_load_processed(self, station, cache):
+        self.isd.load_processed()
+
+    def peakmem_load_processed(self, station, cache):
+        self.isd.load_processed()
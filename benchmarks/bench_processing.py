@@ -0,0 +1,105 @@
+"""
+Aggregating the processed data: wind roses, box plot statistics and yearly aggregates
+"""
+import shutil
+
+from .common import prepare_workdir, scales, synthetic_icao
+
+stations = ['SBGR'] + [synthetic_icao(scale) for scale in scales]
+
+
+class Aggregation:
+    params = [stations]
+    param_names = ['station']
+    timeout = 1200
+    warmup_time = 0
+
+    def setup(self, station):
+        prepare_workdir()
+        from d01_data.get_data import GetIsdData
+        from d03_visualisation.plot_climatology import Climatology
+        self.climatology = Climatology(GetIsdData(station).load_processed(), station)
+
+    def time_create_rosedata(self, station):
+        from d02_processing.calculate_windrose import WindRose
+        WindRose().create_rosedata(self.climatology.data)
+
+    def peakmem_create_rosedata(self, station):
+        from d02_processing.calculate_windrose import WindRose
+        WindRose().create_rosedata(self.climatology.data)
+
+    def time_windrose_cube(self, station):
+        from d02_processing.windrose_cube import WindRoseCube
+        WindRoseCube(self.climatology.data).rose()
+
+
+
+class AggregateStoreUpdate:
+    # cold: every year is summarised; current: every year is already stored and only merged
+    params = [stations, ['cold', 'current']]
+    param_names = ['station', 'store']
+    timeout = 1200
+    number = 1
+    repeat = 3
+    warmup_time = 0
+
+    def setup(self, station, store):
+        prepare_workdir()
+        from d01_data.get_data import GetIsdData
+        from d02_processing.yearly_aggregates import AggregateStore
+        from d03_visualisation.plot_climatology import Climatology
+        self.climatology = Climatology(GetIsdData(station).load_processed(), station)
+        self.store = AggregateStore(station)
+        shutil.rmtree(self.store.path, ignore_errors=True)
+        if store == 'current':
+            self.update()
+
+    def update(self):
+        self.store.update(self.climatology.data,
+                          lambda rows: (self.climatology.physical_variables(rows), self.climatology.wx_names(rows)))
+        return self.store.window(self.store.years()).climatology()
+
+    def time_update_and_merge(self, station, store):
+        self.update()
+
+    def peakmem_update_and_merge(self, station, store):
+        self.update()
+
+
+class Selection:
+    params = [stations]
+    param_names = ['station']
+    warmup_time = 0
+
+    def setup(self, station):
+        prepare_workdir()
+        from d01_data.dataset import IsdDataset
+        from d01_data.get_data import GetIsdData
+        self.data = GetIsdData(station).load_processed()
+        self.dataset = IsdDataset(self.data)
+
+    def time_dataset(self, station):
+        from d01_data.dataset import IsdDataset
+        IsdDataset(self.data)
+
+    def time_select_month(self, station):
+        self.dataset.select(months=[7])
+
+    def time_select_season_hours(self, station):
+        self.dataset.select(months=[12, 1, 2], hours=range(6, 10))
+
+
+class Validation:
+    params = [stations, ['flag', 'mask', 'drop']]
+    param_names = ['station', 'action']
+    warmup_time = 0
+
+    def setup(self, station, action):
+        prepare_workdir()
+        from d01_data.get_data import GetIsdData
+        from d01_data.validation import DataValidator
+        self.data = GetIsdData(station).load_processed()
+        self.validator = DataValidator(action=action)
+
+    def time_validate(self, station, action):
+        self.validator.validate(self.data)
@@ -0,0 +1,60 @@
+"""
+Rendering the figures of the SBGR fixture, one Climatology.plot_* method at a time, in a single process
+"""
+import shutil
+
+from .common import prepare_workdir
+
+methods = ['plot_variables_climatology', 'plot_wx', 'plot_windrose', 'plot_monthly_windrose', 'plot_hourly_windrose']
+
+
+class Rendering:
+    params = [methods]
+    param_names = ['method']
+    timeout = 1200
+    number = 1
+    repeat = 3
+    warmup_time = 0
+
+    def setup(self, method):
+        prepare_workdir()
+        import matplotlib
+        matplotlib.use('Agg')
+        from d01_data.get_data import GetIsdData
+        from d03_visualisation.plot_climatology import Climatology
+        self.climatology = Climatology(GetIsdData('SBGR').load_processed(), 'SBGR', workers=1)
+        # The aggregates are ready and no figure exists, so only the rendering is measured
+        self.climatology.aggregates
+        self.climatology.windrose_cube
+        shutil.rmtree(self.climatology.output_path, ignore_errors=True)
+
+    def time_plot(self, method):
+        getattr(self.climatology, method)()
+
+    def peakmem_plot(self, method):
+        getattr(self.climatology, method)()
+
+
+class WindrosePanels:
+    # The 12 monthly and 24 hourly wind roses as two multi-panel figures, drawn or written as data
+    params = [['png', 'svg', 'json']]
+    param_names = ['figure_format']
+    timeout = 1200
+    number = 1
+    repeat = 3
+    warmup_time = 0
+
+    def setup(self, figure_format):
+        prepare_workdir()
+        import matplotlib
+        matplotlib.use('Agg')
+        from d01_data.get_data import GetIsdData
+        from d03_visualisation.plot_climatology import Climatology
+        self.climatology = Climatology(GetIsdData('SBGR').load_processed(), 'SBGR', workers=1,
+                                       figure_format=figure_format, panels=True)
+        self.climatology.windrose_cube
+        shutil.rmtree(self.climatology.output_path, ignore_errors=True)
+
+    def time_plot(self, figure_format):
+        self.climatology.plot_monthly_windrose()
+        self.climatology.plot_hourly_windrose()
@@ -0,0 +1,85 @@
+"""
+Fixtures shared by the benchmarks.
+
+Every benchmark runs inside a scratch project directory (with the same data/ layout as the repository),
+so the caches and figures it writes never touch the repository data.
+The stations available there are:
+- SBGR: the raw files checked in at data/01_raw/SBGR
+- X001, X010, X100: synthetic stations with a single year made of 1, 10 and 100 copies of the
+  SBGR 2015 observations, each copy shifted by some seconds
+"""
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+repository = Path(__file__).resolve().parents[1]
+
+try:
+    import d01_data  # noqa: F401 (installed in the asv environments)
+except ImportError:
+    sys.path.append(str(repository / 'src'))
+
+workdir = Path(os.environ.get('ISD_BENCHMARK_DIR', Path(tempfile.gettempdir()) / 'airports_climatology_benchmarks'))
+scales = [1, 10, 100]
+fixture_year = 2015
+
+
+def synthetic_icao(scale):
+    return f'X{scale:03}'
+
+
+def write_synthetic_file(scale, filename):
+    """
+    Writes a raw ISD file with 'scale' copies of the fixture year
+    """
+    data = pd.read_csv(repository / f'data/01_raw/SBGR/{fixture_year}.csv', dtype=str, keep_default_na=False)
+    dates = pd.to_datetime(data['DATE'], format='%Y-%m-%dT%H:%M:%S')
+    copies = []
+    for copy in range(scale):
+        copy_data = data.copy()
+        copy_data['DATE'] = (dates + pd.Timedelta(seconds=copy)).dt.strftime('%Y-%m-%dT%H:%M:%S')
+        copies.append(copy_data)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    temporary = filename.with_name(f'.{filename.name}.tmp')
+    pd.concat(copies).to_csv(temporary, index=False)
+    os.replace(temporary, filename)
+
+
+def prepare_workdir():
+    """
+    Creates the scratch project directory once (later calls reuse it) and makes it the working directory
+    :return: the scratch directory
+    """
+    raw_path = workdir / 'data' / '01_raw'
+    raw_path.mkdir(parents=True, exist_ok=True)
+    shutil.copy(repository / 'data/01_raw/wx_codes.csv', raw_path / 'wx_codes.csv')
+
+    # Station list with SBGR and the synthetic stations only, which keeps the catalog small
+    stations = pd.read_csv(repository / 'data/01_raw/isd_all_stations.csv', dtype=str, index_col=False)
+    sbgr = stations[stations['ICAO'] == 'SBGR']
+    synthetic = pd.concat([sbgr.assign(ICAO=synthetic_icao(scale), CODE=f'99999{scale:06}') for scale in scales])
+    station_list = raw_path / 'isd_all_stations.csv'
+    if not station_list.exists():
+        pd.concat([sbgr, synthetic]).to_csv(station_list, index=False)
+
+    if not (raw_path / 'SBGR').exists():
+        shutil.copytree(repository / 'data/01_raw/SBGR', raw_path / 'SBGR')
+    for scale in scales:
+        filename = raw_path / synthetic_icao(scale) / f'{fixture_year}.csv'
+        if not filename.exists():
+            write_synthetic_file(scale, filename)
+
+    os.chdir(workdir)
+    return workdir
+
+
+def clear_processed(icao):
+    """
+    Removes the processed data and figures of a station, so the next run starts cold
+    """
+    for path in [workdir / 'data' / '02_processed' / icao, workdir / 'data' / '03_img_output' / icao]:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,19 @@
+import locale
+
+# Portuguese locales, as named on Linux, macOS and Windows
+PORTUGUESE_LOCALES = ['pt_PT.UTF-8', 'pt_pt.UTF-8', 'pt_PT.utf8', 'pt_BR.UTF-8', 'pt_BR.utf8', 'Portuguese_Portugal']
+
+
+def configure_locale(names=None):
+    """
+    Sets the locale used for the month names in the figures, trying each name in turn.
+    Called once per run (not at import), so hosts without the locale still work with the default names.
+    :param names: locale names to try (default: PORTUGUESE_LOCALES)
+    :return: the locale set, or None when none of them is available
+    """
+    for name in names or PORTUGUESE_LOCALES:
+        try:
+            return locale.setlocale(locale.LC_ALL, name)
+        except locale.Error:
+            continue
+    return None
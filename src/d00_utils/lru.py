@@ -0,0 +1,79 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def size_of(value):
+    """
+    Approximate memory used by a cached value (bytes)
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, dict):
+        return sum(size_of(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(size_of(item) for item in value)
+    if hasattr(value, '__dict__'):
+        return size_of(vars(value))
+    return sys.getsizeof(value)
+
+
+class SizedLRU:
+    """
+    Least recently used cache bounded by the total size of its values instead of their number:
+    the oldest values are evicted until the new one fits. A value larger than the whole cache is not kept.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value, size=None):
+        """
+        :param size: size of the value (bytes), measured with size_of by default
+        """
+        size = size_of(value) if size is None else size
+        with self._lock:
+            if key in self._items:
+                self.bytes -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            while self.bytes + size > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+            self._items[key] = (value, size)
+            self.bytes += size
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {'items': len(self._items), 'bytes': self.bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
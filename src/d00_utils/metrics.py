@@ -0,0 +1,96 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class RunMetrics:
+    """
+    Collects what happens in a run: the wall time of each stage, with whatever it processed
+    (rows, figures...), and counters (bytes downloaded and read, cache hits and misses...).
+    Setting the ISD_METRICS_LOG environment variable also prints every finished stage as a JSON line to stderr.
+    Setting ISD_PROFILE to a directory runs the stages under cProfile and dumps one .prof file per stage call
+    (a stage inside another one is part of the outer profile, as only one profiler can be active).
+    """
+
+    def __init__(self):
+        self.stages = []
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._profiling = threading.local()
+
+    def reset(self):
+        with self._lock:
+            self.stages = []
+            self.counters = {}
+
+    def count(self, counter, value=1):
+        # Downloads run in threads, so the counters are updated under a lock
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        Times the block and records it as a stage; the block can add fields to the yielded dictionary
+        (e.g. stage['rows'] = len(data))
+        """
+        record = {'stage': name, **fields}
+        profile_path = os.environ.get('ISD_PROFILE')
+        profiler = None
+        if profile_path and not getattr(self._profiling, 'active', False):
+            profiler = cProfile.Profile()
+            self._profiling.active = True
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiling.active = False
+                Path(profile_path).mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(f'{profile_path}/{name}-{os.getpid()}-{time.time_ns()}.prof')
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            with self._lock:
+                self.stages.append(record)
+            if os.environ.get('ISD_METRICS_LOG'):
+                print(json.dumps(record, default=str), file=sys.stderr)
+
+    def instrumented(self, name):
+        """
+        Decorator recording every call of a function as a stage
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def to_dict(self):
+        with self._lock:
+            return {'stages': list(self.stages), 'counters': dict(self.counters)}
+
+    def write(self, filename, **fields):
+        """
+        Writes the metrics, plus any other fields, as a JSON file
+        """
+        filename = Path(filename)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        temporary = filename.with_name(f'.{filename.name}.tmp')
+        with open(temporary, 'w') as file:
+            json.dump({**fields, **self.to_dict()}, file, indent=1, default=str)
+        os.replace(temporary, filename)
+
+
+# Metrics of the current process, shared by all the modules
+metrics = RunMetrics()
+instrumented = metrics.instrumented
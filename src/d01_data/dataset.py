@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+
+class IsdDataset:
+    """
+    Processed data of a station sorted by time, with integer year, month, hour and day of year keys
+    computed once, and partitioned by year and month.
+    As the rows are sorted, every partition is a contiguous range of rows, so selecting months or years
+    only touches the rows selected, and a single range is returned as a view of the data.
+    """
+
+    def __init__(self, data):
+        """
+        :param data: processed data with a datetime index
+        """
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index(kind='stable')
+        self.data = data
+        values = pd.DatetimeIndex(data.index).values
+        days = values.astype('M8[D]')
+        years = values.astype('M8[Y]')
+        self.year = (years.astype(np.int64) + 1970).astype(np.int16)
+        self.month = (values.astype('M8[M]').astype(np.int64) % 12 + 1).astype(np.int8)
+        self.day_of_year = ((days - years).astype(np.int64) + 1).astype(np.int16)
+        self.hour = (values.astype('M8[h]') - days).astype(np.int64).astype(np.int8)
+
+        # Bounds of the (year, month) partitions
+        partition = self.year.astype(np.int32) * 12 + self.month - 1
+        starts = np.flatnonzero(np.r_[True, partition[1:] != partition[:-1]]) if len(partition) else np.array([], int)
+        stops = np.r_[starts[1:], len(partition)]
+        self.partitions = {(int(partition[start]) // 12, int(partition[start]) % 12 + 1): slice(start, stop)
+                           for start, stop in zip(starts, stops)}
+
+    def __len__(self):
+        return len(self.data)
+
+    def years(self):
+        return sorted({year for year, _ in self.partitions})
+
+    def months(self):
+        return sorted({month for _, month in self.partitions})
+
+    def hours(self):
+        return np.flatnonzero(np.bincount(self.hour, minlength=24)).tolist()
+
+    def slices(self, years=None, months=None):
+        """
+        :return: list with the ranges of rows of the selected years and months, adjacent ranges joined
+        """
+        slices = []
+        for (year, month), rows in self.partitions.items():
+            if (years is not None and year not in years) or (months is not None and month not in months):
+                continue
+            if slices and slices[-1].stop == rows.start:
+                slices[-1] = slice(slices[-1].start, rows.stop)
+            else:
+                slices.append(rows)
+        return slices
+
+    def positions(self, years=None, months=None, hours=None, days=None):
+        """
+        :return: array with the positions of the rows selected (see select)
+        """
+        slices = self.slices(years, months)
+        positions = np.concatenate([np.arange(rows.start, rows.stop) for rows in slices] or [np.array([], int)])
+        if hours is not None:
+            positions = positions[np.isin(self.hour[positions], list(hours))]
+        if days is not None:
+            positions = positions[np.isin(self.day_of_year[positions], list(days))]
+        return positions
+
+    def select(self, years=None, months=None, hours=None, days=None):
+        """
+        Selects the observations of some years, months (1-12), hours (0-23) and days of the year (1-366),
+        all of them by default. E.g. select(months=[12, 1, 2], hours=range(6, 10))
+        :return: a dataframe; a view of the data when the selection is a single range of rows
+        """
+        slices = self.slices(years, months)
+        if hours is None and days is None and len(slices) == 1:
+            return self.data.iloc[slices[0]]
+        return self.data.iloc[self.positions(years, months, hours, days)]
+
+    def window(self, start, end):
+        """
+        Selects the observations from start (inclusive) to end (exclusive), e.g. window('2015-06-01', '2015-09-01')
+        :return: a view of the data
+        """
+        index = pd.DatetimeIndex(self.data.index)
+        return self.data.iloc[index.searchsorted(pd.Timestamp(start)):index.searchsorted(pd.Timestamp(end))]
@@ -0,0 +1,494 @@
+import numpy as np
+import pandas as pd
+
+
+def as_bytes(values, width):
+    """
+    Converts a column of ISD groups (str with NaN for missing groups, or a bytes array) into a (rows x width)
+    uint8 matrix. Missing groups and short strings are padded with zeros, which never pass as digits.
+    A bytes array of that width is used without a copy.
+    """
+    if isinstance(values, pd.Series):
+        values = values.fillna('').values
+    values = np.asarray(values, dtype=f'S{width}')
+    return values.view(np.uint8).reshape(len(values), width)
+
+
+def parse_int(chars, start, stop, signed=False):
+    """
+    Parses the fixed-offset integer found between 'start' and 'stop' in every row of a byte matrix
+    :return: float64 array with NaN where the field is not a valid number
+    """
+    sign = np.ones(len(chars))
+    if signed:
+        sign[chars[:, start] == ord('-')] = -1
+        valid = np.isin(chars[:, start], (ord('+'), ord('-')))
+        start += 1
+    else:
+        valid = np.ones(len(chars), dtype=bool)
+    digits = chars[:, start:stop].astype(np.int16) - ord('0')
+    valid &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+    powers = 10 ** np.arange(stop - start - 1, -1, -1)
+    values = (digits @ powers) * sign
+    values[~valid] = np.nan
+    return values
+
+
+def as_text(values):
+    """
+    Joins a column of free text (e.g. the METAR in REM) into a single ASCII buffer, one row per line.
+    Non-ASCII characters are replaced by '?' so every character keeps its position.
+    A bytes array (e.g. from RawArchive) is used as is: each row is padded with zeros up to the width of the array.
+    :return: the buffer as a uint8 array and the position of the end of every row
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'S':
+        width = values.dtype.itemsize
+        buffer = np.full((len(values), width + 1), ord('\n'), dtype=np.uint8)
+        buffer[:, :width] = values.view(np.uint8).reshape(len(values), width)
+        return buffer.ravel(), np.arange(len(values)) * (width + 1) + width
+    if isinstance(values, pd.Series):
+        values = values.fillna('').values.tolist()
+    buffer = np.frombuffer('\n'.join(values).encode('ascii', 'replace'), dtype=np.uint8)
+    ends = np.append(np.flatnonzero(buffer == ord('\n')), len(buffer))
+    if len(ends) != len(values):
+        # Some row has line breaks of its own
+        return as_text([value.replace('\n', ' ') for value in values])
+    return buffer, ends
+
+
+class MetarParser:
+    """
+    Parses the METAR messages of the REM column (e.g. 'MET058METAR SBGR 100600Z 08007KT 9000 SCT007 16/16 Q1024=')
+    all at once: the messages are joined into one buffer (see as_text), split into tokens with NumPy, and the tokens
+    are matched against fixed-layout templates ('d' for a digit, any other character literal), all the tokens
+    of the template length at a time. Only the tokens before the remarks and the trends are used.
+    """
+
+    # Tokens longer than 'width' characters are never matched
+    width = 16
+    separators = b' \n\x00=;'
+    end_tokens = ['RMK', 'TEMPO', 'BECMG', 'NOSIG']
+    # Cloud layers kept per message, in the order they are reported (from the lowest).
+    # Annex 3 METARs have up to three layers plus the convective ones, and US METARs up to six,
+    # so six layers hold all of them
+    max_layers = 6
+    cloud_amounts = ['FEW', 'SCT', 'BKN', 'OVC', 'VV']
+    cloud_types = ['CB', 'TCU']
+    # Weather groups: an optional intensity (- or +) or proximity (VC) followed by descriptors and phenomena
+    weather_codes = ['MI', 'BC', 'PR', 'DR', 'BL', 'SH', 'TS', 'FZ',
+                     'DZ', 'RA', 'SN', 'SG', 'IC', 'PL', 'GR', 'GS', 'UP',
+                     'BR', 'FG', 'FU', 'VA', 'DU', 'SA', 'HZ', 'PY',
+                     'PO', 'SQ', 'FC', 'SS', 'DS']
+
+    columns = (['qnh', 'gust', 'wind_variable_from', 'wind_variable_to', 'rvr'] +
+               [f'cloud_{field}_{layer}' for layer in range(1, max_layers + 1)
+                for field in ['amount', 'height', 'type']] +
+               ['weather'])
+
+    def __init__(self, values):
+        """
+        :param values: column of METAR messages (str), or the buffer and row ends returned by as_text
+        """
+        buffer, ends = values if isinstance(values, tuple) else as_text(values)
+        self.n_rows = len(ends)
+        # Tokens are the runs of characters between separators
+        separator = np.zeros(256, dtype=bool)
+        separator[np.frombuffer(self.separators, dtype=np.uint8)] = True
+        inside = np.concatenate([[False], ~separator[buffer], [False]])
+        starts = np.flatnonzero(inside[1:] & ~inside[:-1])
+        self.lengths = (np.flatnonzero(inside[:-1] & ~inside[1:]) - starts).astype(np.int32)
+        self.rows = np.searchsorted(ends, starts).astype(np.int32)
+        # Characters of each token, padded with zeros (gathered one column at a time to bound memory)
+        self.chars = np.zeros((len(starts), self.width), dtype=np.uint8)
+        for position in range(self.width):
+            tokens = np.flatnonzero(self.lengths > position)
+            self.chars[tokens, position] = buffer[starts[tokens] + position]
+
+        # Positions of the tokens of each length, so a template is only compared with the tokens of its length
+        lengths = np.minimum(self.lengths, self.width + 1).astype(np.int16)
+        order = np.argsort(lengths, kind='stable').astype(np.int32)
+        bounds = np.searchsorted(lengths[order], np.arange(self.width + 2))
+        self._by_length = [order[bounds[length]:bounds[length + 1]] for length in range(self.width + 1)]
+
+        # Tokens after the first end token of their message are dropped
+        ended = np.zeros(len(starts), dtype=bool)
+        for token in self.end_tokens:
+            ended[self.match(token)] = True
+        passed = np.cumsum(ended)
+        first = np.searchsorted(self.rows, self.rows)
+        keep = passed - passed[first] + ended[first] == 0
+        self.lengths[~keep] = 0
+        self._by_length = [tokens[keep[tokens]] for tokens in self._by_length]
+
+    def match(self, template):
+        """
+        :return: sorted positions of the tokens matching the template
+        """
+        if len(template) > self.width:
+            return np.array([], dtype=int)
+        tokens = self._by_length[len(template)]
+        for position, character in enumerate(template):
+            column = self.chars[tokens, position]
+            if character == 'd':
+                tokens = tokens[(column >= ord('0')) & (column <= ord('9'))]
+            else:
+                tokens = tokens[column == ord(character)]
+        return tokens
+
+    def per_row(self, tokens, values):
+        """
+        :return: float64 array with the value of the first token of each row, NaN for the rows without tokens
+        """
+        result = np.full(self.n_rows, np.nan)
+        rows, first = np.unique(self.rows[tokens], return_index=True)
+        result[rows] = values[first]
+        return result
+
+    def qnh(self):
+        # Q followed by hPa or A followed by hundredths of inHg
+        hpa = self.match('Qdddd')
+        inhg = self.match('Adddd')
+        tokens = np.concatenate([hpa, inhg])
+        values = np.concatenate([parse_int(self.chars[hpa], 1, 5),
+                                 np.round(parse_int(self.chars[inhg], 1, 5) * 0.338639, 1)])
+        order = np.argsort(tokens, kind='stable')
+        return self.per_row(tokens[order], values[order])
+
+    def gust(self):
+        """
+        :return: gust speed (kt) of the wind group, e.g. 31015G27KT; NaN when there are no gusts
+        """
+        tokens, values = [], []
+        for direction in ['ddd', 'VRB']:
+            for speed in ['dd', 'ddd']:
+                for gust in ['dd', 'ddd']:
+                    for unit, factor in [('KT', 1), ('MPS', 1.94384)]:
+                        matched = self.match(f'{direction}{speed}G{gust}{unit}')
+                        start = len(direction) + len(speed) + 1
+                        tokens.append(matched)
+                        values.append(np.round(parse_int(self.chars[matched], start, start + len(gust)) * factor))
+        tokens, values = np.concatenate(tokens), np.concatenate(values)
+        order = np.argsort(tokens, kind='stable')
+        return self.per_row(tokens[order], values[order])
+
+    def variable_wind(self):
+        """
+        :return: the directions (degrees) limiting the variable wind sector, e.g. 280V350
+        """
+        tokens = self.match('dddVddd')
+        return (self.per_row(tokens, parse_int(self.chars[tokens], 0, 3)),
+                self.per_row(tokens, parse_int(self.chars[tokens], 4, 7)))
+
+    def rvr(self):
+        """
+        :return: lowest runway visual range (m) reported on any runway, e.g. R09L/0400N or R27R/P2000
+        """
+        chars = self.chars
+        tokens = np.flatnonzero((self.lengths >= 8) & (chars[:, 0] == ord('R')) &
+                                (chars[:, 1] >= ord('0')) & (chars[:, 1] <= ord('9')) &
+                                (chars[:, 2] >= ord('0')) & (chars[:, 2] <= ord('9')))
+        # The runway designator may have a L, C or R and the value a P (above) or M (below)
+        slash = np.where(chars[tokens, 3] == ord('/'), 3, 4)
+        tokens, slash = tokens[chars[tokens, slash] == ord('/')], slash[chars[tokens, slash] == ord('/')]
+        start = slash + 1 + np.isin(chars[tokens, slash + 1], [ord('P'), ord('M')])
+        digits = chars[tokens[:, None], start[:, None] + np.arange(4)].astype(np.int16) - ord('0')
+        valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+        values = digits[valid] @ 10 ** np.arange(3, -1, -1)
+        rvr = np.full(self.n_rows, np.nan)
+        np.fmin.at(rvr, self.rows[tokens[valid]], values)
+        return rvr
+
+    def clouds(self):
+        """
+        :return: dictionary with the amount, height (ft) and type of the cloud layers (see columns)
+        """
+        tokens, amounts, heights, types = [], [], [], []
+        for amount in self.cloud_amounts:
+            for cloud_type in [''] + self.cloud_types + ['///']:
+                matched = self.match(f'{amount}ddd{cloud_type}')
+                tokens.append(matched)
+                amounts.append(np.full(len(matched), amount, dtype=object))
+                heights.append(parse_int(self.chars[matched], len(amount), len(amount) + 3) * 100)
+                types.append(np.full(len(matched), cloud_type if cloud_type in self.cloud_types else np.nan,
+                                     dtype=object))
+        tokens, amounts, heights, types = (np.concatenate(array) for array in [tokens, amounts, heights, types])
+        order = np.argsort(tokens, kind='stable')
+        tokens, amounts, heights, types = tokens[order], amounts[order], heights[order], types[order]
+        # Position of each layer in its message
+        rows = self.rows[tokens]
+        layer = np.arange(len(rows)) - np.searchsorted(rows, rows)
+
+        columns = {}
+        for number in range(1, self.max_layers + 1):
+            selected = layer == number - 1
+            for field, values in [('amount', amounts), ('height', heights), ('type', types)]:
+                column = np.full(self.n_rows, np.nan, dtype=float if field == 'height' else object)
+                column[rows[selected]] = values[selected]
+                columns[f'cloud_{field}_{number}'] = column
+        return columns
+
+    def weather(self):
+        """
+        :return: object array with the weather groups of each message separated by spaces (e.g. '-TSRA BR'),
+        NaN when there are none
+        """
+        codes = np.array([ord(code[0]) * 256 + ord(code[1]) for code in self.weather_codes])
+        tokens = np.concatenate(self._by_length[2:10])
+        chars = self.chars[tokens]
+        prefix = np.where(np.isin(chars[:, 0], [ord('-'), ord('+')]), 1, 0)
+        prefix[(chars[:, 0] == ord('V')) & (chars[:, 1] == ord('C'))] = 2
+        rest = self.lengths[tokens] - prefix
+        valid = (rest >= 2) & (rest <= 8) & (rest % 2 == 0)
+        tokens, chars, prefix, rest = tokens[valid], chars[valid], prefix[valid], rest[valid]
+        valid = np.ones(len(tokens), dtype=bool)
+        for pair in range(4):
+            position = np.minimum(prefix + 2 * pair, self.width - 2)
+            pair_code = (chars[np.arange(len(chars)), position].astype(np.int32) * 256 +
+                         chars[np.arange(len(chars)), position + 1])
+            valid &= (2 * pair >= rest) | np.isin(pair_code, codes)
+        tokens = np.sort(tokens[valid])
+        weather = np.full(self.n_rows, np.nan, dtype=object)
+        if len(tokens) == 0:
+            return weather
+        # The groups of each row are joined with spaces and the rows with line breaks, so a single decode and split
+        # gives the text of every row
+        rows, lengths = self.rows[tokens], self.lengths[tokens]
+        last = np.r_[rows[1:] != rows[:-1], True]
+        joined = np.zeros((len(tokens), self.width + 1), dtype=np.uint8)
+        joined[:, :self.width] = self.chars[tokens]
+        joined[np.arange(len(tokens)), lengths] = np.where(last, ord('\n'), ord(' '))
+        text = joined[np.arange(self.width + 1)[None, :] <= lengths[:, None]].tobytes().decode('ascii')
+        weather[rows[last]] = text.split('\n')[:-1]
+        return weather
+
+    def parse(self, columns=None):
+        """
+        :param columns: list of columns to parse (default: all of MetarParser.columns)
+        :return: dictionary with an array for each column
+        """
+        columns = self.columns if columns is None else list(columns)
+        parsed = {}
+        if 'qnh' in columns:
+            parsed['qnh'] = self.qnh()
+        if 'gust' in columns:
+            parsed['gust'] = self.gust()
+        if {'wind_variable_from', 'wind_variable_to'} & set(columns):
+            parsed['wind_variable_from'], parsed['wind_variable_to'] = self.variable_wind()
+        if 'rvr' in columns:
+            parsed['rvr'] = self.rvr()
+        if any(column.startswith('cloud_') for column in columns):
+            parsed.update(self.clouds())
+        if 'weather' in columns:
+            parsed['weather'] = self.weather()
+        return {column: parsed[column] for column in columns}
+
+
+class IsdDecoder:
+    """
+    Decodes the fixed-layout ISD groups straight into typed NumPy arrays.
+    Each field is read from its offset inside the group (e.g. WND '310,1,N,0015,1'),
+    so only the requested columns are ever materialized.
+    The cleaning rules applied to the decoded values can be changed per decoder,
+    e.g. IsdDecoder(visibility_cap=5000, slp_limits=(960, 1040)).
+    """
+
+    # Column: (ISD group, group width, start, stop, signed)
+    fields = {'direction': ('WND', 14, 0, 3, False),
+              'speed': ('WND', 14, 8, 12, False),
+              'visibility': ('VIS', 12, 0, 6, False),
+              'phenomenon': ('MW1', 4, 0, 2, False),
+              'coverage': ('GA1', 18, 0, 2, False),
+              'ceiling': ('CIG', 11, 0, 5, False),
+              'temperature': ('TMP', 7, 0, 5, True),
+              'dew': ('DEW', 7, 0, 5, True)}
+
+    # Quality flag of a field: (ISD group, group width, position of the flag)
+    quality_fields = {'direction_quality': ('WND', 14, 4),
+                      'speed_quality': ('WND', 14, 13),
+                      'visibility_quality': ('VIS', 12, 7),
+                      'ceiling_quality': ('CIG', 11, 6),
+                      'temperature_quality': ('TMP', 7, 6),
+                      'dew_quality': ('DEW', 7, 6)}
+    # Quality codes of the ISD manual, in the order of their categories
+    quality_flags = ['0', '1', '2', '3', '4', '5', '6', '7', '9', 'A', 'C', 'I', 'M', 'P', 'R', 'U']
+
+    # Raw columns needed by the columns which are not in 'fields'
+    extra_groups = {'cavok': ['CIG'], 'slp': ['REM'], 'rh': ['TMP', 'DEW'],
+                    **{column: [group] for column, (group, _, _) in quality_fields.items()},
+                    **{column: ['REM'] for column in MetarParser.columns}}
+
+    columns = ['direction', 'speed', 'visibility', 'phenomenon', 'coverage',
+               'ceiling', 'cavok', 'temperature', 'dew', 'slp', 'rh', *quality_fields]
+    # Columns parsed from the METAR messages (see MetarParser), only decoded when requested
+    metar_columns = MetarParser.columns
+
+    # Cleaning rules:
+    # - variable_direction: direction given to the calm and variable winds (999); None leaves them missing,
+    #   so they never fall in a direction bin
+    # - missing_speed: speed given to the missing speeds (9999); None leaves them missing,
+    #   so they are never counted as calm winds
+    # - visibility_cap: visibility (m) from which the visibility is unlimited
+    # - ceiling_cutoff: ceiling (m) above which the cloud base is not a ceiling
+    # - slp_limits: (min, max) sea level pressure (hPa); pressures out of the limits are missing
+    default_rules = {'variable_direction': None,
+                     'missing_speed': None,
+                     'visibility_cap': 10000,
+                     'ceiling_cutoff': 1599,
+                     'slp_limits': None}
+
+    def __init__(self, **rules):
+        unknown = set(rules) - set(self.default_rules)
+        if unknown:
+            raise ValueError(f'Unknown cleaning rules: {", ".join(sorted(unknown))}')
+        self.rules = {**self.default_rules, **rules}
+        self._groups = {}
+
+    @property
+    def custom_rules(self):
+        """
+        True when some cleaning rule differs from the default ones
+        """
+        return self.rules != self.default_rules
+
+    def groups(self, columns=None):
+        """
+        Lists the raw ISD columns needed to decode 'columns'
+        """
+        columns = self.columns if columns is None else columns
+        groups = []
+        for column in columns:
+            needed = [self.fields[column][0]] if column in self.fields else self.extra_groups[column]
+            if column in ('direction', 'speed'):
+                needed = ['WND']
+            groups += [group for group in needed if group not in groups]
+        return groups
+
+    def _group(self, data, group, width):
+        # Groups shared by several fields (WND, CIG) are converted only once
+        if group not in self._groups:
+            # Files only have the columns of the groups reported during that year
+            values = data[group] if group in data else np.full(len(data), '')
+            self._groups[group] = as_bytes(values, width)
+        return self._groups[group]
+
+    def _text(self, data):
+        # The messages are joined into a single buffer once, for the pressure and the METAR columns
+        if 'REM' not in self._groups:
+            self._groups['REM'] = as_text(data['REM'] if 'REM' in data else [''] * len(data))
+        return self._groups['REM']
+
+    def _field(self, data, column):
+        group, width, start, stop, signed = self.fields[column]
+        return parse_int(self._group(data, group, width), start, stop, signed)
+
+    @staticmethod
+    def calculate_rh(temperature, dew):
+        """
+        Receives air temperature (t) and dew point (d) arrays and returns relative humidity
+        RH = 100*(EXP((17.625*TD)/(243.04+TD))/EXP((17.625*T)/(243.04+T)))
+        """
+        temperature = np.asarray(temperature, dtype=float)
+        dew = np.asarray(dew, dtype=float)
+        return 100 * (np.exp((17.625 * dew) / (243.04 + dew)) /
+                      np.exp((17.625 * temperature) / (243.04 + temperature)))
+
+    def decode(self, data, columns=None):
+        """
+        Decodes the meteorological variables of the raw ISD data
+        Documentation: https://www.ncei.noaa.gov/data/global-hourly/doc/isd-format-document.pdf
+        :param data: raw ISD dataframe already filtered to the desired report types
+        :param columns: list of columns to decode (default: all of IsdDecoder.columns)
+        :return: a dataframe with the requested columns and the same index as 'data'
+        """
+        columns = self.columns if columns is None else list(columns)
+        self._groups = {}
+        decoded = {}
+
+        if 'direction' in columns or 'speed' in columns:
+            direction = self._field(data, 'direction')
+            speed = self._field(data, 'speed')
+            # According with the manual, wind direction as 999 can be missing or variable wind.
+            # It can be calm too, as seen by the data (comparing them to METAR)...
+            # Both have no direction: the calm winds are counted apart by the wind roses (speed 0)
+            # and the variable ones have no direction bin
+            variable = self.rules['variable_direction']
+            direction[direction == 999] = np.nan if variable is None else variable
+            # According to the manual, speed_rate seen as 9999 means it is missing.
+            missing = self.rules['missing_speed']
+            speed[speed == 9999] = np.nan if missing is None else missing
+            # Wind Speed is in meters per second and scaled by 10, let's downscale them and convert to knots...
+            speed = np.trunc(speed * 0.194384)
+            decoded['direction'] = direction
+            decoded['speed'] = speed
+
+        if 'visibility' in columns:
+            # The manual says visibility values of 999999 means they are missing.
+            # Also, values of visibility above 10,000m must not be considered as restrictive to the operations,
+            # thus, let's just set them as unlimited...
+            visibility = self._field(data, 'visibility')
+            visibility[visibility == 999999] = np.nan
+            visibility[visibility >= self.rules['visibility_cap']] = self.rules['visibility_cap']
+            decoded['visibility'] = visibility
+
+        if 'phenomenon' in columns:
+            decoded['phenomenon'] = self._field(data, 'phenomenon')
+
+        if 'coverage' in columns:
+            # Coverage code 99 means missing
+            coverage = self._field(data, 'coverage')
+            coverage[coverage == 99] = np.nan
+            decoded['coverage'] = coverage
+
+        if 'ceiling' in columns:
+            # According to the manual, ceiling regarded as 99999 means it's missing (from the METAR)
+            # and 22000 means unlimited...
+            # BUT... "ceiling values above 1600m (5000ft) are not considered ceiling" Lets just make them NaN...
+            ceiling = self._field(data, 'ceiling')
+            ceiling[ceiling > self.rules['ceiling_cutoff']] = np.nan
+            # Ceiling is in meters, let's set them to feet
+            decoded['ceiling'] = ceiling * 3.28084
+
+        if 'cavok' in columns:
+            # CAVOK flag is the last character of the CIG group: Y, N or 9 (missing)
+            cavok = self._group(data, 'CIG', 11)[:, 10].copy().view('S1').astype(str).astype(object)
+            cavok[~np.isin(cavok, ['Y', 'N'])] = np.nan
+            decoded['cavok'] = cavok
+
+        if {'temperature', 'dew', 'rh'} & set(columns):
+            # Temperature and dew are scaled by 10, and values of +9999 mean they are missing...
+            temperature = self._field(data, 'temperature')
+            dew = self._field(data, 'dew')
+            temperature[np.abs(temperature) == 9999] = np.nan
+            dew[np.abs(dew) == 9999] = np.nan
+            decoded['temperature'] = temperature / 10
+            decoded['dew'] = dew / 10
+
+        metar_columns = [column for column in columns if column in self.metar_columns]
+        if metar_columns or 'slp' in columns:
+            # The pressure and all the METAR columns are parsed from the same tokens
+            parsed = MetarParser(self._text(data)).parse(sorted(set(metar_columns) | {'qnh'}))
+            decoded.update({column: parsed[column] for column in metar_columns})
+
+        if 'slp' in columns:
+            # There is no information on sea level pressure in the SLP column for METAR reports,
+            # so it is the QNH of the message in the REM column
+            # e.g. 'METAR SBGR 010000Z 31003KT CAVOK 25/19 Q1017=' has a pressure of 1017 hPa
+            slp = parsed['qnh'].copy()
+            if self.rules['slp_limits'] is not None:
+                low, high = self.rules['slp_limits']
+                slp[(slp < low) | (slp > high)] = np.nan
+            decoded['slp'] = slp
+
+        if 'rh' in columns:
+            decoded['rh'] = self.calculate_rh(decoded['temperature'], decoded['dew'])
+
+        for column in [column for column in columns if column in self.quality_fields]:
+            # The quality flags are kept as their ISD codes and checked by the DataValidator
+            group, width, position = self.quality_fields[column]
+            codes = np.full(256, -1, dtype=np.int8)
+            codes[[ord(flag) for flag in self.quality_flags]] = np.arange(len(self.quality_flags))
+            decoded[column] = pd.Categorical.from_codes(codes[self._group(data, group, width)[:, position]],
+                                                        self.quality_flags)
+
+        self._groups = {}
+        return pd.DataFrame({column: decoded[column] for column in columns}, index=data.index)
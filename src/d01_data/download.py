@@ -0,0 +1,194 @@
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+from d00_utils.metrics import metrics
+
+
+class DownloadError(Exception):
+    """
+    Raised when a file could not be downloaded after all the retries
+    """
+
+    def __init__(self, url, code=None, reason=''):
+        self.url = url
+        self.code = code
+        super().__init__(f'{url}: {code or ""} {reason}'.strip())
+
+
+class IsdDownloader:
+    """
+    Downloads ISD yearly files concurrently over persistent HTTP connections.
+    Each file is written to a .part file which is renamed when complete,
+    so interrupted transfers are resumed with a Range request on the next run.
+    Files that can still change (e.g. the current year) are revalidated with
+    If-None-Match/If-Modified-Since using the headers stored next to them.
+    """
+
+    base_url = 'https://www.ncei.noaa.gov/data/global-hourly/access'
+
+    def __init__(self, base_url=None, workers=8, retries=3, backoff=1.0, timeout=60, block_size=1 << 16):
+        if base_url is not None:
+            self.base_url = base_url.rstrip('/')
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.block_size = block_size
+        self._local = threading.local()
+
+    def url(self, year, station_isd):
+        return f'{self.base_url}/{year}/{station_isd}.csv'
+
+    def _connection(self, scheme, netloc):
+        """
+        Returns the connection of the current thread to a host, opening it when needed
+        """
+        connections = self._local.__dict__.setdefault('connections', {})
+        key = (scheme, netloc)
+        if key not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connections[key] = connection_class(netloc, timeout=self.timeout)
+        return connections[key]
+
+    def _drop_connection(self, scheme, netloc):
+        connections = self._local.__dict__.get('connections', {})
+        connection = connections.pop((scheme, netloc), None)
+        if connection is not None:
+            connection.close()
+
+    @staticmethod
+    def _read_validators(filename):
+        try:
+            with open(f'{filename}.meta') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_validators(filename, response):
+        validators = {'etag': response.getheader('ETag'),
+                      'last_modified': response.getheader('Last-Modified')}
+        with open(f'{filename}.meta', 'w') as file:
+            json.dump(validators, file)
+
+    def _request(self, url, headers, redirects=5):
+        """
+        Sends a GET request following redirects
+        :return: the url which answered and its response
+        """
+        for _ in range(redirects + 1):
+            parts = urlsplit(url)
+            path = parts.path + (f'?{parts.query}' if parts.query else '')
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                # The server may have closed an idle keep-alive connection
+                self._drop_connection(parts.scheme, parts.netloc)
+                raise
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                url = urljoin(url, response.getheader('Location'))
+                continue
+            return parts, response
+        raise DownloadError(url, reason='too many redirects')
+
+    def _transfer(self, url, filename, revalidate):
+        """
+        Makes one attempt to download a file
+        :return: 'downloaded', 'resumed' or 'not modified'
+        """
+        part = f'{filename}.part'
+        validators = self._read_validators(filename)
+        headers = {'Accept-Encoding': 'identity'}
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            if validators.get('etag') or validators.get('last_modified'):
+                headers['If-Range'] = validators.get('etag') or validators['last_modified']
+        elif revalidate and os.path.exists(filename):
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        parts, response = self._request(url, headers)
+        if response.status == 304:
+            response.read()
+            return 'not modified'
+        if response.status == 416:
+            # The partial file does not match the remote one anymore
+            response.read()
+            os.remove(part)
+            raise DownloadError(url, response.status, response.reason)
+        if response.status not in (200, 206):
+            response.read()
+            raise DownloadError(url, response.status, response.reason)
+
+        if response.status == 200:
+            offset = 0
+            self._write_validators(filename, response)
+        expected = response.getheader('Content-Length')
+        received = 0
+        try:
+            with open(part, 'ab' if offset else 'wb') as file:
+                for block in iter(lambda: response.read(self.block_size), b''):
+                    file.write(block)
+                    received += len(block)
+        except (http.client.HTTPException, OSError):
+            self._drop_connection(parts.scheme, parts.netloc)
+            raise
+        if expected is not None and received < int(expected):
+            self._drop_connection(parts.scheme, parts.netloc)
+            raise DownloadError(url, reason=f'incomplete transfer ({received} of {expected} bytes)')
+
+        metrics.count('bytes_downloaded', received)
+        os.replace(part, filename)
+        return 'resumed' if offset else 'downloaded'
+
+    def fetch(self, url, filename, revalidate=False):
+        """
+        Downloads a file unless it already exists, retrying with exponential backoff.
+        Files flagged with 'revalidate' are only downloaded again if they changed on the server.
+        Client errors (e.g. 404) are not retried.
+        :return: 'skipped', 'not modified', 'downloaded' or 'resumed'
+        """
+        if os.path.exists(filename) and not revalidate:
+            return 'skipped'
+        for attempt in range(self.retries + 1):
+            try:
+                return self._transfer(url, filename, revalidate)
+            except DownloadError as exception:
+                if exception.code is not None and 400 <= exception.code < 500 and exception.code != 416:
+                    raise
+                error = exception
+            except (http.client.HTTPException, OSError) as exception:
+                error = DownloadError(url, reason=str(exception))
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        raise error
+
+    def download(self, jobs):
+        """
+        Downloads many files concurrently
+        :param jobs: iterable of (url, filename, revalidate) tuples
+        :return: a dictionary with the filename as key and the status or the DownloadError as value
+        """
+        jobs = list(jobs)
+
+        def run(job):
+            url, filename, revalidate = job
+            try:
+                return self.fetch(url, filename, revalidate)
+            except DownloadError as exception:
+                return exception
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(run, jobs)
+            return {job[1]: result for job, result in zip(jobs, results)}
@@ -1,14 +1,14 @@
-import urllib.request
-from urllib.error import HTTPError
 import pandas as pd
-from pandas.io import parsers
 import os
-import math
-import re
-import numpy as np
 from pathlib import Path
-import warnings
 import datetime
+from d00_utils.metrics import metrics
+from d01_data.decode_isd import IsdDecoder
+from d01_data.download import IsdDownloader
+from d01_data.processed_cache import ProcessedCache
+from d01_data.raw_archive import RawArchive
+from d01_data.schema import apply_schema
+from d01_data.stations import StationCatalog
 
 
 class GetIsdData:
@@ -18,42 +18,210 @@ class GetIsdData:
     extract information from them
     """
 
-    def __init__(self, icao):
+    # Only METAR observations are used, to avoid redundancies
+    report_types = ['FM-15', 'FM-16', 'SY-MT']
+    # Number of complete years whose files are revalidated on every download, as NCEI still revises them
+    revised_years = 1
+
+    def __init__(self, icao, downloader=None, catalog=None, decoder=None, archive=False, validator=None):
+        """
+        :param decoder: IsdDecoder with the cleaning rules used (default: the default rules).
+        Data extracted with other rules is never loaded from nor stored in the processed cache
+        :param archive: convert the raw files into a RawArchive once and extract them from it,
+        so extracting them again (e.g. with other cleaning rules) does not parse the CSV files
+        :param validator: DataValidator applied to the processed data of every year (default: none).
+        The cache keeps the data before the validation, so the rules can change without extracting it again
+        """
         self.station_icao = icao
+        self.downloader = downloader or IsdDownloader()
+        self.catalog = catalog or StationCatalog()
+        self.decoder = decoder or IsdDecoder()
+        self.archive = RawArchive(icao) if archive else None
+        self.validator = validator
+        self.quality = []
         self.end_year = datetime.datetime.today().year
         self.start_year = datetime.datetime.today().year - 11
+        self.raw_path = f'data/01_raw/{self.station_icao}'
+        self.cache = ProcessedCache(self.station_icao)
+
+    def download_jobs(self):
+        """
+        Lists the yearly files of the station to download
+        :return: list of (url, filename, revalidate) tuples, as taken by IsdDownloader.download
+        """
+        station_isd = self.catalog.lookup(self.station_icao)['code']
+        # Years out of the station coverage are not requested
+        years = self.catalog.years(self.station_icao, self.start_year, self.end_year)
+        if len(years) < self.end_year - self.start_year:
+            print(f'{self.station_icao} only has data from {years.start} to {years.stop - 1}.')
+        # Existing files are only downloaded again if they can still change on the server:
+        # the last complete years are still revised by NCEI
+        last_final = datetime.datetime.today().year - 1 - self.revised_years
+        return [(self.downloader.url(year, station_isd), f'{self.raw_path}/{year}.csv', year > last_final)
+                for year in years]
 
     def download_isd_data(self):
         """
         Creates the link to download ISD files as well as the directories to put the files
         :return: Organizes the downloaded files into folders
         """
-        isd_station = pd.read_csv(
-            'data/01_raw/isd_all_stations.csv', index_col=False)
-        station_isd = isd_station[isd_station['ICAO']
-                                  == self.station_icao]['CODE'].values[0]
+        jobs = self.download_jobs()
+        years = [int(Path(filename).stem) for _, filename, _ in jobs]
         print(f'Downloading {self.station_icao} data...')
-        for year in range(self.start_year, self.end_year, 1):
-            url = f'https://www.ncei.noaa.gov/data/global-hourly/access/{year}/{station_isd}.csv'
-            Path(
-                f'data/01_raw/{self.station_icao}').mkdir(parents=True, exist_ok=True)
-            filename = f'data/01_raw/{self.station_icao}/{year}.csv'
-            # Only download if file does not exist
-            if not os.path.exists(filename):
-                try:
-                    urllib.request.urlretrieve(url, filename)
-                except urllib.error.HTTPError as exception:
-                    print(f'Unfortunately there is no {year} data available'
-                          f' for {self.station_icao}: Error {exception.code}')
-                    continue
+        Path(self.raw_path).mkdir(parents=True, exist_ok=True)
+        with metrics.stage('download', station=self.station_icao, files=len(jobs)) as stage:
+            results = self.downloader.download(jobs)
+            for result in results.values():
+                status = 'failed' if isinstance(result, Exception) else result
+                stage[status] = stage.get(status, 0) + 1
+        for year, (_, filename, _) in zip(years, jobs):
+            if isinstance(results[filename], Exception):
+                print(f'Unfortunately there is no {year} data available'
+                      f' for {self.station_icao}: Error {results[filename].code or results[filename]}')
         print('Download complete.')
         print('Now extracting data.')
-        data = self.unify_files()  # concatenate all years of data
-        data = self.extract_data(data)
-        path_processed = 'data/02_processed'
-        data.to_csv(f'{path_processed}/{self.station_icao}_isd_data.csv')
-        print(f'Processed data stored in {path_processed}.')
-        data.index = pd.to_datetime(data.index)
+        data = self.load_processed()
+        print(f'Processed data stored in {self.cache.path}.')
+        return data
+
+    def raw_files(self):
+        """
+        Lists the raw yearly files downloaded for the station
+        :return: a dictionary with the year as key and the file path as value
+        """
+        return {int(Path(file).stem): f'{self.raw_path}/{file}'
+                for file in sorted(os.listdir(path=self.raw_path))
+                if file.endswith('.csv') and Path(file).stem.isdigit()}
+
+    def read_raw_file(self, filename):
+        """
+        Reads one raw yearly file using the DATE column as index
+        """
+        return pd.read_csv(filename,
+                           index_col='DATE',
+                           error_bad_lines=False,
+                           engine="python")
+
+    def iter_raw_file(self, filename, columns=None, chunksize=20000):
+        """
+        Reads one raw yearly file in chunks, keeping only the ISD groups needed to extract 'columns'
+        and only the METAR observations, so the long unused groups are never loaded
+        :return: a generator of raw dataframes indexed by DATE
+        """
+        usecols = ['DATE', 'REPORT_TYPE'] + self.decoder.groups(columns)
+        reader = pd.read_csv(filename,
+                             usecols=lambda column: column in usecols,
+                             dtype=str,
+                             chunksize=chunksize,
+                             error_bad_lines=False)
+        for chunk in reader:
+            chunk = chunk[chunk['REPORT_TYPE'].isin(self.report_types)]
+            yield chunk.set_index('DATE')
+
+    def extract_archived(self, year, filename, source_hash, columns=None):
+        """
+        Extracts one year from the raw archive, converting the raw file into it first when needed
+        :return: a dataframe with a datetime index
+        """
+        raw = self.archive.load(year, source_hash, self.report_types)
+        if raw is None:
+            metrics.count('bytes_read', os.path.getsize(filename))
+            with metrics.stage('archive', station=self.station_icao, year=year) as stage:
+                stage['rows'] = self.archive.store(year, source_hash, filename)
+            raw = self.archive.load(year, source_hash, self.report_types)
+        else:
+            metrics.count('archive_hits')
+        return apply_schema(self.decoder.decode(raw, columns))
+
+    def stream_data(self, columns=None, chunksize=20000):
+        """
+        Yields the processed data year by year, so memory is bounded by the size of one year of compact data.
+        Cached years are loaded at once; the others are read and extracted in chunks (or from the raw archive)
+        and stored in the cache when all the columns were extracted with the default cleaning rules.
+        :param columns: list of columns to extract (default: all of IsdDecoder.columns)
+        :return: a generator of dataframes with a datetime index
+        """
+        self.cached_years = []
+        self.extracted_years = []
+        self.quality = []
+        for year, filename in self.raw_files().items():
+            source_hash = self.cache.file_hash(filename)
+            # The cache has the default columns, extracted with the default rules
+            cached = not self.decoder.custom_rules and set(columns or []) <= set(self.decoder.columns)
+            data = self.cache.load(year, source_hash) if cached else None
+            if data is not None:
+                metrics.count('cache_hits')
+                self.cached_years.append(year)
+                yield self.validate(data if columns is None else data[list(columns)])
+                continue
+            metrics.count('cache_misses')
+            try:
+                with metrics.stage('extract', station=self.station_icao, year=year) as stage:
+                    if self.archive is not None:
+                        data = self.extract_archived(year, filename, source_hash, columns)
+                    else:
+                        metrics.count('bytes_read', os.path.getsize(filename))
+                        chunks = []
+                        for chunk in self.iter_raw_file(filename, columns, chunksize):
+                            chunk = apply_schema(self.decoder.decode(chunk, columns))
+                            chunk.index = pd.to_datetime(chunk.index, format='%Y-%m-%dT%H:%M:%S')
+                            chunks.append(chunk)
+                        data = pd.concat(chunks)
+                    stage['rows'] = len(data)
+            except Exception as exception:
+                print(f'{year} data for {self.station_icao} could not be processed: {exception}')
+                continue
+            if columns is None and not self.decoder.custom_rules:
+                self.cache.store(year, source_hash, data)
+            self.extracted_years.append(year)
+            yield self.validate(data)
+
+    def validate(self, data):
+        """
+        Applies the validator to the processed data of one year, keeping its quality report in self.quality
+        """
+        if self.validator is None:
+            return data
+        data, report = self.validator.validate(data)
+        self.quality.append(report)
+        metrics.count('rows_invalid', int(report['invalid'].sum()))
+        if self.validator.action == 'drop':
+            metrics.count('rows_dropped', int(report['invalid'].sum()))
+        return data
+
+    def settings(self):
+        """
+        :return: dictionary with the cleaning rules and the validation applied to the processed data,
+        so whatever is derived from it can tell when they change
+        """
+        return {'decoder': self.decoder.rules,
+                'validator': None if self.validator is None else self.validator.settings()}
+
+    def quality_report(self):
+        """
+        Joins the quality reports of the years validated and stores them in the station processed data directory
+        :return: dataframe with the year as index (see DataValidator.report)
+        """
+        report = pd.concat(self.quality).groupby(level='year').sum()
+        self.cache.path.mkdir(parents=True, exist_ok=True)
+        report.to_csv(self.cache.path / 'quality.csv')
+        return report
+
+    def load_processed(self):
+        """
+        Loads the processed data of every raw yearly file,
+        extracting only the years which are not cached or whose raw file has changed
+        :return: a dataframe with all the years concatenated and a datetime index
+        """
+        with metrics.stage('load_processed', station=self.station_icao) as stage:
+            data = pd.concat(list(self.stream_data()), sort=False)
+            stage['rows'] = len(data)
+        print(f'{len(self.cached_years)} of {len(self.cached_years) + len(self.extracted_years)} '
+              f'years loaded from cache.')
+        if self.validator is not None and self.quality:
+            report = self.quality_report()
+            print(f'{report["invalid"].sum()} of {report["observations"].sum()} observations broke some validation '
+                  f'rule ({self.validator.action}), report stored in {self.cache.path / "quality.csv"}.')
         return data
 
     def unify_files(self):
@@ -61,17 +229,13 @@ class GetIsdData:
         Takes all the raw downloaded files and unites them into one file
         :return: a dictionary with the airport ICAO as key and dataframes with all the years concatenated as values
         """
-        csv_list = os.listdir(path=f'data/01_raw/{self.station_icao}')
         grouped = []
-        for file in sorted(csv_list):
+        for filename in self.raw_files().values():
             # DATE column is used as index
             try:
-                df = pd.read_csv(f'data/01_raw/{self.station_icao}/{file}',
-                                 index_col='DATE',
-                                 error_bad_lines=False,
-                                 engine="python")
-            except:
-                f'{file} data for {self.station_icao} could not be processed.'
+                df = self.read_raw_file(filename)
+            except Exception as exception:
+                print(f'{filename} data for {self.station_icao} could not be processed: {exception}')
                 continue
             grouped.append(df)
         # Stores all data data into a dataframe
@@ -79,179 +243,21 @@ class GetIsdData:
         data = data.set_index(data.index)  # Sets index to datetime format
         return data
 
-    def get_variable(self, data, column, column_list):
-        """
-        This function access the raw 'df' (pandas dataframe),
-        uses a list with the 'column' name (str) to explore the variable column,
-        receives a 'column_list' of the columns names and
-        returns a dataframe with the extracted data for the variable indicated.
-        """
-        variable = pd.DataFrame(data[column], columns=[column])
-        variable = variable[column].str.split(',', expand=True)
-        variable.columns = column_list
-        return variable
-
     def calculate_rh(self, temperature, dew):
         """
         Receives air temperature (t) and dew point (d) and returns relative humidity
         RH = 100*(EXP((17.625*TD)/(243.04+TD))/EXP((17.625*T)/(243.04+T)))
         """
-        rh_list = []
-        for t, d in zip(temperature, dew):
-            rh = 100 * ((math.exp((17.625 * d) / (243.04 + d))) /
-                        (math.exp((17.625 * t) / (243.04 + t))))
-            rh_list.append(rh)
-        return rh_list
+        return self.decoder.calculate_rh(temperature, dew)
 
-    def extract_data(self, data):
+    def extract_data(self, data, columns=None):
         """
-        Contains instructions based on ISD documentation to extract data into a usable format
+        Contains instructions based on ISD documentation to extract data into a usable format,
+        with the compact dtypes defined in d01_data.schema
         License: https://www.ncdc.noaa.gov/isd/data-access
         Documentation: https://www.ncei.noaa.gov/data/global-hourly/doc/isd-format-document.pdf
+        :param columns: list of columns to extract (default: all of IsdDecoder.columns)
         """
         # Selecting ONLY METAR observations to avoid redundancies
-        data = data[data['REPORT_TYPE'].isin(['FM-15', 'FM-16', 'SY-MT'])]
-
-        # Extracting wind data from WND column
-        wind_cols = ['direction', 'quality',
-                     'type_code', 'speed', 'speed_quality']
-        wind = self.get_variable(data, 'WND', wind_cols)
-
-        # Extracting visibility data from VIS column
-        visibility_cols = ['visibility', 'quality',
-                           'variability', 'quality_variability']
-        visibility = self.get_variable(data, 'VIS', visibility_cols)
-
-        # Extracting first group of sigwx data from MW1 column
-        phenomenon_cols = ['phenomenon', 'quality']
-        phenomenon1 = self.get_variable(data, 'MW1', phenomenon_cols)
-
-        # Extracting sky cover from GA1 columns
-        sky_cover_cols = ['coverage', 'quality', 'base_height', 'base_height_quality', 'cloud_type',
-                          'cloud_type_quality']
-        sky_cover1 = self.get_variable(data, 'GA1', sky_cover_cols)
-
-        # Extracting Ceiling data from CIG column
-        ceiling_cols = ['ceiling', 'quality', 'determination_code', 'cavok']
-        ceiling = self.get_variable(data, 'CIG', ceiling_cols)
-
-        # Extracting air temperature data from TMP column
-        temperature_cols = ['temperature', 'quality']
-        temperature = self.get_variable(data, 'TMP', temperature_cols)
-
-        # Extracting dew point temperature data from DEW column
-        dew_cols = ['dew', 'quality']
-        dew = self.get_variable(data, 'DEW', dew_cols)
-
-        # Concatenating all data into a base df containing the meteorological variables
-        base_data = pd.concat([wind[['direction', 'speed']].fillna(99999),
-                               visibility[['visibility']].fillna(99999),
-                               phenomenon1[['phenomenon']].fillna(99999),
-                               sky_cover1[['coverage']].fillna(99999),
-                               ceiling[['ceiling']].fillna(99999),
-                               ceiling[['cavok']].fillna(99999),
-                               temperature[['temperature']].fillna(99999),
-                               dew[['dew']].fillna(99999)],
-                              axis=1)
-
-        # Note that there were no information on sea level pressure, which will be extracted from REM column
-        # Iterating over the METAR messages to extract the slp values
-        metar = data['REM'].to_list()
-        pressure = []
-        for code in metar:
-            # the values are put into the list pressure, which will be appended to the final data frame
-            try:
-                slp = str(re.findall(r"Q\d.+", code))
-                pressure.append(slp[3:7])
-            except TypeError:
-                pressure.append(np.nan)
-
-        # Sea Level Pressure
-        # As we extracted the slp values from METAR message using regex,
-        # some typos corrupted the data extracted. Let's just ignore them...
-        dirty = [str(i) for i in pressure]
-
-        clean = []
-        for value in dirty:
-            if not value.isdigit():
-                clean.append(np.nan)
-            else:
-                clean.append(value)
-
-        clean = [float(x) for x in clean]
-        base_data['slp'] = clean
-
-        base_data.columns = ['direction', 'speed', 'visibility',
-                             'phenomenon', 'coverage',
-                             'ceiling', 'cavok', 'temperature', 'dew', 'slp']
-
-        # Some corrections in the data...
-        # Wind
-        # According with the manual, wind direction as 999 can be missing or variable wind.
-        # It can be calm too, as seen by the data (comparing them to METAR)...
-        # When the wind is calm, let's set them to 0
-        base_data['direction'].loc[(base_data['direction'] == 999) & (
-            base_data['speed'] == 0)] = 0
-        base_data['speed'].loc[(base_data['direction'] == 999) & (
-            base_data['speed'] == 0)] = 0
-
-        # When the wind is variable, let's set only the direction to 0
-        base_data['direction'].loc[(base_data['direction'] == 999) & (
-            base_data['speed'] != 0)] = 0
-
-        # According to the manual, speed_rate seen as 9999 means it is missing.
-        # Or it is just a typo at the METAR. Let's just delete them...
-        base_data['speed'].loc[base_data['speed'] == 9999] = 0
-
-        # Visibility
-        # The manual says visibility values of 999999 means they are missing.
-        # If CAVOK is Y, it means the visibility is greater than 10000 meters...
-        # Also, values of visibility above 10,000m must not be considered as restrictive to the operations,
-        # thus, let's just set them as unlimited...
-        # Ignoring non significant visibility values (above 9000)
-        base_data['visibility'] = base_data['visibility'].astype(int)
-        base_data['visibility'].loc[base_data['visibility'] >= 10000] = 10000
-        base_data['visibility'].loc[base_data['visibility'] == 999999] = np.nan
-
-        # Ceiling
-        # According to the manual, ceiling regarded as 99999 means it's missing (from the METAR)
-        # and 22000 means unlimited...
-        # BUT... "ceiling values above 1600m (5000ft) are not considered ceiling" Lets just make them NaN...
-        base_data['ceiling'] = base_data['ceiling'].astype(int)
-        base_data['ceiling'].loc[(base_data['ceiling'] > 1599)] = np.nan
-
-        # Temperature
-        # Temperature and dew are scaled by 10, let's downscale them...
-        base_data['temperature'] = base_data['temperature'].astype(int) / 10
-        base_data['dew'] = base_data['dew'].astype(int) / 10
-
-        # The manual says temperature/dew values above 9999 means they are missing...
-        base_data['temperature'] = base_data['temperature'].astype(int)
-        base_data['temperature'].loc[base_data['temperature'] > 99] = np.nan
-        base_data['dew'] = base_data['dew'].astype(int)
-        base_data['dew'].loc[base_data['dew'] > 99] = np.nan
-
-        # Also, values of pressure greater than 1040 and lesser than 980 are absurd.
-        # They are probably typos as well so let's get rid of them...
-        # base_data['slp'][(base_data['slp'] > 1040) | (base_data['slp'] < 960)] = np.nan
-
-        # Correcting data for standard units
-        # Wind direction is in degrees, which is fine...
-        # Wind Speed is in meters per second and scaled by 10, let's downscale them and convert to knots...
-        base_data['speed'] = base_data['speed'].astype(int) * 0.194384
-        base_data['speed'] = base_data['speed'].astype(int)
-
-        # Ceiling is in meters, let's set them to feet
-        base_data['ceiling'] = base_data['ceiling'] * 3.28084
-
-        # Visibility is in meters, which is fine...
-
-        # Pressure is in Hectopascal, which is fine...
-
-        # Create a column for relative humidity using a previously defined function
-        base_data['rh'] = self.calculate_rh(
-            base_data['temperature'], base_data['dew'])
-
-        base_data.replace(to_replace=99999, value=np.nan, inplace=True)
-
-        return base_data
+        data = data[data['REPORT_TYPE'].isin(self.report_types)]
+        return apply_schema(self.decoder.decode(data, columns))
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+class ProcessedCache:
+    """
+    Keeps the extracted ISD data of a station as one directory per year,
+    each column stored as a memory-mappable .npy file.
+    Every entry records the hash of the raw file it was extracted from,
+    so only new or modified years need to be extracted again.
+    """
+
+    # Bump whenever the layout or the extraction rules change
+    version = 7
+
+    def __init__(self, icao, path='data/02_processed'):
+        self.station_icao = icao
+        self.path = Path(path) / icao
+
+    @staticmethod
+    def file_hash(filename, block_size=1 << 20):
+        """
+        Computes the SHA-1 digest of a raw file
+        :return: hexadecimal digest (str)
+        """
+        digest = hashlib.sha1()
+        with open(filename, 'rb') as file:
+            for block in iter(lambda: file.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def year_path(self, year):
+        return self.path / str(year)
+
+    def read_meta(self, year):
+        meta_file = self.year_path(year) / 'meta.json'
+        if not meta_file.exists():
+            return None
+        with open(meta_file) as file:
+            return json.load(file)
+
+    def load(self, year, source_hash):
+        """
+        Loads the cached data of a year if it was extracted from a raw file with the same hash
+        :return: a dataframe indexed by DATE, or None when the entry is missing or stale
+        """
+        meta = self.read_meta(year)
+        if meta is None or meta['version'] != self.version or meta['source_hash'] != source_hash:
+            return None
+        year_path = self.year_path(year)
+        index = pd.DatetimeIndex(np.load(year_path / 'index.npy', mmap_mode='r'), name='DATE')
+        columns = {}
+        for column, kind in meta['columns'].items():
+            # Copy-on-write maps keep the loaded data writable without touching the files
+            values = np.load(year_path / f'{column}.npy', mmap_mode='c')
+            if kind == 'category':
+                values = pd.Categorical.from_codes(values, meta['categories'][column])
+            elif kind == 'nullable':
+                mask = np.load(year_path / f'{column}.mask.npy', mmap_mode='c')
+                values = pd.array(values, dtype=meta['dtypes'][column])
+                values[mask] = pd.NA
+            elif kind == 'object':
+                # Strings were stored with a separate mask for the missing values
+                mask = np.load(year_path / f'{column}.mask.npy', mmap_mode='c')
+                values = pd.Series(values, index=index, dtype=object).where(~mask)
+            columns[column] = values
+        return pd.DataFrame(columns, index=index)
+
+    def store(self, year, source_hash, data):
+        """
+        Writes the extracted data of a year next to the hash of its raw file.
+        The entry is written to a temporary directory and then renamed,
+        so an interrupted run never leaves a half-written year behind.
+        """
+        year_path = self.year_path(year)
+        temporary_path = self.path / f'.{year}.tmp'
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        temporary_path.mkdir(parents=True)
+
+        index = pd.to_datetime(data.index).values.astype('datetime64[ns]')
+        np.save(temporary_path / 'index.npy', index)
+        kinds = {}
+        dtypes = {}
+        categories = {}
+        for column in data.columns:
+            values = data[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                np.save(temporary_path / f'{column}.npy', values.cat.codes.values)
+                categories[column] = values.cat.categories.tolist()
+                kinds[column] = 'category'
+            elif pd.api.types.is_extension_array_dtype(values.dtype):
+                # Nullable integers are stored as plain integers plus the mask of missing values
+                mask = values.isna().values
+                np.save(temporary_path / f'{column}.mask.npy', mask)
+                np.save(temporary_path / f'{column}.npy', values.fillna(0).values.to_numpy(values.dtype.numpy_dtype))
+                dtypes[column] = str(values.dtype)
+                kinds[column] = 'nullable'
+            elif values.dtype == object:
+                mask = values.isna().values
+                np.save(temporary_path / f'{column}.mask.npy', mask)
+                np.save(temporary_path / f'{column}.npy', values.where(~mask, '').astype(str).values.astype(str))
+                kinds[column] = 'object'
+            else:
+                np.save(temporary_path / f'{column}.npy', values.values)
+                kinds[column] = str(values.dtype)
+
+        meta = {'version': self.version,
+                'source_hash': source_hash,
+                'rows': len(data),
+                'columns': kinds,
+                'dtypes': dtypes,
+                'categories': categories}
+        with open(temporary_path / 'meta.json', 'w') as file:
+            json.dump(meta, file, indent=2)
+
+        shutil.rmtree(year_path, ignore_errors=True)
+        os.replace(temporary_path, year_path)
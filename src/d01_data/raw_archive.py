@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+class ArchivedYear:
+    """
+    Raw ISD groups of one year read from a RawArchive, with the same interface the IsdDecoder uses on a raw
+    dataframe ('group' in year, year[group], len(year), year.index).
+    Every group is a fixed-width bytes array memory-mapped from its file when it is first used,
+    so only the groups needed by the decoded columns are ever read.
+    """
+
+    def __init__(self, path, groups, index, rows=None):
+        """
+        :param path: directory of the year in the archive
+        :param groups: names of the groups stored
+        :param index: datetime index of the rows used
+        :param rows: boolean mask of the rows used (default: all of them)
+        """
+        self.path = path
+        self.groups = groups
+        self.index = index
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, group):
+        return group in self.groups
+
+    def __getitem__(self, group):
+        if group not in self.groups:
+            raise KeyError(group)
+        values = np.load(self.path / f'{group}.npy', mmap_mode='r')
+        return values if self.rows is None else values[self.rows]
+
+
+class RawArchive:
+    """
+    Keeps the raw ISD groups used by the extraction (see RawArchive.groups) of a station
+    as one directory per year, each group stored as a fixed-width bytes (S dtype) .npy file
+    and the DATE column as datetime64.
+    The raw files are parsed only once: extracting them again with other cleaning rules
+    (see IsdDecoder.default_rules) memory-maps the groups needed instead of reading the CSV files.
+    Every year records the hash of the raw file it was converted from, as in ProcessedCache.
+    """
+
+    # Bump whenever the layout changes
+    version = 1
+
+    groups = ['REPORT_TYPE', 'WND', 'CIG', 'VIS', 'TMP', 'DEW', 'MW1', 'GA1', 'REM']
+
+    def __init__(self, icao, path='data/02_processed'):
+        self.station_icao = icao
+        self.path = Path(path) / icao / 'raw' / f'v{self.version}'
+
+    def year_path(self, year):
+        return self.path / str(year)
+
+    def read_meta(self, year):
+        meta_file = self.year_path(year) / 'meta.json'
+        if not meta_file.exists():
+            return None
+        with open(meta_file) as file:
+            return json.load(file)
+
+    def load(self, year, source_hash, report_types=None):
+        """
+        Opens the archived year if it was converted from a raw file with the same hash
+        :param report_types: keep only the rows of these report types (default: all the rows)
+        :return: an ArchivedYear, or None when the year is missing or stale
+        """
+        meta = self.read_meta(year)
+        if meta is None or meta['source_hash'] != source_hash:
+            return None
+        year_path = self.year_path(year)
+        index = pd.DatetimeIndex(np.load(year_path / 'DATE.npy', mmap_mode='r'), name='DATE')
+        rows = None
+        if report_types is not None:
+            report_type = np.load(year_path / 'REPORT_TYPE.npy', mmap_mode='r')
+            rows = np.isin(report_type, np.asarray(report_types, dtype=report_type.dtype))
+            if rows.all():
+                rows = None
+            else:
+                index = index[rows]
+        return ArchivedYear(year_path, meta['groups'], index, rows)
+
+    def store(self, year, source_hash, filename):
+        """
+        Converts a raw yearly file into the archive.
+        The year is written to a temporary directory and then renamed,
+        so an interrupted run never leaves a half-written year behind.
+        :return: number of rows stored
+        """
+        data = pd.read_csv(filename,
+                           usecols=lambda column: column in ['DATE'] + self.groups,
+                           dtype=str,
+                           keep_default_na=False,
+                           error_bad_lines=False)
+        year_path = self.year_path(year)
+        temporary_path = self.path / f'.{year}.tmp'
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        temporary_path.mkdir(parents=True)
+
+        dates = pd.to_datetime(data['DATE'], format='%Y-%m-%dT%H:%M:%S')
+        np.save(temporary_path / 'DATE.npy', dates.values.astype('datetime64[ns]'))
+        # Files only have the columns of the groups reported during that year
+        groups = [group for group in self.groups if group in data]
+        for group in groups:
+            # Non-ASCII characters (only found in free text) are replaced by '?', keeping their positions
+            values = data[group].str.encode('ascii', 'replace').values
+            np.save(temporary_path / f'{group}.npy', values.astype(bytes))
+
+        meta = {'version': self.version,
+                'source_hash': source_hash,
+                'rows': len(data),
+                'groups': groups}
+        with open(temporary_path / 'meta.json', 'w') as file:
+            json.dump(meta, file, indent=2)
+
+        shutil.rmtree(year_path, ignore_errors=True)
+        os.replace(temporary_path, year_path)
+        return len(data)
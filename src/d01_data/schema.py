@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from d01_data.decode_isd import MetarParser
+
+# Processed observation table: column -> dtype
+# Nullable integers (capitalised dtypes) keep missing values in a mask instead of sentinels,
+# and the ISD codes are categoricals with fixed categories so years can be concatenated.
+SCHEMA = {'direction': 'UInt16',  # degrees
+          'speed': 'UInt8',  # knots
+          'visibility': 'UInt16',  # meters
+          'phenomenon': pd.CategoricalDtype(range(100)),  # ISD present weather code (MW1)
+          'coverage': pd.CategoricalDtype(range(11)),  # ISD sky cover code (GA1)
+          'ceiling': 'float32',  # feet
+          'cavok': pd.CategoricalDtype(['N', 'Y']),
+          'temperature': 'Int16',  # tenths of ºC
+          'dew': 'Int16',  # tenths of ºC
+          'slp': 'float32',  # hPa
+          'rh': 'float32',  # %
+          # ISD quality flags of the fields (see DataValidator.suspect_flags)
+          **{f'{field}_quality': pd.CategoricalDtype(['0', '1', '2', '3', '4', '5', '6', '7', '9',
+                                                      'A', 'C', 'I', 'M', 'P', 'R', 'U'])
+             for field in ['direction', 'speed', 'visibility', 'ceiling', 'temperature', 'dew']},
+          # Parsed from the METAR (see MetarParser), only when requested
+          'qnh': 'float32',  # hPa
+          'gust': 'UInt8',  # knots
+          'wind_variable_from': 'UInt16',  # degrees
+          'wind_variable_to': 'UInt16',  # degrees
+          'rvr': 'UInt16',  # meters
+          **{f'cloud_amount_{layer}': pd.CategoricalDtype(MetarParser.cloud_amounts)
+             for layer in range(1, MetarParser.max_layers + 1)},
+          **{f'cloud_height_{layer}': 'UInt32' for layer in range(1, MetarParser.max_layers + 1)},  # feet
+          **{f'cloud_type_{layer}': pd.CategoricalDtype(MetarParser.cloud_types)
+             for layer in range(1, MetarParser.max_layers + 1)}}
+
+# Columns stored as scaled integers: column -> scale
+SCALES = {'temperature': 10,
+          'dew': 10}
+
+
+def apply_schema(data):
+    """
+    Converts the processed data (in physical units) to the compact dtypes of SCHEMA.
+    Integer values that do not fit their dtype become missing.
+    Columns already in the schema dtype are kept as they are.
+    """
+    data = data.copy()
+    for column, dtype in SCHEMA.items():
+        if column not in data or data[column].dtype == dtype:
+            continue
+        values = data[column]
+        if isinstance(dtype, pd.CategoricalDtype):
+            data[column] = values.astype(dtype)
+            continue
+        values = values.astype('float64') * SCALES.get(column, 1)
+        if dtype[0] in 'UI':
+            limits = np.iinfo(dtype.lower())
+            values = values.round().where((values >= limits.min) & (values <= limits.max))
+        data[column] = values.astype(dtype)
+    return data
+
+
+def to_physical(data, column):
+    """
+    Returns a column in physical units as float64, with NaN for the missing values
+    """
+    return data[column].astype('float64') / SCALES.get(column, 1)
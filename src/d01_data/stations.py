@@ -0,0 +1,112 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+class StationCatalog:
+    """
+    Index of the ISD stations which have an ICAO code, built once from isd_all_stations.csv
+    and persisted as a memory-mapped .npy structured array sorted by ICAO.
+    The index is rebuilt whenever the station list is newer than it.
+    The text fields are as wide as the longest value in the list, so no code is ever cut.
+    """
+
+    # Bumped whenever the layout of the index changes, so older indexes are never read
+    version = 2
+
+    dtype = [('icao', 'U'), ('code', 'U'), ('country', 'U'),
+             ('begin', 'i2'), ('end', 'i2'), ('lat', 'f4'), ('lon', 'f4')]
+
+    def __init__(self, path='data/01_raw/isd_all_stations.csv', index_path=None):
+        self.path = Path(path)
+        self.index_path = Path(index_path or f'data/02_processed/isd_stations.v{self.version}.npy')
+        self._stations = None
+
+    def build(self):
+        """
+        Reads the station list and writes the index.
+        When an ICAO code has more than one ISD station, the first one of the list is kept.
+        """
+        isd_station = pd.read_csv(self.path, index_col=False, dtype=str)
+        isd_station = isd_station.dropna(subset=['ICAO']).drop_duplicates(subset=['ICAO'], keep='first')
+        # CODE is kept as text to preserve its leading zeros
+        text = {'icao': isd_station['ICAO'].values, 'code': isd_station['CODE'].fillna('').values,
+                'country': isd_station['COUNTRY'].fillna('').values}
+        dtype = []
+        for field, kind in self.dtype:
+            if field in text:
+                kind = f'U{max([1] + [len(value) for value in text[field]])}'
+            dtype.append((field, kind))
+        stations = np.empty(len(isd_station), dtype=dtype)
+        for field, values in text.items():
+            stations[field] = values
+        # BEGIN and END are dates as YYYYMMDD, only the years are needed
+        stations['begin'] = isd_station['BEGIN'].str[:4].astype(int).values
+        stations['end'] = isd_station['END'].str[:4].astype(int).values
+        stations['lat'] = isd_station['LAT'].astype(float).values
+        stations['lon'] = isd_station['LON'].astype(float).values
+        stations.sort(order='icao', kind='stable')
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.index_path.with_name(f'.{self.index_path.name}.tmp.npy')
+        np.save(temporary, stations)
+        os.replace(temporary, self.index_path)
+
+    @property
+    def stations(self):
+        if self._stations is None:
+            if not self.index_path.exists() or self.index_path.stat().st_mtime < self.path.stat().st_mtime:
+                self.build()
+            self._stations = np.load(self.index_path, mmap_mode='r')
+        return self._stations
+
+    def positions(self, icaos):
+        """
+        Binary searches the ICAO codes in the sorted index, so no other structure is built over it
+        :return: array with the position of each ICAO code in the index and a boolean array of the ones found
+        """
+        icaos = np.asarray(icaos, dtype=str)
+        stations = self.stations
+        positions = np.searchsorted(stations['icao'], icaos).clip(max=max(len(stations) - 1, 0))
+        found = (stations['icao'][positions] == icaos) if len(stations) else np.zeros(icaos.shape, dtype=bool)
+        return positions, found
+
+    def lookup(self, icao):
+        """
+        :return: dictionary with the code, country, coverage years and coordinates of a station
+        """
+        position, found = self.positions(icao)
+        if not found:
+            raise KeyError(f'{icao} is not an ISD station.')
+        station = self.stations[position]
+        return {field: station[field].item() for field in station.dtype.names}
+
+    def resolve(self, icaos):
+        """
+        Maps many ICAO codes to their ISD codes at once
+        :return: dictionary with the ICAO as key and the ISD code as value (None for unknown stations)
+        """
+        icaos = np.asarray(list(icaos), dtype=str)
+        positions, found = self.positions(icaos)
+        codes = self.stations['code'][positions]
+        return {icao: (str(code) if is_found else None) for icao, code, is_found in zip(icaos, codes, found)}
+
+    def years(self, icao, start_year, end_year):
+        """
+        Restricts a range of years to the ones the station has data for.
+        Stations reporting up to the last year of the list are considered still active.
+        :return: range of years
+        """
+        station = self.lookup(icao)
+        if station['end'] >= self.stations['end'].max():
+            return range(max(start_year, station['begin']), end_year)
+        return range(max(start_year, station['begin']), min(end_year, station['end'] + 1))
+
+    def by_country(self, countries):
+        """
+        :return: list of ICAO codes of the stations of the given countries
+        """
+        stations = self.stations
+        return stations['icao'][np.isin(stations['country'], list(countries))].tolist()
@@ -0,0 +1,160 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from d01_data.schema import to_physical
+
+# A declarative validation rule
+# name: identifies the rule in the reports; kind: 'range', 'order' or 'quality';
+# columns: the columns checked, which are the ones made missing by the 'mask' action;
+# parameters: (min, max) physical limits for 'range', the column the values must not exceed for 'order',
+# and the rejected ISD quality flags (checked in the '<column>_quality' columns) for 'quality'
+Rule = namedtuple('Rule', ['name', 'kind', 'columns', 'parameters'])
+
+
+class DataValidator:
+    """
+    Checks the processed observations against a set of rules, each evaluated as one vectorized mask,
+    and counts the observations breaking each rule by year.
+    The observations breaking some rule are then flagged, masked or dropped in a single pass:
+    - flag: the 'quality_flags' column holds the rules broken by each observation, one bit per rule
+    - mask: the values checked by the rules broken (and the columns derived from them) are made missing
+    - drop: the observations breaking any rule are removed
+    Rules whose columns were not extracted are skipped.
+    """
+
+    # ISD quality codes of suspect (2, 6) and erroneous (3, 7) values
+    suspect_flags = ['2', '3', '6', '7']
+
+    default_rules = [Rule('dew_above_temperature', 'order', ['dew'], 'temperature'),
+                     Rule('slp_out_of_range', 'range', ['slp'], (960, 1040)),
+                     Rule('temperature_out_of_range', 'range', ['temperature', 'dew'], (-90, 60)),
+                     Rule('speed_out_of_range', 'range', ['speed'], (0, 150)),
+                     Rule('wind_suspect', 'quality', ['direction', 'speed'], suspect_flags),
+                     Rule('visibility_suspect', 'quality', ['visibility'], suspect_flags),
+                     Rule('ceiling_suspect', 'quality', ['ceiling'], suspect_flags),
+                     Rule('temperature_suspect', 'quality', ['temperature'], suspect_flags),
+                     Rule('dew_suspect', 'quality', ['dew'], suspect_flags)]
+
+    # Columns computed from others, masked with them
+    derived = {'rh': ['temperature', 'dew']}
+
+    actions = ['flag', 'mask', 'drop']
+
+    def __init__(self, rules=None, action='flag'):
+        """
+        :param rules: list of Rule (default: default_rules), at most 32
+        :param action: what is done to the observations breaking some rule, one of actions
+        """
+        self.rules = list(self.default_rules if rules is None else rules)
+        if action not in self.actions:
+            raise ValueError(f'Unknown action {action}, use one of: {", ".join(self.actions)}.')
+        if len(self.rules) > 32:
+            raise ValueError('There can be at most 32 rules.')
+        kinds = {rule.kind for rule in self.rules} - {'range', 'order', 'quality'}
+        if kinds:
+            raise ValueError(f'Unknown kind of rule: {", ".join(sorted(kinds))}')
+        self.action = action
+
+    def needed(self, rule):
+        """
+        :return: the columns read by a rule
+        """
+        if rule.kind == 'order':
+            return rule.columns + [rule.parameters]
+        if rule.kind == 'quality':
+            return [f'{column}_quality' for column in rule.columns]
+        return list(rule.columns)
+
+    def masks(self, data):
+        """
+        Evaluates the rules whose columns are in 'data'. Missing values never break a rule.
+        :return: dictionary with the rule name as key and a boolean array of the observations breaking it as value
+        """
+        masks = {}
+        for rule in self.rules:
+            if not set(self.needed(rule)) <= set(data.columns):
+                continue
+            mask = np.zeros(len(data), dtype=bool)
+            if rule.kind == 'range':
+                low, high = rule.parameters
+                for column in rule.columns:
+                    values = to_physical(data, column).values
+                    mask |= (values < low) | (values > high)
+            elif rule.kind == 'order':
+                limit = to_physical(data, rule.parameters).values
+                for column in rule.columns:
+                    mask |= to_physical(data, column).values > limit
+            else:
+                for column in rule.columns:
+                    mask |= data[f'{column}_quality'].isin(rule.parameters).values
+            masks[rule.name] = mask
+        return masks
+
+    def report(self, data, masks):
+        """
+        Counts the observations of each year breaking each rule
+        :return: dataframe with the year as index and the observations, one column per rule
+        and the observations breaking any rule ('invalid') as columns
+        """
+        years, year_codes = np.unique(pd.DatetimeIndex(data.index).year, return_inverse=True)
+        invalid = np.zeros(len(data), dtype=bool)
+        counts = {'observations': np.bincount(year_codes, minlength=len(years))}
+        for name, mask in masks.items():
+            counts[name] = np.bincount(year_codes[mask], minlength=len(years))
+            invalid |= mask
+        counts['invalid'] = np.bincount(year_codes[invalid], minlength=len(years))
+        return pd.DataFrame(counts, index=pd.Index(years, name='year'))
+
+    def apply(self, data, masks):
+        """
+        Flags, masks or drops the observations breaking some rule, according to the action
+        :return: the validated dataframe
+        """
+        if self.action == 'drop':
+            invalid = np.zeros(len(data), dtype=bool)
+            for mask in masks.values():
+                invalid |= mask
+            return data[~invalid]
+        data = data.copy()
+        if self.action == 'flag':
+            bits = {rule.name: np.uint32(1 << position) for position, rule in enumerate(self.rules)}
+            flags = np.zeros(len(data), dtype=np.uint32)
+            for name, mask in masks.items():
+                flags[mask] |= bits[name]
+            data['quality_flags'] = flags
+            return data
+        rules = {rule.name: rule for rule in self.rules}
+        invalid = {}
+        for name, mask in masks.items():
+            for column in rules[name].columns:
+                invalid[column] = invalid.get(column, False) | mask
+        for column, sources in self.derived.items():
+            for source in sources:
+                if source in invalid and column in data:
+                    invalid[column] = invalid.get(column, False) | invalid[source]
+        for column, mask in invalid.items():
+            data[column] = data[column].mask(mask)
+        return data
+
+    def settings(self):
+        """
+        :return: dictionary with the action and the rules, identifying what the validation does to the data
+        """
+        return {'action': self.action, 'rules': [list(rule) for rule in self.rules]}
+
+    def validate(self, data):
+        """
+        Checks the observations and applies the action in one pass
+        :return: the validated dataframe and its report (see report)
+        """
+        masks = self.masks(data)
+        return self.apply(data, masks), self.report(data, masks)
+
+    def broken_rules(self, flags):
+        """
+        Decodes the 'quality_flags' of an observation flagged by the 'flag' action
+        :return: list with the names of the rules it breaks
+        """
+        return [rule.name for position, rule in enumerate(self.rules) if int(flags) >> position & 1]
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+class ClimatologyAggregates:
+    """
+    Summaries of the processed data of a station, merged from its YearlyAggregates (see
+    YearlyAggregates.climatology) and stored as small tables:
+    - variables: monthly box plot statistics (quartiles, Tukey whiskers, mean, count) of each variable
+    - fliers: the distinct values out of the whiskers of each variable and month
+    - phenomena: number of observations of each phenomenon by hour and month
+    """
+
+    tables = ['variables', 'fliers', 'phenomena']
+
+    def __init__(self, variables, fliers, phenomena):
+        self.variables = variables
+        self.fliers = fliers
+        self.phenomena = phenomena
+
+    def boxplot_table(self, variable):
+        """
+        :return: long dataframe (month, stat, value) with the statistics and fliers of a variable,
+        which can be turned back into box plots with boxes_from_table
+        """
+        stats = (self.variables[self.variables['variable'] == variable]
+                 .melt(id_vars=['variable', 'month'], var_name='stat')[['month', 'stat', 'value']])
+        fliers = self.fliers[self.fliers['variable'] == variable].assign(stat='flier')[['month', 'stat', 'value']]
+        return pd.concat([stats, fliers], ignore_index=True).sort_values(['month', 'stat'], kind='stable')
+
+    @staticmethod
+    def boxes_from_table(table):
+        """
+        :return: list with one dictionary per month, as expected by matplotlib's Axes.bxp
+        """
+        stats = table[table['stat'] != 'flier'].pivot(index='month', columns='stat', values='value')
+        fliers = table[table['stat'] == 'flier'].groupby('month')['value']
+        boxes = []
+        for month, row in stats.iterrows():
+            box = {stat: row[stat] for stat in ['mean', 'med', 'q1', 'q3', 'whislo', 'whishi']}
+            box['label'] = month
+            box['fliers'] = fliers.get_group(month).values if month in fliers.groups else np.array([])
+            boxes.append(box)
+        return boxes
+
+    def boxplot_stats(self, variable):
+        """
+        :return: list with one dictionary per month, as expected by matplotlib's Axes.bxp
+        """
+        return self.boxes_from_table(self.boxplot_table(variable))
+
+    def phenomenon_matrix(self, phenomenon, hours=range(24), months=range(1, 13)):
+        """
+        :return: hour x month dataframe with the number of observations of a phenomenon
+        """
+        counts = self.phenomena[self.phenomena['phenomenon'] == phenomenon]
+        return (counts.pivot_table(index='hour', columns='month', values='count', aggfunc='sum', fill_value=0)
+                .reindex(index=list(hours), columns=list(months), fill_value=0))
+
+    def save(self, path):
+        Path(path).mkdir(parents=True, exist_ok=True)
+        for table in self.tables:
+            getattr(self, table).to_csv(f'{path}/{table}.csv', index=False)
+
+    @classmethod
+    def load(cls, path):
+        return cls(*[pd.read_csv(f'{path}/{table}.csv') for table in cls.tables])
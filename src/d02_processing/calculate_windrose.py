@@ -1,14 +1,20 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import warnings
+from d00_utils.metrics import instrumented
 
 warnings.filterwarnings('ignore')
 
 
 class WindRose:
 
+    # Speed bins (knots) closed on the right; the calm winds (0 kt) are counted apart, in the calm column
+    spd_bins = [0, 5, 10, 15, 20, 25, 30, np.inf]
+    # Direction bins centered on every 15 degrees, closed on the left
+    dir_bins = np.arange(-7.5, 370, 15)
+    # Points sampled along the arc of each bar
+    arc_points = 8
+
     def __init__(self):
         self.directions = np.arange(0, 360, 15)
 
@@ -17,9 +23,7 @@ class WindRose:
     def speed_labels(self, bins, units):
         labels = []
         for left, right in zip(bins[:-1], bins[1:]):
-            if left == bins[0]:
-                labels.append('calmo'.format(right))
-            elif np.isinf(right):
+            if np.isinf(right):
                 labels.append(f'>{left} {units}')
             else:
                 labels.append(f'{left} - {right} {units}')
@@ -33,10 +37,12 @@ class WindRose:
         barWidth = 2 * np.pi / N
         return barDir, barWidth
 
+    @instrumented('create_rosedata')
     def create_rosedata(self, data):
         """
         Determine the relative percentage of observation in each speed and direction bin
         Here's how we do it:
+        -leave the calm observations out of the direction bins, as they are counted apart
         -assign a speed bin for each row with pandas.cut
         -assign a direction bin for each row (again, pandas.cut)
         -unify the 360° and 0° bins under the 0° label
@@ -45,29 +51,31 @@ class WindRose:
         -unstack (pivot) the speed bins into columns
         -fill missing values with 0
         -assign a "calm" column to be the total number of calm observations evenly distributed across all directions
-        -sort the columns -- they are a catgorical index, so "calm" will be first (this is awesome!)
+        -sort the columns so "calm" is first and the speed bins follow in increasing order
         -convert all of the counts to percentages of the total number of observations
             """
         # Define our bins and labels for speed and wind
-        spd_bins = [-1, 0, 5, 10, 15, 20, 25, 30, np.inf]
+        spd_bins = self.spd_bins
         spd_labels = self.speed_labels(spd_bins, units='nós')
 
-        dir_bins = np.arange(-7.5, 370, 15)
+        dir_bins = self.dir_bins
         dir_labels = (dir_bins[:-1] + dir_bins[1:]) / 2
 
         # Determine the total number of observations and how many have calm conditions
         total_count = data.shape[0]
-        calm_count = data[data['speed'] == 0].shape[0]
+        calm = data['speed'] == 0
+        calm_count = int(calm.sum())
+        winds = data[~calm.fillna(False).astype(bool)]
 
         rose = (
-            data.assign(
+            winds.assign(
                 Spd_bins=pd.cut(
-                    pd.to_numeric(data['speed']), bins=spd_bins, labels=spd_labels, right=True
+                    winds['speed'].astype('float64'), bins=spd_bins, labels=spd_labels, right=True
                 )
             )
                 .assign(
                 Dir_bins=pd.cut(
-                    pd.to_numeric(data['direction']), bins=dir_bins, labels=dir_labels, right=False
+                    winds['direction'].astype('float64'), bins=dir_bins, labels=dir_labels, right=False
                 )
             )
                 .replace({"Dir_bins": {360: 0}})
@@ -76,7 +84,7 @@ class WindRose:
                 .unstack(level="Spd_bins")
                 .fillna(0)
                 .assign(calm=lambda df: calm_count / df.shape[0])
-                .sort_index(axis=1)
+                .reindex(columns=['calm'] + spd_labels, fill_value=0)
                 .applymap(lambda x: x / total_count * 100)
         )
         directions = np.arange(0, 360, 15)
@@ -89,35 +97,44 @@ class WindRose:
 
     # Define our wind rose function
     def create_windrose(self, windrose_data, palette=None):
+        # Imported here so computing the rose tables never loads the plotting libraries
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(10, 8), subplot_kw=dict(polar=True))
+        self.draw_windrose(ax, windrose_data, palette)
+        ax.legend(loc=(1, 0), ncol=1)
+        return fig
+
+    def draw_windrose(self, ax, windrose_data, palette=None):
+        """
+        Draws the stacked bars of a wind rose on a polar axes, so many roses can share a figure.
+        Each speed bin is a single collection of wedges, much faster to draw than one bar patch per direction.
+        :param windrose_data: rose table (see create_rosedata), with the calm column first
+        """
+        import seaborn as sns
+        from matplotlib.collections import PolyCollection
+
         if palette is None:
             palette = sns.color_palette('coolwarm', n_colors=windrose_data.shape[1])
 
         bar_dir, bar_width = self._convert_dir()
-
-        fig, ax = plt.subplots(figsize=(10, 8), subplot_kw=dict(polar=True))
         ax.set_theta_direction('clockwise')
         ax.set_theta_zero_location('N')
 
-        for n, (c1, c2) in enumerate(zip(windrose_data.columns[:-1], windrose_data.columns[1:])):
-            if n == 0:
-                # first column only
-                ax.bar(bar_dir, windrose_data[c1].values,
-                       width=bar_width,
-                       color=palette[0],
-                       edgecolor='none',
-                       label=c1,
-                       linewidth=0)
-
-            # all other columns
-            ax.bar(bar_dir, windrose_data[c2].values,
-                   width=bar_width,
-                   bottom=windrose_data.cumsum(axis=1)[c1].values,
-                   color=palette[n + 1],
-                   edgecolor='none',
-                   label=c2,
-                   linewidth=0)
-
-        ax.legend(loc=(1, 0), ncol=1)
+        # The arcs are sampled in data coordinates, so the polar transform maps each wedge as a plain polygon
+        theta = bar_dir[:, None] + np.linspace(-bar_width / 2, bar_width / 2, self.arc_points)[None, :]
+        theta = np.concatenate([theta, theta[:, ::-1]], axis=1)
+        # Each speed bin is stacked on top of the slower ones
+        tops = windrose_data.cumsum(axis=1).values
+        bottoms = np.hstack([np.zeros((len(tops), 1)), tops[:, :-1]])
+        for n, column in enumerate(windrose_data.columns):
+            radius = np.repeat(np.stack([tops[:, n], bottoms[:, n]], axis=1), self.arc_points, axis=1)
+            ax.add_collection(PolyCollection(np.stack([theta, radius], axis=2), facecolor=palette[n],
+                                             edgecolor='none', linewidth=0, label=column), autolim=False)
+        # The radial axis ends at the longest bar, as it did with the bar patches
+        # (or at 1% when every bar is zero, e.g. only variable winds, as a zero range is singular)
+        ax.set_ylim(0, tops[:, -1].max() or 1)
+
+        ax.set_xticks(np.deg2rad(np.arange(0, 360, 45)))
         ax.set_xticklabels(['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW'])
-
-        return fig
+        return ax
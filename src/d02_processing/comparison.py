@@ -0,0 +1,202 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from d01_data.dataset import IsdDataset
+from d02_processing.calculate_windrose import WindRose
+from d02_processing.runway_usability import RunwayUsability
+
+
+class StationComparison:
+    """
+    Side by side metrics of many stations, computed over the observations of all of them at once:
+    every observation gets the position of its station, and the counts are made with a single bincount
+    over station x month x hour (or station x direction x speed) cells.
+    - fog (visibility below fog_visibility) and low ceiling (below low_ceiling) frequencies by hour and month
+    - crosswind exceedance: share of the winds above each crosswind limit on every runway of the station
+      (or on the best single runway orientation when the runways are unknown)
+    - wind rose divergence: Jensen-Shannon divergence between the wind roses of every pair of stations
+    """
+
+    # Visibility (m) and ceiling (ft) below which an observation counts as fog or low ceiling
+    fog_visibility = 1000
+    low_ceiling = 500
+    # Crosswind limits (kt)
+    crosswind_limits = [10, 15, 20]
+    # Winds are counted by degree and knot; faster winds are counted as max_speed
+    max_speed = 99
+    # Processed columns used
+    columns = ['direction', 'speed', 'visibility', 'ceiling']
+
+    def __init__(self, stations, observations, fog, low_ceiling, wind, runways=None):
+        """
+        :param stations: ICAO codes, along the first axis of the arrays
+        :param observations: station x month x hour number of observations
+        :param fog: station x month x hour number of observations with fog
+        :param low_ceiling: station x month x hour number of observations with low ceiling
+        :param wind: station x direction (0-360 degrees) x speed (0-max_speed kt) number of observations
+        :param runways: dictionary with the runway headings (degrees) of some stations, e.g. {'SBGR': [90]}
+        """
+        self.stations = list(stations)
+        self.observations = observations
+        self.fog = fog
+        self.low_ceiling_counts = low_ceiling
+        self.wind = wind
+        self.runways = runways or {}
+
+    @classmethod
+    def compute(cls, datasets, runways=None):
+        """
+        :param datasets: dictionary with the ICAO as key and its processed data (or IsdDataset) as value
+        :param runways: dictionary with the runway headings (degrees) of some stations
+        """
+        stations = list(datasets)
+        codes, months, hours, visibility, ceiling, direction, speed = [], [], [], [], [], [], []
+        for code, icao in enumerate(stations):
+            dataset = datasets[icao] if isinstance(datasets[icao], IsdDataset) else IsdDataset(datasets[icao])
+            data = dataset.data
+            codes.append(np.full(len(dataset), code, dtype=np.int32))
+            months.append(dataset.month)
+            hours.append(dataset.hour)
+            visibility.append(data['visibility'].astype('float64').values)
+            ceiling.append(data['ceiling'].astype('float64').values)
+            direction.append(data['direction'].astype('float64').values)
+            speed.append(data['speed'].astype('float64').values)
+        codes, months, hours, visibility, ceiling, direction, speed = (
+            np.concatenate(array) if array else np.array([])
+            for array in [codes, months, hours, visibility, ceiling, direction, speed])
+
+        n_stations = len(stations)
+        cell = (codes * 12 + months.astype(np.int64) - 1) * 24 + hours
+        shape = (n_stations, 12, 24)
+        observations = np.bincount(cell, minlength=np.prod(shape)).reshape(shape)
+        # Comparisons with NaN are False, so missing values never count as fog or low ceiling
+        fog = np.bincount(cell, weights=visibility < cls.fog_visibility, minlength=np.prod(shape)).reshape(shape)
+        low_ceiling = np.bincount(cell, weights=ceiling < cls.low_ceiling, minlength=np.prod(shape)).reshape(shape)
+
+        # Calm winds have no direction; any direction gives them no crosswind and the roses count them apart
+        direction = np.where(speed == 0, 0, direction)
+        valid = ~np.isnan(direction) & ~np.isnan(speed) & (direction >= 0) & (direction <= 360) & (speed >= 0)
+        wind_cell = np.ravel_multi_index((codes[valid], direction[valid].round().astype(int),
+                                          np.minimum(speed[valid], cls.max_speed).astype(int)),
+                                         (n_stations, 361, cls.max_speed + 1))
+        wind = np.bincount(wind_cell, minlength=n_stations * 361 * (cls.max_speed + 1))
+        return cls(stations, observations, fog, low_ceiling, wind.reshape(n_stations, 361, cls.max_speed + 1),
+                   runways)
+
+    @classmethod
+    def crosswind(cls, headings):
+        """
+        :param headings: runway headings (degrees)
+        :return: heading x direction x speed array with the crosswind component (kt) of every wind of the cube
+        """
+        crosswind, _ = RunwayUsability.components(headings, np.arange(361)[:, None],
+                                                  np.arange(cls.max_speed + 1)[None, :])
+        return crosswind
+
+    def exceedance(self, limit, headings=None):
+        """
+        :param headings: runway headings tried (default: every degree from 0 to 179)
+        :return: station x heading array with the share of the winds above the crosswind limit on that runway
+        """
+        headings = np.arange(180) if headings is None else np.asarray(headings)
+        above = (self.crosswind(headings) > limit).reshape(len(headings), -1).astype(np.float64)
+        winds = self.wind.reshape(len(self.stations), -1).astype(np.float64)
+        total = np.maximum(winds.sum(axis=1), 1)
+        return (winds @ above.T) / total[:, None]
+
+    def crosswind_exceedance(self):
+        """
+        Share of the winds that exceed each crosswind limit on all the runways of a station,
+        using the best single orientation for the stations without runways
+        :return: dataframe with the stations as index, the exceedance (%) for each limit and the orientation used
+        """
+        table = pd.DataFrame(index=pd.Index(self.stations, name='station'))
+        winds = self.wind.reshape(len(self.stations), -1)
+        total = np.maximum(winds.sum(axis=1), 1)
+        for limit in self.crosswind_limits:
+            best = self.exceedance(limit)
+            values = best.min(axis=1)
+            orientation = best.argmin(axis=1).astype(float)
+            for position, icao in enumerate(self.stations):
+                if icao in self.runways:
+                    # A wind exceeds the limit only when it does on every runway
+                    above = (self.crosswind(self.runways[icao]) > limit).all(axis=0).ravel()
+                    values[position] = winds[position] @ above / total[position]
+                    orientation[position] = np.nan
+            table[f'crosswind_{limit}kt'] = values * 100
+            table[f'orientation_{limit}kt'] = orientation
+        return table
+
+    def frequencies(self):
+        """
+        :return: long dataframe (station, month, hour) with the number of observations
+        and the frequency (%) of fog and low ceiling
+        """
+        station, month, hour = np.indices(self.observations.shape).reshape(3, -1)
+        observations = self.observations.ravel()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.DataFrame({'station': np.asarray(self.stations)[station] if self.stations else [],
+                                 'month': month + 1,
+                                 'hour': hour,
+                                 'observations': observations,
+                                 'fog': self.fog.ravel() / observations * 100,
+                                 'low_ceiling': self.low_ceiling_counts.ravel() / observations * 100})
+
+    def roses(self):
+        """
+        :return: station x rose bin array with the probability of each bin of WindRose (the calm winds first,
+        then the direction x speed bins above calm)
+        """
+        speeds = np.arange(self.max_speed + 1)
+        directions = np.arange(361)
+        spd_bin = np.searchsorted(WindRose.spd_bins, speeds, side='left') - 1
+        dir_bin = (np.searchsorted(WindRose.dir_bins, directions, side='right') - 1) % (len(WindRose.dir_bins) - 2)
+        n_directions, n_speeds = len(WindRose.dir_bins) - 2, len(WindRose.spd_bins) - 1
+        # Calm winds are one bin whatever their direction
+        rose_bin = np.where(speeds[None, :] == 0, 0, 1 + dir_bin[:, None] * n_speeds + spd_bin[None, :])
+        counts = np.zeros((len(self.stations), 1 + n_directions * n_speeds))
+        for position in range(len(self.stations)):
+            counts[position] = np.bincount(rose_bin.ravel(), weights=self.wind[position].ravel(),
+                                           minlength=counts.shape[1])
+        return counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+
+    def divergence(self):
+        """
+        Jensen-Shannon divergence (base 2, from 0 for identical roses to 1) between the wind roses of every pair
+        :return: station x station dataframe
+        """
+        p = self.roses()
+        m = (p[:, None, :] + p[None, :, :]) / 2
+
+        def kl(a, b):
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return np.where(a > 0, a * np.log2(a / b), 0).sum(axis=-1)
+
+        divergence = (kl(p[:, None, :], m) + kl(p[None, :, :], m)) / 2
+        return pd.DataFrame(divergence, index=pd.Index(self.stations, name='station'), columns=self.stations)
+
+    def summary(self):
+        """
+        :return: dataframe with one row per station: observations, fog, low ceiling and calm frequencies (%)
+        and the crosswind exceedance
+        """
+        observations = self.observations.sum(axis=(1, 2))
+        total = np.maximum(observations, 1)
+        winds = np.maximum(self.wind.sum(axis=(1, 2)), 1)
+        table = pd.DataFrame({'observations': observations,
+                              'fog': self.fog.sum(axis=(1, 2)) / total * 100,
+                              'low_ceiling': self.low_ceiling_counts.sum(axis=(1, 2)) / total * 100,
+                              'calm': self.wind[:, :, 0].sum(axis=1) / winds * 100},
+                             index=pd.Index(self.stations, name='station'))
+        return table.join(self.crosswind_exceedance())
+
+    def save(self, path):
+        """
+        Writes the summary, the frequencies and the divergence tables as CSV files
+        """
+        Path(path).mkdir(parents=True, exist_ok=True)
+        self.summary().to_csv(f'{path}/summary.csv')
+        self.frequencies().to_csv(f'{path}/frequencies.csv', index=False)
+        self.divergence().to_csv(f'{path}/divergence.csv')
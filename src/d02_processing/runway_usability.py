@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+from d01_data.dataset import IsdDataset
+
+
+class RunwayUsability:
+    """
+    Runway usability of an airport (ICAO Annex 14): the share of the time at least one runway can be used
+    with the crosswind (and optionally the tailwind) within the limits.
+    Winds are counted once in a direction x speed x month x hour cube, and the wind components of every runway
+    are computed for the cells of the cube, so any set of runways and limits is a masked sum over it.
+    Calm winds have no crosswind and every runway can be used with them. Variable winds (no direction, some speed)
+    are counted apart by speed x month x hour: with their direction unknown, they only count as usable when
+    their speed itself is within the limits.
+    """
+
+    # Crosswind limits (kt) of the ICAO reference aircraft classes
+    crosswind_limits = [10, 15, 20]
+    # Directions are reported every 10 degrees in METAR; faster winds are counted as max_speed (kt)
+    direction_step = 10
+    max_speed = 60
+
+    def __init__(self, counts, variable=None):
+        """
+        :param counts: direction (0 to 360 every direction_step degrees) x speed (0 to max_speed kt) x month x hour
+        number of observations
+        :param variable: speed x month x hour number of observations with variable direction (default: none)
+        """
+        self.counts = counts
+        self.variable = np.zeros(counts.shape[1:], dtype=counts.dtype) if variable is None else variable
+        self.directions = np.arange(counts.shape[0]) * self.direction_step
+        self.speeds = np.arange(counts.shape[1])
+
+    @classmethod
+    def compute(cls, data):
+        """
+        :param data: IsdDataset or processed data with 'direction' and 'speed' (kt) columns and a datetime index
+        """
+        dataset = data if isinstance(data, IsdDataset) else IsdDataset(data)
+        direction = dataset.data['direction'].astype('float64').values
+        speed = dataset.data['speed'].astype('float64').values
+        # Calm winds have no direction: they are counted with no crosswind at any runway
+        direction = np.where(speed == 0, 0, direction)
+        # Observations without wind are left out
+        valid = ~np.isnan(speed) & (speed >= 0)
+        variable = valid & np.isnan(direction)
+        valid &= (direction >= 0) & (direction <= 360)
+        shape = (360 // cls.direction_step + 1, cls.max_speed + 1, 12, 24)
+        cell = np.ravel_multi_index((np.round(direction[valid] / cls.direction_step).astype(int),
+                                     np.minimum(speed[valid], cls.max_speed).astype(int),
+                                     dataset.month[valid] - 1, dataset.hour[valid]), shape)
+        variable_cell = np.ravel_multi_index((np.minimum(speed[variable], cls.max_speed).astype(int),
+                                              dataset.month[variable] - 1, dataset.hour[variable]), shape[1:])
+        return cls(np.bincount(cell, minlength=np.prod(shape)).reshape(shape),
+                   np.bincount(variable_cell, minlength=np.prod(shape[1:])).reshape(shape[1:]))
+
+    @staticmethod
+    def runway_headings(designators):
+        """
+        :param designators: runway designators, e.g. ['09L', '27R', '10']
+        :return: dictionary with the designator as key and its heading (degrees) as value
+        """
+        return {designator: int(designator[:2]) * 10 % 360 for designator in designators}
+
+    @staticmethod
+    def components(headings, directions, speeds):
+        """
+        Wind components for every runway and wind
+        :param headings: runway headings (degrees)
+        :param directions: directions the wind blows from (degrees), broadcast with speeds
+        :param speeds: wind speeds (kt)
+        :return: (crosswind, headwind) arrays with a leading runway axis; crosswind is always positive
+        and a negative headwind is a tailwind
+        """
+        angles = np.radians(np.asarray(directions, dtype=float)[None] -
+                            np.asarray(headings, dtype=float).reshape((-1,) + (1,) * np.ndim(directions)))
+        speeds = np.asarray(speeds, dtype=float)[None]
+        return np.abs(np.sin(angles)) * speeds, np.cos(angles) * speeds
+
+    def observation_components(self, data, runways):
+        """
+        :param data: processed data with 'direction' and 'speed' (kt) columns
+        :param runways: dictionary with the runway designator as key and its heading (degrees) as value
+        :return: dataframe with the crosswind and headwind of every observation on every runway,
+        missing for variable winds
+        """
+        speed = data['speed'].astype('float64').values
+        # Calm winds have no components; variable winds keep their missing direction
+        direction = np.where(speed == 0, 0, data['direction'].astype('float64').values)
+        crosswind, headwind = self.components(list(runways.values()), direction, speed)
+        columns = {}
+        for position, runway in enumerate(runways):
+            columns[f'crosswind_{runway}'] = crosswind[position]
+            columns[f'headwind_{runway}'] = headwind[position]
+        return pd.DataFrame(columns, index=data.index)
+
+    def usable(self, runways, crosswind_limit, tailwind_limit=None):
+        """
+        :param runways: runway headings (degrees), one per runway direction (e.g. [90, 270] for 09/27)
+        :return: runway x direction x speed boolean array, True where the runway can be used with that wind
+        """
+        crosswind, headwind = self.components(list(runways), self.directions[:, None], self.speeds[None, :])
+        usable = crosswind <= crosswind_limit
+        if tailwind_limit is not None:
+            usable &= -headwind <= tailwind_limit
+        return usable
+
+    def variable_usable(self, crosswind_limit, tailwind_limit=None):
+        """
+        :return: speed boolean array, True where any runway can be used with a variable wind of that speed,
+        whichever its direction
+        """
+        usable = self.speeds <= crosswind_limit
+        if tailwind_limit is not None:
+            usable &= self.speeds <= tailwind_limit
+        return usable
+
+    def usability(self, runways, crosswind_limits=None, tailwind_limit=None, by=('month', 'hour')):
+        """
+        Share of the observations with at least one usable runway
+        :param runways: dictionary with the runway designator as key and its heading (degrees) as value
+        :param by: breakdown of the table: ('month', 'hour'), ('month',), ('hour',) or ()
+        :return: dataframe with the limit and the breakdown as index, and the number of observations,
+        the usability (%) of the airport and of each runway alone and the variable winds (%) as columns
+        """
+        axes = {'month': 2, 'hour': 3}
+        by = [name for name in axes if name in by]
+        summed = tuple(axis for name, axis in axes.items() if name not in by)
+        counts = self.counts.sum(axis=summed, keepdims=True)
+        variable = self.variable.sum(axis=tuple(axis - 1 for axis in summed), keepdims=True)
+        observations = counts.sum(axis=(0, 1)) + variable.sum(axis=0)
+        tables = []
+        for limit in crosswind_limits or self.crosswind_limits:
+            usable = self.usable(runways.values(), limit, tailwind_limit)
+            variable_usable = np.tensordot(self.variable_usable(limit, tailwind_limit), variable, axes=1)
+            columns = {'observations': observations.ravel()}
+            with np.errstate(invalid='ignore', divide='ignore'):
+                # The airport is usable when any of its runways is
+                columns['usability'] = ((np.tensordot(usable.any(axis=0), counts, axes=2) + variable_usable) /
+                                        observations * 100).ravel()
+                for runway, runway_usable in zip(runways, usable):
+                    columns[runway] = ((np.tensordot(runway_usable, counts, axes=2) + variable_usable) /
+                                       observations * 100).ravel()
+                columns['variable'] = (variable.sum(axis=0) / observations * 100).ravel()
+            index = pd.MultiIndex.from_product([[limit]] + [range(1, 13) if name == 'month' else range(24)
+                                                            for name in by], names=['crosswind_limit'] + list(by))
+            tables.append(pd.DataFrame(columns, index=index))
+        return pd.concat(tables)
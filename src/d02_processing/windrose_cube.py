@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+from d02_processing.calculate_windrose import WindRose
+
+
+class WindRoseCube:
+    """
+    Counts the observations of a station in a single pass into a
+    direction bin x speed bin x month x hour (x year) cube.
+    All-time, monthly, hourly or any other rose is then a sum over a slice of the cube,
+    giving the same table as WindRose.create_rosedata.
+    """
+
+    def __init__(self, data, by_year=False):
+        """
+        :param data: processed data with 'direction' and 'speed' columns and a datetime index
+        :param by_year: keep a year dimension, so roses can be restricted to some years
+        """
+        self._set_bins()
+        index = pd.DatetimeIndex(data.index)
+        if by_year:
+            self.years = np.unique(index.year)
+            year = np.searchsorted(self.years, index.year)
+        else:
+            self.years = None
+            year = np.zeros(len(index), dtype=int)
+        n_years = 1 if self.years is None else len(self.years)
+
+        speed = data['speed'].astype('float64').values
+        direction = data['direction'].astype('float64').values
+        # pandas.cut equivalents: speed bins closed on the right, direction bins closed on the left
+        spd_bin = np.searchsorted(WindRose.spd_bins, speed, side='left') - 1
+        dir_bin = np.searchsorted(WindRose.dir_bins, direction, side='right') - 1
+        # The calm winds are only counted in the calm ring, never in a direction bin
+        valid = ((spd_bin >= 0) & (spd_bin < len(self.speed_labels)) &
+                 (dir_bin >= 0) & (dir_bin < len(WindRose.dir_bins) - 1))
+        # The 360 degrees bin is the same as the 0 degrees one
+        dir_bin[dir_bin == len(self.directions)] = 0
+
+        # Every observation counts in the total and the calm winds are counted apart,
+        # regardless of having a valid direction
+        time_bin = (year * 12 + index.month.values - 1) * 24 + index.hour.values
+        n_times = n_years * 12 * 24
+        self.totals = np.bincount(time_bin, minlength=n_times).reshape(n_years, 12, 24)
+        self.calms = np.bincount(time_bin, weights=speed == 0, minlength=n_times).reshape(n_years, 12, 24)
+
+        shape = (len(self.directions), len(self.speed_labels), n_years, 12, 24)
+        cell = np.ravel_multi_index((dir_bin[valid], spd_bin[valid], time_bin[valid]), shape[:2] + (n_times,))
+        self.counts = np.bincount(cell, minlength=np.prod(shape)).reshape(shape)
+
+    def _set_bins(self):
+        self.speed_labels = WindRose().speed_labels(WindRose.spd_bins, units='nós')
+        self.directions = (WindRose.dir_bins[:-2] + WindRose.dir_bins[1:-1]) / 2
+
+    @classmethod
+    def from_counts(cls, counts, calms, totals, years=None):
+        """
+        Rebuilds a cube from counts already made (e.g. merged from several cubes)
+        :param years: years along the year axis, or None for a cube without the year dimension
+        """
+        cube = cls.__new__(cls)
+        cube._set_bins()
+        cube.years = None if years is None else np.asarray(years)
+        cube.counts = counts
+        cube.calms = calms
+        cube.totals = totals
+        return cube
+
+    def _select(self, array, years, months, hours):
+        """
+        Sums the time dimensions (the last three axes) of 'array' over the selected years, months and hours
+        """
+        if years is not None:
+            if self.years is None:
+                raise ValueError('The cube was built without the year dimension (by_year=False).')
+            array = array[..., np.isin(self.years, years), :, :]
+        if months is not None:
+            array = array[..., np.asarray(months) - 1, :]
+        if hours is not None:
+            array = array[..., np.asarray(hours)]
+        return array.sum(axis=(-3, -2, -1))
+
+    def rose(self, months=None, hours=None, years=None):
+        """
+        Determines the relative percentage of observations in each speed and direction bin
+        for the selected months (1-12), hours (0-23) and years (default: all of them)
+        :return: a dataframe with the directions as index and the speed bins (preceded by 'calm') as columns
+        """
+        total = self._select(self.totals, years, months, hours)
+        if total == 0:
+            raise ValueError('There are no observations in the selected period.')
+        calm = self._select(self.calms, years, months, hours)
+        counts = self._select(self.counts, years, months, hours)
+
+        rose = pd.DataFrame(counts, index=pd.Index(self.directions, name='Dir_bins'), columns=self.speed_labels)
+        # The calm observations are evenly distributed across all directions
+        rose.insert(0, 'calm', calm / len(self.directions))
+        return rose / total * 100
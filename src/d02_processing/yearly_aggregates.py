@@ -0,0 +1,298 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from d01_data.dataset import IsdDataset
+from d02_processing.aggregates import ClimatologyAggregates
+from d02_processing.windrose_cube import WindRoseCube
+
+
+class YearlyAggregates:
+    """
+    Mergeable summaries of the observations of a station, usually one year of them:
+    - wind: direction bin x speed bin x month x hour counts, calms and totals (as in WindRoseCube)
+    - phenomena: number of observations of each phenomenon by hour and month
+    - histograms: month x value counts of each variable on a fixed grid, used as quantile sketches,
+      together with the sums needed for the means
+    Two aggregates are merged by adding their counts, so any period is a sum of years.
+    """
+
+    # Grid of the histograms (lowest value, highest value, resolution) in physical units.
+    # Values are rounded to the resolution and values out of the grid are left out.
+    grids = {'visibility': (0, 10000, 1),
+             'ceiling': (0, 5001, 1),
+             'temperature': (-60, 60, 0.1),
+             'dew': (-60, 60, 0.1),
+             'rh': (0, 100, 0.1),
+             'slp': (960, 1040, 0.1)}
+
+    def __init__(self, years, wind_counts, wind_calms, wind_totals, phenomena, phenomena_counts,
+                 histograms, sums, last, digest=None):
+        """
+        :param years: years summarised, along the year axis of the wind arrays
+        :param phenomena: names of the phenomena, along the first axis of phenomena_counts (phenomenon x hour x month)
+        :param histograms: dictionary with a month x grid value array of counts for each variable
+        :param sums: dictionary with the sum of each variable by month
+        :param last: timestamp of the last observation summarised
+        :param digest: digest of the observations summarised (see AggregateStore.digest), None when unknown
+        """
+        self.years = np.asarray(years)
+        self.wind_counts = wind_counts
+        self.wind_calms = wind_calms
+        self.wind_totals = wind_totals
+        self.phenomena = np.asarray(phenomena, dtype=str)
+        self.phenomena_counts = phenomena_counts
+        self.histograms = histograms
+        self.sums = sums
+        self.last = pd.Timestamp(last) if last is not None else None
+        self.digest = digest
+
+    @property
+    def rows(self):
+        return int(self.wind_totals.sum())
+
+    @classmethod
+    def grid_values(cls, variable):
+        low, high, resolution = cls.grids[variable]
+        decimals = max(0, -int(np.floor(np.log10(resolution))))
+        return np.round(low + np.arange(round((high - low) / resolution) + 1) * resolution, decimals)
+
+    @classmethod
+    def compute(cls, data, variables, phenomena):
+        """
+        Summarises the observations of a single year
+        :param data: processed data with 'direction' and 'speed' columns and a datetime index
+        :param variables: dataframe with the variables in physical units, aligned with 'data'
+        :param phenomena: series with the phenomenon of every observation, aligned with 'data'
+        """
+        index = pd.DatetimeIndex(data.index)
+        years = np.unique(index.year)
+        if len(years) != 1:
+            raise ValueError(f'Yearly aggregates need the data of a single year, got {list(years)}.')
+        cube = WindRoseCube(data, by_year=True)
+        month = index.month.values - 1
+
+        histograms, sums = {}, {}
+        for variable in cls.grids:
+            low, high, resolution = cls.grids[variable]
+            values = variables[variable].astype('float64').values
+            position = np.round((values - low) / resolution)
+            size = len(cls.grid_values(variable))
+            valid = (position >= 0) & (position < size)
+            cell = month[valid] * size + position[valid].astype(int)
+            histograms[variable] = np.bincount(cell, minlength=12 * size).reshape(12, size)
+            sums[variable] = np.bincount(month[valid], weights=values[valid], minlength=12)
+
+        names = phenomena.values
+        known = pd.notna(names)
+        names, codes = np.unique(names[known].astype(str), return_inverse=True)
+        cell = (codes * 24 + index.hour.values[known]) * 12 + month[known]
+        phenomena_counts = np.bincount(cell, minlength=len(names) * 24 * 12).reshape(len(names), 24, 12)
+
+        return cls(years, cube.counts, cube.calms, cube.totals, names, phenomena_counts,
+                   histograms, sums, index.max())
+
+    def merge(self, other):
+        """
+        Adds the counts of two aggregates, of the same or of different years
+        :return: new YearlyAggregates
+        """
+        years = np.union1d(self.years, other.years)
+
+        def by_year(array, array_years):
+            # Places the year axis (third from the end) of 'array' on the merged years
+            result = np.zeros(array.shape[:-3] + (len(years),) + array.shape[-2:], dtype=array.dtype)
+            result[..., np.searchsorted(years, array_years), :, :] = array
+            return result
+
+        phenomena = np.union1d(self.phenomena, other.phenomena)
+        phenomena_counts = np.zeros((len(phenomena), 24, 12), dtype=np.int64)
+        for aggregates in [self, other]:
+            phenomena_counts[np.searchsorted(phenomena, aggregates.phenomena)] += aggregates.phenomena_counts
+
+        lasts = [last for last in [self.last, other.last] if last is not None]
+        return YearlyAggregates(years,
+                                by_year(self.wind_counts, self.years) + by_year(other.wind_counts, other.years),
+                                by_year(self.wind_calms, self.years) + by_year(other.wind_calms, other.years),
+                                by_year(self.wind_totals, self.years) + by_year(other.wind_totals, other.years),
+                                phenomena, phenomena_counts,
+                                {variable: self.histograms[variable] + other.histograms[variable]
+                                 for variable in self.grids},
+                                {variable: self.sums[variable] + other.sums[variable] for variable in self.grids},
+                                max(lasts) if lasts else None)
+
+    def update(self, data, variables, phenomena):
+        """
+        Folds in the observations after the last one already summarised
+        :return: new YearlyAggregates (self when there is nothing new)
+        """
+        new = pd.DatetimeIndex(data.index) > self.last
+        if not new.any():
+            return self
+        return self.merge(self.compute(data[new], variables[new], phenomena[new]))
+
+    def windrose_cube(self):
+        """
+        :return: WindRoseCube with a year dimension, from the wind counts
+        """
+        return WindRoseCube.from_counts(self.wind_counts, self.wind_calms, self.wind_totals, self.years)
+
+    def quantile(self, variable, month, q):
+        """
+        Quantile of a variable in a month, interpolated linearly between ranks as pandas does
+        (exact for values on the grid of the variable)
+        """
+        counts = self.histograms[variable][month - 1]
+        total = counts.sum()
+        if total == 0:
+            return np.nan
+        values = self.grid_values(variable)
+        cumulative = np.cumsum(counts)
+        position = (total - 1) * q
+        low, high = values[np.searchsorted(cumulative, [np.floor(position), np.ceil(position)], side='right')]
+        return low + (high - low) * (position - np.floor(position))
+
+    def climatology(self):
+        """
+        Turns the histograms and phenomena counts into the tables drawn by Climatology
+        :return: ClimatologyAggregates
+        """
+        stats, fliers = [], []
+        for variable in self.grids:
+            values = self.grid_values(variable)
+            for month in range(1, 13):
+                counts = self.histograms[variable][month - 1]
+                count = counts.sum()
+                if count == 0:
+                    continue
+                q1, med, q3 = (self.quantile(variable, month, q) for q in [0.25, 0.5, 0.75])
+                present = counts > 0
+                within = present & (values >= q1 - 1.5 * (q3 - q1)) & (values <= q3 + 1.5 * (q3 - q1))
+                stats.append({'variable': variable, 'month': month, 'count': count,
+                              'mean': self.sums[variable][month - 1] / count, 'q1': q1, 'med': med, 'q3': q3,
+                              'whislo': values[within].min(), 'whishi': values[within].max()})
+                fliers += [{'variable': variable, 'month': month, 'value': value}
+                           for value in values[present & ~within]]
+
+        phenomenon, hour, month = np.nonzero(self.phenomena_counts)
+        phenomena = pd.DataFrame({'phenomenon': self.phenomena[phenomenon], 'hour': hour, 'month': month + 1,
+                                  'count': self.phenomena_counts[phenomenon, hour, month]})
+        return ClimatologyAggregates(pd.DataFrame(stats, columns=['variable', 'month', 'count', 'mean', 'q1', 'med',
+                                                                  'q3', 'whislo', 'whishi']),
+                                     pd.DataFrame(fliers, columns=['variable', 'month', 'value']),
+                                     phenomena)
+
+    def save(self, filename):
+        # Written to a temporary file and renamed, so an interrupted run keeps the previous file
+        filename = Path(filename)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {'years': self.years, 'wind_counts': self.wind_counts, 'wind_calms': self.wind_calms,
+                  'wind_totals': self.wind_totals, 'phenomena': self.phenomena,
+                  'phenomena_counts': self.phenomena_counts,
+                  'last': np.array([self.last.value if self.last is not None else -1]),
+                  'digest': np.array([self.digest or ''])}
+        for variable in self.grids:
+            arrays[f'histogram_{variable}'] = self.histograms[variable]
+            arrays[f'sum_{variable}'] = self.sums[variable]
+        # Unique to the process and thread, so concurrent writers never share it
+        temporary = filename.with_name(f'.{filename.stem}.{os.getpid()}-{threading.get_ident()}.tmp.npz')
+        np.savez_compressed(temporary, **arrays)
+        os.replace(temporary, filename)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as arrays:
+            last = arrays['last'][0]
+            digest = str(arrays['digest'][0]) if 'digest' in arrays else ''
+            return cls(arrays['years'], arrays['wind_counts'], arrays['wind_calms'], arrays['wind_totals'],
+                       arrays['phenomena'], arrays['phenomena_counts'],
+                       {variable: arrays[f'histogram_{variable}'] for variable in cls.grids},
+                       {variable: arrays[f'sum_{variable}'] for variable in cls.grids},
+                       pd.Timestamp(last) if last >= 0 else None, digest or None)
+
+
+class AggregateStore:
+    """
+    Keeps the YearlyAggregates of a station as one .npz file per year.
+    New observations are folded into the aggregates of their year,
+    and the aggregates of any period are merged from the stored years without reading the data again.
+    """
+
+    # Bump whenever the layout or the grids change
+    version = 3
+
+    def __init__(self, icao, path='data/02_processed'):
+        self.station_icao = icao
+        self.path = Path(path) / icao / 'aggregates' / f'v{self.version}'
+
+    def year_file(self, year):
+        return self.path / f'{year}.npz'
+
+    def years(self):
+        return sorted(int(filename.stem) for filename in self.path.glob('[0-9]*.npz'))
+
+    def load(self, year):
+        filename = self.year_file(year)
+        return YearlyAggregates.load(filename) if filename.exists() else None
+
+    @staticmethod
+    def digest(hashes, settings=None):
+        """
+        :param hashes: hashes of the observations (see pandas.util.hash_pandas_object)
+        :param settings: dictionary with the rules the observations were extracted and validated with
+        :return: hexadecimal digest of their values and settings
+        """
+        digest = hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode())
+        digest.update(np.ascontiguousarray(hashes).tobytes())
+        return digest.hexdigest()
+
+    def update(self, data, prepare, settings=None):
+        """
+        Brings the stored aggregates up to date with the data.
+        Only the observations after the last one stored for a year are summarised; a year is summarised again
+        from scratch when the observations up to that one no longer match the stored aggregates,
+        in number or in values (e.g. extracted or validated with other rules), as their digest is stored with them.
+        :param data: IsdDataset, or processed data with a datetime index
+        :param prepare: function returning the (variables, phenomena) of a slice of the data, as needed by
+        YearlyAggregates.compute, so they are only derived for the rows being summarised
+        :param settings: dictionary with the rules the data was extracted and validated with (see GetIsdData.settings)
+        :return: dictionary with the year as key and 'current', 'updated' or 'computed' as value
+        """
+        dataset = data if isinstance(data, IsdDataset) else IsdDataset(data)
+        status = {}
+        for year in dataset.years():
+            # The rows of the year are sorted, so the ones up to the last stored are a prefix of them
+            rows = dataset.select(years=[year])
+            hashes = pd.util.hash_pandas_object(rows, index=True).values
+            aggregates = self.load(year)
+            if aggregates is not None and aggregates.last is not None and \
+                    pd.DatetimeIndex(rows.index).searchsorted(aggregates.last, side='right') == aggregates.rows and \
+                    aggregates.digest == self.digest(hashes[:aggregates.rows], settings):
+                if len(rows) == aggregates.rows:
+                    status[year] = 'current'
+                    continue
+                new = rows.iloc[aggregates.rows:]
+                aggregates = aggregates.merge(YearlyAggregates.compute(new, *prepare(new)))
+                status[year] = 'updated'
+            else:
+                aggregates = YearlyAggregates.compute(rows, *prepare(rows))
+                status[year] = 'computed'
+            aggregates.digest = self.digest(hashes, settings)
+            aggregates.save(self.year_file(year))
+        return status
+
+    def window(self, years):
+        """
+        Merges the stored aggregates of some years (e.g. range(2015, 2025) for a rolling 10 year window)
+        :return: YearlyAggregates, or None when none of the years is stored
+        """
+        merged = None
+        for year in sorted(set(years) & set(self.years())):
+            aggregates = self.load(year)
+            merged = aggregates if merged is None else merged.merge(aggregates)
+        return merged
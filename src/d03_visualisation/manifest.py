@@ -0,0 +1,51 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+
+class BuildManifest:
+    """
+    Records, for every rendered file, a digest of the data and parameters it was drawn from,
+    so a figure is only rendered again when its inputs change or the file is missing
+    """
+
+    def __init__(self, path, settings=None):
+        """
+        :param settings: dictionary with the rules the data was extracted and validated with, part of every digest
+        """
+        self.path = Path(path)
+        self.settings = settings
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path) as file:
+                self.entries = json.load(file)
+
+    def digest(self, spec):
+        """
+        Hashes the kind, data, title and options of a PlotSpec
+        :return: hexadecimal digest (str)
+        """
+        digest = hashlib.sha1()
+        parameters = {'kind': spec.kind, 'title': spec.title, 'options': spec.options,
+                      'columns': list(spec.data.columns), 'index': spec.data.index.name, 'settings': self.settings}
+        digest.update(json.dumps(parameters, sort_keys=True, default=str).encode())
+        digest.update(pd.util.hash_pandas_object(spec.data, index=True).values.tobytes())
+        return digest.hexdigest()
+
+    def is_current(self, spec, digest=None):
+        digest = digest or self.digest(spec)
+        return self.entries.get(str(spec.filename)) == digest and os.path.exists(spec.filename)
+
+    def record(self, spec, digest=None):
+        self.entries[str(spec.filename)] = digest or self.digest(spec)
+
+    def save(self):
+        # Written to a temporary file and renamed, so an interrupted run keeps the previous manifest
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_name(f'.{self.path.name}.tmp')
+        with open(temporary, 'w') as file:
+            json.dump(self.entries, file, indent=1, sort_keys=True)
+        os.replace(temporary, self.path)
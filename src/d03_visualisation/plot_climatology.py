@@ -1,173 +1,335 @@
 import datetime
+from pathlib import Path
 import warnings
-from d01_data.get_data import GetIsdData
-from d02_processing.calculate_windrose import WindRose
-import seaborn as sns
-import matplotlib.pyplot as plt
-import locale
+from d00_utils.metrics import metrics
+from d01_data.dataset import IsdDataset
+from d01_data.schema import apply_schema, to_physical
+from d02_processing.runway_usability import RunwayUsability
+from d02_processing.yearly_aggregates import AggregateStore
+from d03_visualisation.manifest import BuildManifest
+from d03_visualisation.render import PlotSpec, render_all
 import pandas as pd
 import numpy as np
-from pathlib import Path
-import os
-import sys
 
 warnings.filterwarnings('ignore')
-locale.setlocale(locale.LC_ALL, 'pt_pt.UTF-8')
 
 
 class Climatology:
 
-    def __init__(self, data, icao):
-        self.data = data
+    figure_formats = ['png', 'svg', 'pdf', 'json']
+
+    def __init__(self, data, icao, workers=None, runways=None, figure_format='png', panels=False, settings=None):
+        """
+        :param workers: number of processes used to render the figures (default: number of CPUs)
+        :param runways: dictionary with the runway designator as key and its heading (degrees) as value,
+        e.g. {'09L': 94, '27R': 274}; the runway usability is only computed when it is given
+        :param figure_format: one of figure_formats; json writes the data of each figure instead of drawing it,
+        for client-side rendering
+        :param panels: draws the monthly and hourly wind roses as two multi-panel figures instead of 36 figures
+        :param settings: dictionary with the rules the data was extracted and validated with (see GetIsdData.settings),
+        so the stored aggregates and the figures are made again when they change
+        """
+        if figure_format not in self.figure_formats:
+            raise ValueError(f'Unknown figure format {figure_format}, use one of: {", ".join(self.figure_formats)}.')
+        # Sorted by time, with the year, month and hour keys computed once
+        self.dataset = IsdDataset(apply_schema(data))
+        self.data = self.dataset.data
         self.station_icao = icao
         self.output_path = f'data/03_img_output/{self.station_icao}'
         self.end_year = datetime.datetime.today().year - 1
         self.start_year = datetime.datetime.today().year - 10
+        self.workers = workers
+        self.runways = runways
+        self.figure_format = figure_format
+        self.panels = panels
+        self.settings = settings
+        self.aggregates_path = f'data/02_processed/{self.station_icao}/aggregates'
+        self._manifest = None
+        self._aggregates = None
+        self._yearly_aggregates = None
+        self._windrose_cube = None
+        self._runway_usability = None
 
-    def fix_wx_names(self):
+    @property
+    def manifest(self):
+        # Digests of the inputs of the figures already rendered in output_path
+        if self._manifest is None:
+            self._manifest = BuildManifest(f'{self.output_path}/manifest.json', self.settings)
+        return self._manifest
+
+    @property
+    def windrose_cube(self):
+        # Counted once and shared by all the wind roses
+        if self._windrose_cube is None:
+            self._windrose_cube = self.yearly_aggregates.windrose_cube()
+        return self._windrose_cube
+
+    def wx_names(self, data=None):
         # Wx
         # A csv file with all phenomenon codes was created using the ISD manual
         # Then they were put in a dict and then replaced in the rows
         codes = pd.read_csv('data/01_raw/wx_codes.csv',
                             sep=';', index_col=False)
         codes_dict = codes['Phenomenon'].to_dict()
-        self.data['phenomenon'] = self.data['phenomenon'].fillna(
-            0).astype(int).map(codes_dict)
-        return self.data
+        data = self.data if data is None else data
+        return data['phenomenon'].fillna(0).astype(int).map(codes_dict)
 
-    def plot_variables_climatology(self):
-        # Filter data to remove outliers (caused mostly by typos)
-        self.data[self.data['ceiling'] > 5001]['ceiling'] = np.nan
-        self.data[self.data['slp'] > 1040]['slp'] = np.nan
-        self.data[self.data['slp'] < 960]['slp'] = np.nan
-        self.data[self.data['visibility'] >= 9998]['visibility'] = np.nan
+    def fix_wx_names(self):
+        # A copy with the names of the phenomena, self.data is shared with the dataset and left untouched
+        return self.data.assign(phenomenon=self.wx_names())
 
-        # Plot boxplots with the variables
-        self.data['month'] = self.data.index.strftime('%b')
+    def physical_variables(self, data=None):
+        """
+        :param data: processed data (default: all the data of the station)
+        :return: the continuous variables in physical units, without the outliers (caused mostly by typos)
+        """
+        data = self.data if data is None else data
+        data = pd.DataFrame({column: to_physical(data, column)
+                             for column in ['visibility', 'ceiling', 'temperature', 'dew', 'rh', 'slp']})
+        data.loc[data['ceiling'] > 5001, 'ceiling'] = np.nan
+        data.loc[data['slp'] > 1040, 'slp'] = np.nan
+        data.loc[data['slp'] < 960, 'slp'] = np.nan
+        data.loc[data['visibility'] >= 9998, 'visibility'] = np.nan
+        return data
 
-        data = self.data[['month', 'visibility', 'ceiling',
-                          'temperature', 'dew', 'rh', 'slp']]
+    @property
+    def yearly_aggregates(self):
+        # Stored per year, updated with the new observations only and merged over the years of the data
+        if self._yearly_aggregates is None:
+            store = AggregateStore(self.station_icao)
+            with metrics.stage('aggregates', station=self.station_icao, rows=len(self.data)) as stage:
+                status = store.update(self.dataset, lambda rows: (self.physical_variables(rows), self.wx_names(rows)),
+                                      self.settings)
+                for year_status in status.values():
+                    stage[year_status] = stage.get(year_status, 0) + 1
+            updated = [year for year, year_status in status.items() if year_status != 'current']
+            print(f'{len(status) - len(updated)} of {len(status)} years of aggregates were up to date.')
+            self._yearly_aggregates = store.window(status)
+        return self._yearly_aggregates
 
-        variables = ['Mês',
-                     'Visibilidade (< 10.000 m)',
-                     'Teto (pés)',
-                     'Temperatura do Ar (ºC)',
-                     'Ponto de Orvalho (ºC)',
-                     'Umidade Relativa (%)',
-                     'QNH (hPa)']
+    @property
+    def aggregates(self):
+        # Merged from the yearly aggregates and stored as small tables
+        if self._aggregates is None:
+            self._aggregates = self.yearly_aggregates.climatology()
+            self._aggregates.save(self.aggregates_path)
+        return self._aggregates
 
-        data.columns = variables
+    @staticmethod
+    def month_labels():
+        return [datetime.date(2000, month, 1).strftime('%b') for month in range(1, 13)]
 
-        print('Plotting variables climatology.')
+    def variables_specs(self):
+        """
+        Creates the specs of the monthly boxplots of each variable
+        """
+        variables = {'visibility': 'Visibilidade (< 10.000 m)',
+                     'ceiling': 'Teto (pés)',
+                     'temperature': 'Temperatura do Ar (ºC)',
+                     'dew': 'Ponto de Orvalho (ºC)',
+                     'rh': 'Umidade Relativa (%)',
+                     'slp': 'QNH (hPa)'}
 
-        for variable in data.columns[1:]:
-            fig, ax = plt.subplots()
-            fig.set_size_inches((12, 6))
-            sns.boxplot(x=data.columns[0], y=variable, data=data, ax=ax)
-            plt.title(f'Valores mensais de {variable.split(" (")[0]} em {self.station_icao} '
-                      f'com dados de {self.start_year} a {self.end_year}')
-            variables_output_path = f'{self.output_path}/variaveis'
-            Path(variables_output_path).mkdir(parents=True, exist_ok=True)
-            filename = f'{variables_output_path}/{variable.lower().split(" (")[0].replace(" ", "_")}_' \
+        specs = []
+        for column, variable in variables.items():
+            title = f'Valores mensais de {variable.split(" (")[0]} em {self.station_icao} ' \
+                    f'com dados de {self.start_year} a {self.end_year}'
+            filename = f'{self.output_path}/variaveis/{variable.lower().split(" (")[0].replace(" ", "_")}_' \
                        f'{self.station_icao}_{self.start_year}-{self.end_year}.png'
-            plt.savefig(filename)
-        
-        print(f'Images stored in {variables_output_path}.')
+            specs.append(PlotSpec('bxp', self.aggregates.boxplot_table(column), filename, title,
+                                  {'labels': self.month_labels(), 'xlabel': 'Mês', 'ylabel': variable}))
+        return specs
+
+    def render(self, stage_name, specs_method):
+        """
+        Creates the specs and renders the figures whose inputs changed, recording it as a stage
+        :param specs_method: one of the *_specs methods
+        :return: list with the filenames rendered
+        """
+        with metrics.stage(stage_name, station=self.station_icao) as stage:
+            # The specs are created as png, then saved in the format chosen
+            specs = [spec._replace(filename=str(Path(spec.filename).with_suffix(f'.{self.figure_format}')))
+                     for spec in specs_method()]
+            filenames = render_all(specs, self.workers, self.manifest)
+            stage['figures'] = len(filenames)
+            stage['skipped'] = len(specs) - len(filenames)
+        metrics.count('figures_rendered', len(filenames))
+        metrics.count('figures_skipped', len(specs) - len(filenames))
+        return filenames
+
+    def plot_variables_climatology(self):
+        # Plot boxplots with the variables
+        print('Plotting variables climatology.')
+        self.render('plot_variables_climatology', self.variables_specs)
+        print(f'Images stored in {self.output_path}/variaveis.')
+
+    def wx_specs(self):
+        """
+        Creates the specs of the hour x month frequency heatmaps of each phenomenon
+        """
+        phenomena = sorted(self.aggregates.phenomena['phenomenon'].unique())
+        hours = self.dataset.hours()
+        months = self.dataset.months()
+        labels = self.month_labels()
+
+        specs = []
+        for wx in phenomena:
+            heatmap_data = self.aggregates.phenomenon_matrix(wx, hours, months)
+            title = f'Frequência de {wx} em {self.station_icao} com dados de {self.start_year} a {self.end_year}'
+            filename = f'{self.output_path}/fenomenos_significativos/wx_{wx}_{self.station_icao}_2011-2019.png'
+            specs.append(PlotSpec('heatmap', heatmap_data, filename, title,
+                                  {'xticklabels': [labels[month - 1] for month in months],
+                                   'xlabel': 'Mês', 'ylabel': 'Hora (UTC)'}))
+        return specs
 
     def plot_wx(self):
         # Plot wx
-        self.data = self.fix_wx_names()
-        self.data['month'] = self.data.index.month
-        self.data['hour'] = self.data.index.hour
-        phenomena = sorted(set(self.data['phenomenon']))
-        months = self.data.index.strftime('%b').unique()
-        
         print('Plotting phenomena climatology.')
+        self.render('plot_wx', self.wx_specs)
+        print(f'Phenomena climatology stored in {self.output_path}/fenomenos_significativos.')
 
-        for wx in phenomena:
-            filtered_data = self.data[self.data['phenomenon'] == wx]
-            fig, ax = plt.subplots(figsize=(10, 8))
-            heatmap_data = pd.pivot_table(filtered_data,
-                                          index='hour',
-                                          columns='month',
-                                          values='phenomenon',
-                                          fill_value=0,
-                                          aggfunc='count').reindex(sorted(self.data['hour'].unique()),
-                                                                   columns=self.data['month'].unique(), fill_value=0)
-            sns.heatmap(heatmap_data, cmap='Blues')
-            ax.set_xticklabels(months)
-            plt.yticks(rotation=0)
-            ax.set_xlabel('Mês')
-            ax.set_ylabel('Hora (UTC)')
-            plt.suptitle(
-                f'Frequência de {wx} em {self.station_icao} com dados de {self.start_year} a {self.end_year}')
-            phenomena_output_path = f'{self.output_path}/fenomenos_significativos'
-            Path(phenomena_output_path).mkdir(parents=True, exist_ok=True)
-            filename = f'{phenomena_output_path}/wx_{wx}_{self.station_icao}_2011-2019.png'
-            plt.savefig(filename)
-
-        print(f'Phenomena climatology stored in {phenomena_output_path}.')
+    def windrose_specs(self):
+        """
+        Creates the spec of the all time wind rose
+        """
+        filename = f'{self.output_path}/rosa_dos_ventos_total/windrose_all_time_' \
+                   f'{self.station_icao}_{self.start_year}-{self.end_year}.png'
+        title = f'Rosa dos ventos de {self.station_icao} com dados de {self.start_year} a {self.end_year}'
+        return [PlotSpec('windrose', self.windrose_cube.rose(), filename, title, {})]
 
     def plot_windrose(self):
         # Plot windrose
         print('Plotting all time windroses.')
-        all_time_windrose_output_path = f'{self.output_path}/rosa_dos_ventos_total'
-        Path(all_time_windrose_output_path).mkdir(parents=True, exist_ok=True)
-        filename = f'{all_time_windrose_output_path}/windrose_all_time_' \
-            f'{self.station_icao}_{self.start_year}-{self.end_year}.png'
-        if not os.path.exists(filename):
-            windrose = WindRose()
-            windrose_data = windrose.create_rosedata(self.data)
-            windrose.create_windrose(windrose_data)
-            plt.suptitle(
-                f'Rosa dos ventos de {self.station_icao} com dados de {self.start_year} a {self.end_year}')
-            plt.savefig(filename)
-
-        print(f'Images stored in {all_time_windrose_output_path}.')
+        self.render('plot_windrose', self.windrose_specs)
+        print(f'Images stored in {self.output_path}/rosa_dos_ventos_total.')
 
-    def plot_monthly_windrose(self):
-        # Create the phenomena frequency for each month
-        print('Plotting monthly windroses.')
+    def monthly_windrose_specs(self):
+        """
+        Creates the specs of the wind roses of each month
+        """
         year = {1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril', 5: 'Maio', 6: 'Junho',
                 7: 'Julho', 8: 'Agosto', 9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'}
 
+        specs = []
+        roses = {}
         for month_number, month_name in year.items():
-            data = self.data[self.data.index.month.isin([month_number])]
+            filename = f'{self.output_path}/rosa_dos_ventos_mensal/windrose_monthly_{month_number:02}_{month_name}_' \
+                       f'{self.station_icao}_{self.start_year}-{self.end_year}.png'
             try:
-                monthly_windrose_output_path = f'{self.output_path}/rosa_dos_ventos_mensal'
-                Path(monthly_windrose_output_path).mkdir(
-                    parents=True, exist_ok=True)
-                filename = f'{monthly_windrose_output_path}/windrose_monthly_{month_number:02}_{month_name}_' \
-                           f'{self.station_icao}_{self.start_year}-{self.end_year}.png'
-                if not os.path.exists(filename):
-                    windrose = WindRose()
-                    windrose_data = windrose.create_rosedata(data)
-                    windrose.create_windrose(windrose_data)
-                    plt.suptitle(f'Rosa dos ventos de {self.station_icao} com dados de {self.start_year} a {self.end_year}\n'
-                                 f'{month_name.upper()}')
-                    plt.savefig(filename)
-            except (ValueError, ZeroDivisionError, TypeError):
+                windrose_data = self.windrose_cube.rose(months=[month_number])
+            except ValueError:
+                # There is no data for this month
                 continue
-        print(f'Images stored in {monthly_windrose_output_path}.')
+            roses[month_name] = windrose_data
+            title = f'Rosa dos ventos de {self.station_icao} com dados de {self.start_year} a {self.end_year}\n' \
+                    f'{month_name.upper()}'
+            specs.append(PlotSpec('windrose', windrose_data, filename, title, {}))
+        if self.panels and roses:
+            filename = f'{self.output_path}/rosa_dos_ventos_mensal/windrose_monthly_' \
+                       f'{self.station_icao}_{self.start_year}-{self.end_year}.png'
+            title = f'Rosas dos ventos mensais de {self.station_icao} com dados de {self.start_year} a {self.end_year}'
+            return [self.windrose_grid_spec(roses, filename, title, ncols=4)]
+        return specs
 
-    def plot_hourly_windrose(self):
-        print('Plotting hourly windroses.')
+    def plot_monthly_windrose(self):
+        # Create the phenomena frequency for each month
+        print('Plotting monthly windroses.')
+        self.render('plot_monthly_windrose', self.monthly_windrose_specs)
+        print(f'Images stored in {self.output_path}/rosa_dos_ventos_mensal.')
+
+    def hourly_windrose_specs(self):
+        """
+        Creates the specs of the wind roses of each hour
+        """
+        specs = []
+        roses = {}
         for hour in range(0, 24, 1):
-            data = self.data[self.data.index.hour.isin([hour])]
+            filename = f'{self.output_path}/rosa_dos_ventos_horaria/windrose_hourly_{hour:02}00UTC_' \
+                       f'{self.station_icao}_{self.start_year}-{self.end_year}.png'
             try:
-                hourly_windrose_output_path = f'{self.output_path}/rosa_dos_ventos_horaria'
-                Path(hourly_windrose_output_path).mkdir(
-                    parents=True, exist_ok=True)
-                filename = f'{hourly_windrose_output_path}/windrose_hourly_{hour:02}00UTC_' \
-                           f'{self.station_icao}_{self.start_year}-{self.end_year}.png'
-                if not os.path.exists(filename):
-                    windrose = WindRose()
-                    windrose_data = windrose.create_rosedata(data)
-                    windrose.create_windrose(windrose_data)
-                    plt.suptitle(f'Rosa dos ventos de {self.station_icao} com dados de {self.start_year} a {self.end_year}'
-                                 f'\n{hour:02}00 UTC')
-                    plt.savefig(filename)
-            except (ValueError, ZeroDivisionError):
+                windrose_data = self.windrose_cube.rose(hours=[hour])
+            except ValueError:
+                # There is no data for this hour
                 continue
-        
-        print(f'Images stored in {hourly_windrose_output_path}.')
\ No newline at end of file
+            roses[f'{hour:02}00 UTC'] = windrose_data
+            title = f'Rosa dos ventos de {self.station_icao} com dados de {self.start_year} a {self.end_year}' \
+                    f'\n{hour:02}00 UTC'
+            specs.append(PlotSpec('windrose', windrose_data, filename, title, {}))
+        if self.panels and roses:
+            filename = f'{self.output_path}/rosa_dos_ventos_horaria/windrose_hourly_' \
+                       f'{self.station_icao}_{self.start_year}-{self.end_year}.png'
+            title = f'Rosas dos ventos horárias de {self.station_icao} com dados de {self.start_year} a {self.end_year}'
+            return [self.windrose_grid_spec(roses, filename, title, ncols=6)]
+        return specs
+
+    @staticmethod
+    def windrose_grid_spec(roses, filename, title, ncols):
+        """
+        Creates the spec of a multi-panel figure from the rose tables already computed
+        :param roses: dictionary with the panel title as key and the rose table as value
+        """
+        data = pd.concat(roses, names=['panel', 'Dir_bins'])
+        return PlotSpec('windrose_grid', data, filename, title, {'ncols': ncols})
+
+    def plot_hourly_windrose(self):
+        print('Plotting hourly windroses.')
+        self.render('plot_hourly_windrose', self.hourly_windrose_specs)
+        print(f'Images stored in {self.output_path}/rosa_dos_ventos_horaria.')
+
+    @property
+    def runway_usability(self):
+        # Winds counted once by direction, speed, month and hour
+        if self._runway_usability is None:
+            self._runway_usability = RunwayUsability.compute(self.dataset)
+        return self._runway_usability
+
+    def save_runway_usability(self):
+        """
+        Stores the usability of the runways by month and hour for each crosswind limit
+        """
+        Path(f'{self.output_path}/pistas').mkdir(parents=True, exist_ok=True)
+        self.runway_usability.usability(self.runways).to_csv(f'{self.output_path}/pistas/usabilidade_pistas.csv')
+
+    def runway_specs(self):
+        """
+        Creates the specs of the hour x month usability heatmaps of the runways, one for each crosswind limit
+        """
+        if not self.runways:
+            return []
+        usability = self.runway_usability.usability(self.runways)
+        labels = self.month_labels()
+        specs = []
+        for limit in RunwayUsability.crosswind_limits:
+            heatmap_data = usability.loc[limit, 'usability'].unstack('month')
+            filename = f'{self.output_path}/pistas/usabilidade_{limit}kt_{self.station_icao}_' \
+                       f'{self.start_year}-{self.end_year}.png'
+            title = f'Usabilidade (%) das pistas {"/".join(self.runways)} de {self.station_icao} ' \
+                    f'com vento cruzado até {limit} nós\ncom dados de {self.start_year} a {self.end_year}'
+            specs.append(PlotSpec('heatmap', heatmap_data, filename, title,
+                                  {'xticklabels': labels, 'xlabel': 'Mês', 'ylabel': 'Hora (UTC)'}))
+        return specs
+
+    def plot_runway_usability(self):
+        print('Plotting runway usability.')
+        self.save_runway_usability()
+        self.render('plot_runway_usability', self.runway_specs)
+        print(f'Runway usability stored in {self.output_path}/pistas.')
+
+    def specs(self):
+        """
+        Creates the specs of all the figures of the station
+        """
+        return (self.variables_specs() + self.wx_specs() + self.windrose_specs() +
+                self.monthly_windrose_specs() + self.hourly_windrose_specs() + self.runway_specs())
+
+    def plot_all(self):
+        """
+        Renders all the figures of the station in a single process pool,
+        skipping the ones whose inputs did not change since they were rendered
+        """
+        print(f'Plotting {self.station_icao} climatology.')
+        if self.runways:
+            self.save_runway_usability()
+        filenames = self.render('plot_all', self.specs)
+        print(f'{len(filenames)} images rendered and stored in {self.output_path}.')
+        return filenames
@@ -0,0 +1,81 @@
+from d00_utils.metrics import metrics
+from d03_visualisation.manifest import BuildManifest
+from d03_visualisation.plot_climatology import Climatology
+from d03_visualisation.render import PlotSpec, render_all
+
+
+class ComparisonPlots:
+    """
+    Tables and small multiple figures of a StationComparison, stored in data/03_img_output/comparison/<name>
+    """
+
+    variables = {'fog': 'nevoeiro (visibilidade < 1000 m)',
+                 'low_ceiling': 'teto baixo (< 500 pés)'}
+
+    def __init__(self, comparison, name, workers=None, per_page=16):
+        """
+        :param comparison: StationComparison
+        :param name: name of the comparison (e.g. the country or the route)
+        :param workers: number of processes used to render the figures (default: number of CPUs)
+        :param per_page: number of stations in each small multiple figure
+        """
+        self.comparison = comparison
+        self.name = name
+        self.workers = workers
+        self.per_page = per_page
+        self.output_path = f'data/03_img_output/comparison/{name}'
+        self._manifest = None
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = BuildManifest(f'{self.output_path}/manifest.json')
+        return self._manifest
+
+    def frequency_specs(self):
+        """
+        Creates the specs of the hour x month frequency of fog and low ceiling, per_page stations per figure
+        """
+        frequencies = self.comparison.frequencies()
+        stations = self.comparison.stations
+        labels = Climatology.month_labels()
+        specs = []
+        for variable, description in self.variables.items():
+            # The same scale on every page, so the pages can be compared
+            vmax = frequencies[variable].max()
+            for page, first in enumerate(range(0, len(stations), self.per_page)):
+                page_stations = stations[first:first + self.per_page]
+                data = frequencies[frequencies['station'].isin(page_stations)][['station', 'month', 'hour', variable]]
+                filename = f'{self.output_path}/{variable}_{page + 1:02}.png'
+                title = f'Frequência (%) de {description} - {self.name} ({page + 1})'
+                specs.append(PlotSpec('heatmap_grid', data, filename, title,
+                                      {'panel': 'station', 'index': 'hour', 'columns': 'month', 'values': variable,
+                                       'vmax': vmax, 'xticklabels': labels, 'xlabel': 'Mês',
+                                       'ylabel': 'Hora (UTC)', 'colorbar': '%'}))
+        return specs
+
+    def divergence_specs(self):
+        """
+        Creates the spec of the matrix of divergence between the wind roses
+        """
+        divergence = self.comparison.divergence()
+        filename = f'{self.output_path}/divergencia_rosas_dos_ventos.png'
+        title = f'Divergência de Jensen-Shannon entre as rosas dos ventos - {self.name}'
+        return [PlotSpec('heatmap', divergence, filename, title,
+                         {'xticklabels': list(divergence.columns), 'xlabel': '', 'ylabel': ''})]
+
+    def specs(self):
+        return self.frequency_specs() + self.divergence_specs()
+
+    def plot_all(self):
+        """
+        Stores the tables and renders the figures whose inputs changed
+        :return: list with the filenames rendered
+        """
+        print(f'Comparing {len(self.comparison.stations)} stations.')
+        with metrics.stage('comparison', comparison=self.name, stations=len(self.comparison.stations)) as stage:
+            self.comparison.save(self.output_path)
+            filenames = render_all(self.specs(), self.workers, self.manifest)
+            stage['figures'] = len(filenames)
+        print(f'Comparison tables and {len(filenames)} images stored in {self.output_path}.')
+        return filenames
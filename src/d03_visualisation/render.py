@@ -0,0 +1,220 @@
+import io
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from d02_processing.aggregates import ClimatologyAggregates
+from d02_processing.calculate_windrose import WindRose
+
+# matplotlib and seaborn are imported by the functions that draw, so building specs and
+# handing them to the workers never loads them in the main process
+
+# Everything a figure needs, already aggregated, so it can be sent to another process
+# kind: one of RENDERERS; data: dataframe to draw; filename: output path; title: figure title;
+# options: dictionary with the kind specific settings
+PlotSpec = namedtuple('PlotSpec', ['kind', 'data', 'filename', 'title', 'options'])
+
+
+def render_bxp(spec):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Box plots drawn from precomputed statistics (see ClimatologyAggregates.boxplot_table)
+    fig, ax = plt.subplots()
+    fig.set_size_inches((12, 6))
+    boxes = ClimatologyAggregates.boxes_from_table(spec.data)
+    for box in boxes:
+        box['label'] = spec.options['labels'][box['label'] - 1]
+    artists = ax.bxp(boxes, patch_artist=True, widths=0.8,
+                     medianprops={'color': '0.25'},
+                     flierprops={'marker': 'd', 'markerfacecolor': '0.25', 'markeredgecolor': '0.25'})
+    for patch, color in zip(artists['boxes'], sns.color_palette(n_colors=len(boxes), desat=0.75)):
+        patch.set_facecolor(color)
+    ax.set_xlabel(spec.options['xlabel'])
+    ax.set_ylabel(spec.options['ylabel'])
+    ax.set_title(spec.title)
+    return fig
+
+
+def render_heatmap(spec):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    sns.heatmap(spec.data, cmap='Blues', ax=ax)
+    ax.set_xticklabels(spec.options['xticklabels'])
+    ax.tick_params(axis='y', rotation=0)
+    ax.set_xlabel(spec.options['xlabel'])
+    ax.set_ylabel(spec.options['ylabel'])
+    fig.suptitle(spec.title)
+    return fig
+
+
+def render_heatmap_grid(spec):
+    # Small multiples: one heatmap per value of options['panel'], all with the same colour scale
+    import matplotlib.pyplot as plt
+
+    options = spec.options
+    panels = list(dict.fromkeys(spec.data[options['panel']]))
+    ncols = min(options.get('ncols', 4), len(panels))
+    nrows = -(-len(panels) // ncols)
+    fig, axes = plt.subplots(nrows, ncols, figsize=(4 * ncols, 3.5 * nrows + 0.5), squeeze=False,
+                             sharex=True, sharey=True, constrained_layout=True)
+    vmax = options.get('vmax') or spec.data[options['values']].max() or 1
+    for ax, panel in zip(axes.flat, panels):
+        matrix = (spec.data[spec.data[options['panel']] == panel]
+                  .pivot(index=options['index'], columns=options['columns'], values=options['values']))
+        image = ax.imshow(matrix.values, aspect='auto', cmap='Blues', vmin=0, vmax=vmax, interpolation='nearest')
+        ax.set_title(panel)
+        ax.set_xticks(range(len(matrix.columns)))
+        ax.set_xticklabels(options['xticklabels'], rotation=90)
+        ax.set_yticks(range(0, len(matrix.index), 3))
+        ax.set_yticklabels(matrix.index[::3])
+    for ax in axes.flat[len(panels):]:
+        ax.set_visible(False)
+    for ax in axes[-1]:
+        ax.set_xlabel(options['xlabel'])
+    for ax in axes[:, 0]:
+        ax.set_ylabel(options['ylabel'])
+    fig.colorbar(image, ax=axes, shrink=0.6, label=options.get('colorbar', ''))
+    fig.suptitle(spec.title)
+    return fig
+
+
+def render_windrose(spec):
+    fig = WindRose().create_windrose(spec.data)
+    fig.suptitle(spec.title)
+    return fig
+
+
+def render_windrose_grid(spec):
+    # Small multiples: one wind rose per value of the first index level of the data (the rose tables
+    # concatenated with their panel titles as keys), all with the same radial scale and a single legend
+    import matplotlib.pyplot as plt
+
+    panels = list(dict.fromkeys(spec.data.index.get_level_values(0)))
+    ncols = min(spec.options.get('ncols', 4), len(panels))
+    nrows = -(-len(panels) // ncols)
+    # A fixed layout: the constrained layout would draw all the roses once more to measure them
+    fig, axes = plt.subplots(nrows, ncols, figsize=(3.5 * ncols + 2, 3.5 * nrows + 1), squeeze=False,
+                             subplot_kw=dict(polar=True), gridspec_kw=dict(hspace=0.4, wspace=0.3))
+    fig.subplots_adjust(left=0.03, right=1 - 2 / (3.5 * ncols + 2), bottom=0.04, top=1 - 1.2 / (3.5 * nrows + 1))
+    windrose = WindRose()
+    rmax = spec.data.sum(axis=1).max()
+    for ax, panel in zip(axes.flat, panels):
+        windrose.draw_windrose(ax, spec.data.loc[panel])
+        ax.set_ylim(0, rmax)
+        ax.set_title(panel, pad=14)
+        ax.tick_params(labelsize=7)
+    for ax in axes.flat[len(panels):]:
+        ax.set_visible(False)
+    fig.legend(*axes.flat[0].get_legend_handles_labels(), loc='center right')
+    fig.suptitle(spec.title)
+    return fig
+
+
+RENDERERS = {'bxp': render_bxp,
+             'heatmap': render_heatmap,
+             'heatmap_grid': render_heatmap_grid,
+             'windrose': render_windrose,
+             'windrose_grid': render_windrose_grid}
+
+
+def is_data(spec):
+    """
+    :return: True when the spec is written as JSON instead of drawn (its filename ends with .json)
+    """
+    return Path(spec.filename).suffix == '.json'
+
+
+def render_json(spec):
+    """
+    Writes the data, title and options of a PlotSpec as JSON, so the figure can be drawn by a client
+    :return: the filename
+    """
+    Path(spec.filename).parent.mkdir(parents=True, exist_ok=True)
+    content = {'kind': spec.kind, 'title': spec.title, 'options': spec.options,
+               'data': json.loads(spec.data.to_json(orient='split'))}
+    with open(spec.filename, 'w') as file:
+        json.dump(content, file, default=str)
+    return spec.filename
+
+
+def render(spec):
+    """
+    Draws the figure described by a PlotSpec, saves it (in the format of its filename extension, e.g. png, svg,
+    pdf, or json for the data alone) and closes it
+    :return: the filename
+    """
+    if is_data(spec):
+        return render_json(spec)
+
+    import matplotlib.pyplot as plt
+
+    Path(spec.filename).parent.mkdir(parents=True, exist_ok=True)
+    fig = RENDERERS[spec.kind](spec)
+    fig.savefig(spec.filename)
+    plt.close(fig)
+    return spec.filename
+
+
+def render_bytes(spec, format='png'):
+    """
+    Draws the figure described by a PlotSpec in memory (its filename is not used) and closes it
+    :param format: any format supported by matplotlib (png, svg, pdf...)
+    :return: the image as bytes
+    """
+    import matplotlib.pyplot as plt
+
+    fig = RENDERERS[spec.kind](spec)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=format)
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def _use_agg():
+    # Rendered figures are only ever saved, never shown, so they use the non-interactive backend
+    import matplotlib
+
+    matplotlib.use('Agg', force=True)
+
+
+def render_all(specs, workers=None, manifest=None):
+    """
+    Renders many figures, spreading them across a process pool
+    :param workers: number of processes (default: number of CPUs); 1 renders in this process
+    :param manifest: BuildManifest used to skip the figures whose inputs did not change
+    :return: list with the filenames rendered
+    """
+    specs = list(specs)
+    digests = [None] * len(specs)
+    if manifest is not None:
+        digests = [manifest.digest(spec) for spec in specs]
+        pending = [(spec, digest) for spec, digest in zip(specs, digests) if not manifest.is_current(spec, digest)]
+        specs, digests = [spec for spec, _ in pending], [digest for _, digest in pending]
+
+    workers = workers or os.cpu_count() or 1
+    executor = None
+    figures = sum(not is_data(spec) for spec in specs)
+    # Writing the data alone is faster than starting the pool
+    if workers > 1 and figures > 1:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(specs)), initializer=_use_agg)
+    elif figures:
+        _use_agg()
+    rendered = []
+    try:
+        results = executor.map(render, specs) if executor is not None else map(render, specs)
+        for spec, digest, filename in zip(specs, digests, results):
+            rendered.append(filename)
+            if manifest is not None:
+                manifest.record(spec, digest)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        # Whatever was rendered is recorded, even if some figure failed
+        if manifest is not None:
+            manifest.save()
+    return rendered
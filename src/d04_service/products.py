@@ -0,0 +1,221 @@
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from d00_utils.lru import SizedLRU
+from d02_processing.yearly_aggregates import AggregateStore
+from d03_visualisation.render import PlotSpec, render_bytes
+
+# A product requested from the service
+# icao: station; kind: 'windrose', 'phenomena', 'phenomenon' or 'variable'; name: phenomenon or variable name;
+# months, hours, years: tuples selecting the period (None for all); format: one of ClimatologyProducts.formats
+Product = namedtuple('Product', ['icao', 'kind', 'name', 'months', 'hours', 'years', 'format'])
+
+
+class ClimatologyProducts:
+    """
+    Tables and figures of the stations computed on request from their stored YearlyAggregates (see AggregateStore),
+    so answering never reads the observations again.
+    The merged aggregates and every product built are kept in a SizedLRU. Their keys include the modification time
+    of the yearly files used, so whatever a batch run updates is computed again on the next request.
+    """
+
+    formats = {'json': 'application/json',
+               'csv': 'text/csv; charset=utf-8',
+               'png': 'image/png',
+               'svg': 'image/svg+xml'}
+    figure_formats = ['png', 'svg']
+
+    variables = {'visibility': 'Visibilidade (< 10.000 m)',
+                 'ceiling': 'Teto (pés)',
+                 'temperature': 'Temperatura do Ar (ºC)',
+                 'dew': 'Ponto de Orvalho (ºC)',
+                 'rh': 'Umidade Relativa (%)',
+                 'slp': 'QNH (hPa)'}
+
+    def __init__(self, cache_bytes=256 << 20, path='data/02_processed'):
+        """
+        :param cache_bytes: maximum size of the aggregates and products kept in memory
+        :param path: directory of the processed data, with the aggregates of each station
+        """
+        self.cache = SizedLRU(cache_bytes)
+        self.path = path
+        # One lock per station, so concurrent requests build its aggregates once
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    @staticmethod
+    def check_icao(icao):
+        """
+        Rejects anything but an ICAO code before it is used in a path
+        """
+        if not re.fullmatch(r'[A-Z0-9]{4}', icao):
+            raise LookupError(f'{icao} is not an ICAO code.')
+
+    def station_lock(self, icao):
+        """
+        :return: the lock held while the aggregates of the station are built
+        """
+        with self._locks_lock:
+            return self._locks.setdefault(icao, threading.Lock())
+
+    def stations(self):
+        """
+        :return: list of the stations with stored aggregates
+        """
+        if not Path(self.path).exists():
+            return []
+        return sorted(station.name for station in Path(self.path).iterdir()
+                      if AggregateStore(station.name, self.path).years())
+
+    def fingerprint(self, icao, years=None):
+        """
+        :return: tuple with the (year, modification time) of the stored aggregates of the station in 'years'
+        """
+        self.check_icao(icao)
+        store = AggregateStore(icao, self.path)
+        return tuple((year, os.stat(store.year_file(year)).st_mtime_ns) for year in store.years()
+                     if years is None or year in years)
+
+    def build_aggregates(self, icao):
+        """
+        Computes the stored aggregates of a station which has none yet, from its processed data
+        """
+        from d01_data.get_data import GetIsdData
+        from d03_visualisation.plot_climatology import Climatology
+
+        isd = GetIsdData(icao)
+        if not os.path.isdir(isd.raw_path):
+            raise LookupError(f'There is no data of {icao}.')
+        # Updating the aggregates stores them
+        return Climatology(isd.load_processed(), icao, settings=isd.settings()).yearly_aggregates
+
+    def aggregates(self, icao, years=None):
+        """
+        :return: the YearlyAggregates of the station merged over the years stored (or the selected ones),
+        and the fingerprint of the files they came from
+        """
+        fingerprint = self.fingerprint(icao, years)
+        if not fingerprint and not AggregateStore(icao, self.path).years():
+            with self.station_lock(icao):
+                # Another request may have built them while this one waited
+                if not AggregateStore(icao, self.path).years():
+                    self.build_aggregates(icao)
+            fingerprint = self.fingerprint(icao, years)
+        if not fingerprint:
+            raise LookupError(f'There are no aggregates of {icao} in the years selected.')
+        key = ('aggregates', icao, fingerprint)
+        aggregates = self.cache.get(key)
+        if aggregates is None:
+            aggregates = self.cache.put(key, AggregateStore(icao, self.path).window([year for year, _ in fingerprint]))
+        return aggregates, fingerprint
+
+    def climatology(self, icao, years=None):
+        """
+        :return: ClimatologyAggregates of the station
+        """
+        aggregates, fingerprint = self.aggregates(icao, years)
+        key = ('climatology', icao, fingerprint)
+        climatology = self.cache.get(key)
+        if climatology is None:
+            climatology = self.cache.put(key, aggregates.climatology())
+        return climatology
+
+    def period(self, product):
+        """
+        :return: description of the period of a product, used in the titles
+        """
+        description = ''
+        if product.years is not None:
+            description += f' de {min(product.years)} a {max(product.years)}'
+        if product.months is not None:
+            from d03_visualisation.plot_climatology import Climatology
+
+            labels = Climatology.month_labels()
+            description += f' em {"/".join(labels[month - 1] for month in product.months)}'
+        if product.hours is not None:
+            description += f' às {"/".join(f"{hour:02}00" for hour in product.hours)} UTC'
+        return description
+
+    def table(self, product):
+        """
+        Computes the table of a product
+        :return: dataframe, or a list for the names of the phenomena
+        """
+        months = None if product.months is None else list(product.months)
+        hours = None if product.hours is None else list(product.hours)
+        if product.kind == 'windrose':
+            aggregates, _ = self.aggregates(product.icao, product.years)
+            return aggregates.windrose_cube().rose(months=months, hours=hours)
+        climatology = self.climatology(product.icao, product.years)
+        if product.kind == 'phenomena':
+            return sorted(climatology.phenomena['phenomenon'].unique())
+        if product.kind == 'phenomenon':
+            if product.name not in set(climatology.phenomena['phenomenon']):
+                raise LookupError(f'{product.name} was never observed in {product.icao}.')
+            return climatology.phenomenon_matrix(product.name, hours or range(24), months or range(1, 13))
+        if product.kind == 'variable':
+            if product.name not in self.variables:
+                raise LookupError(f'Unknown variable {product.name}, use one of: {", ".join(self.variables)}.')
+            table = climatology.boxplot_table(product.name)
+            return table if months is None else table[table['month'].isin(months)]
+        raise LookupError(f'Unknown product {product.kind}.')
+
+    def spec(self, product, table):
+        """
+        :return: PlotSpec of the figure of a product
+        """
+        from d03_visualisation.plot_climatology import Climatology
+
+        labels = Climatology.month_labels()
+        period = self.period(product)
+        if product.kind == 'windrose':
+            return PlotSpec('windrose', table, None, f'Rosa dos ventos de {product.icao}{period}', {})
+        if product.kind == 'phenomenon':
+            return PlotSpec('heatmap', table, None, f'Frequência de {product.name} em {product.icao}{period}',
+                            {'xticklabels': [labels[month - 1] for month in table.columns],
+                             'xlabel': 'Mês', 'ylabel': 'Hora (UTC)'})
+        if product.kind == 'variable':
+            variable = self.variables[product.name]
+            return PlotSpec('bxp', table, None,
+                            f'Valores mensais de {variable.split(" (")[0]} em {product.icao}{period}',
+                            {'labels': labels, 'xlabel': 'Mês', 'ylabel': variable})
+        raise ValueError(f'There is no figure of {product.kind}.')
+
+    def encode(self, product, table):
+        """
+        :return: the product in its format, as bytes
+        """
+        if product.format in self.figure_formats:
+            return render_bytes(self.spec(product, table), product.format)
+        if isinstance(table, list):
+            return json.dumps(table).encode() if product.format == 'json' else '\n'.join(table).encode()
+        if product.format == 'json':
+            return table.to_json(orient='split').encode()
+        return table.to_csv().encode()
+
+    def key(self, product):
+        return ('product', product, self.fingerprint(product.icao, product.years))
+
+    def cached(self, product):
+        """
+        :return: the product already built, or None
+        """
+        return self.cache.get(self.key(product))
+
+    def get(self, product):
+        """
+        Builds a product (or takes it from the cache)
+        :return: the product as bytes
+        """
+        if product.format not in self.formats:
+            raise ValueError(f'Unknown format {product.format}, use one of: {", ".join(self.formats)}.')
+        body = self.cached(product)
+        if body is None:
+            body = self.encode(product, self.table(product))
+            # The aggregates may have been built for this request, so the key is taken again
+            self.cache.put(self.key(product), body)
+        return body
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from d04_service.products import ClimatologyProducts, Product
+
+
+def parse_numbers(text):
+    """
+    Parses a selection of numbers such as '7', '6,7,8' or '2015-2024' (inclusive)
+    :return: sorted tuple of integers
+    """
+    numbers = set()
+    for part in text.split(','):
+        if '-' in part.strip('-'):
+            first, last = part.split('-')
+            numbers.update(range(int(first), int(last) + 1))
+        elif part:
+            numbers.add(int(part))
+    return tuple(sorted(numbers))
+
+
+class ClimatologyServer:
+    """
+    Asynchronous HTTP service answering GET requests for the climatology products of the stations:
+
+    /                                        stations with stored aggregates
+    /stats                                   cache statistics
+    /<ICAO>/windrose.<format>                wind rose table or figure
+    /<ICAO>/phenomena.<json|csv>             phenomena observed
+    /<ICAO>/phenomena/<name>.<format>        hour x month counts of a phenomenon
+    /<ICAO>/variables/<variable>.<format>    monthly statistics of a variable
+
+    format is json, csv, png or svg, and the period is selected with the month, hour and years parameters,
+    e.g. /SBGR/windrose.png?month=7&hour=6 or /SBGR/variables/temperature.json?years=2015-2024.
+    Products already built are answered from the cache in the event loop; the others are built in a thread pool,
+    with the figures drawn one at a time by a single thread, as pyplot is not thread-safe.
+    Concurrent requests for the same product share the same build.
+    """
+
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error'}
+
+    def __init__(self, products=None, host='127.0.0.1', port=8000, workers=2):
+        """
+        :param products: ClimatologyProducts answering the requests
+        :param workers: number of threads building the tables
+        """
+        self.products = products or ClimatologyProducts()
+        self.host = host
+        self.port = port
+        self.tables = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tables')
+        self.figures = ThreadPoolExecutor(max_workers=1, thread_name_prefix='figures', initializer=self._init_figures)
+        self._pending = {}
+        # Builds submitted to the pools, cancelled if still waiting when the service stops
+        self._builds = set()
+
+    @staticmethod
+    def _init_figures():
+        import matplotlib
+
+        matplotlib.use('Agg', force=True)
+
+    def product(self, path, query):
+        """
+        Turns the path and parameters of a request into a Product
+        """
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        stem, dot, extension = parts[-1].rpartition('.')
+        if dot:
+            parts[-1] = stem
+        else:
+            extension = 'json'
+        icao, kind, name = (parts + [None, None])[:3]
+        if len(parts) > 3 or kind not in ('windrose', 'phenomena', 'variables') or \
+                (kind == 'windrose' and name is not None) or (kind == 'variables' and name is None):
+            raise LookupError(f'Unknown path {path}.')
+        ClimatologyProducts.check_icao(icao.upper())
+        if name is not None:
+            kind = 'phenomenon' if kind == 'phenomena' else 'variable'
+        selection = {}
+        for parameter, valid in [('month', range(1, 13)), ('hour', range(24)), ('years', range(1900, 2100))]:
+            selection[parameter] = parse_numbers(query[parameter][-1]) if parameter in query else None
+            if selection[parameter] is not None and not set(selection[parameter]) <= set(valid):
+                raise ValueError(f'{parameter} must be within {valid.start} and {valid.stop - 1}.')
+        return Product(icao.upper(), kind, name, selection['month'], selection['hour'], selection['years'],
+                       extension)
+
+    async def build(self, product):
+        """
+        Builds a product in the thread pools, sharing the build of the requests for the same product
+        """
+        if product not in self._pending:
+            executor = self.figures if product.format in ClimatologyProducts.figure_formats else self.tables
+            build = executor.submit(self.products.get, product)
+            self._builds.add(build)
+            build.add_done_callback(self._builds.discard)
+            future = asyncio.wrap_future(build)
+            self._pending[product] = future
+            future.add_done_callback(lambda _: self._pending.pop(product, None))
+        return await asyncio.shield(self._pending[product])
+
+    async def answer(self, method, target):
+        """
+        :return: status code, content type and body of the response
+        """
+        if method not in ('GET', 'HEAD'):
+            return 405, 'text/plain', b'Only GET requests are accepted.'
+        url = urlsplit(target)
+        path = url.path.rstrip('/')
+        if path == '':
+            return 200, 'application/json', json.dumps(self.products.stations()).encode()
+        if path == '/stats':
+            return 200, 'application/json', json.dumps(self.products.cache.stats()).encode()
+        try:
+            product = self.product(path, parse_qs(url.query))
+            # Products already built are answered right away
+            body = self.products.cached(product)
+            if body is None:
+                body = await self.build(product)
+            return 200, ClimatologyProducts.formats[product.format], body
+        except LookupError as exception:
+            return 404, 'text/plain', str(exception).strip("'").encode()
+        except ValueError as exception:
+            return 400, 'text/plain', str(exception).encode()
+        except Exception as exception:
+            traceback.print_exc()
+            return 500, 'text/plain', f'{type(exception).__name__}: {exception}'.encode()
+
+    async def handle(self, reader, writer):
+        """
+        Answers the requests of a connection, keeping it open between requests (HTTP/1.1 keep-alive)
+        """
+        try:
+            while True:
+                request = await reader.readline()
+                if not request.strip():
+                    break
+                start = time.perf_counter()
+                method, target, version = request.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    field, _, value = line.decode('latin-1').partition(':')
+                    headers[field.strip().lower()] = value.strip()
+                status, content_type, body = await self.answer(method, target)
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                head = (f'{version} {status} {self.reasons[status]}\r\n'
+                        f'Content-Type: {content_type}\r\n'
+                        f'Content-Length: {len(body)}\r\n'
+                        f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+                writer.write(head.encode('latin-1') + (body if method != 'HEAD' else b''))
+                await writer.drain()
+                print(f'{method} {target} {status} {len(body)} bytes {(time.perf_counter() - start) * 1000:.1f} ms')
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            # Malformed requests and dropped connections just close the connection
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        print(f'Serving the climatology of {len(self.products.stations())} stations on '
+              f'http://{self.host}:{self.port}/')
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # The builds not started yet are dropped; the running ones are waited for
+            for build in list(self._builds):
+                build.cancel()
+            self.tables.shutdown()
+            self.figures.shutdown()
@@ -1,26 +1,230 @@
+import argparse
+import datetime
 import os
 import sys
-src_dir = os.path.join(os.getcwd(), '..', 'src')
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+src_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(src_dir)
 
-from d01_data.get_data import GetIsdData
-from d03_visualisation.plot_climatology import Climatology
-import pandas as pd
+from d00_utils.locale_settings import configure_locale
+from d00_utils.metrics import RunMetrics, metrics
+
+# The pipeline modules (pandas, numpy and, when drawing, matplotlib) are imported by the functions using them,
+# so the CLI starts fast and --help or argument errors do not load them
+
+
+def read_stations(args):
+    """
+    Gathers the ICAO codes given as arguments, in a file (one per line, # for comments)
+    or selected by country in the ISD station list
+    :return: list of unique ICAO codes, in the order they were given
+    """
+    from d01_data.stations import StationCatalog
+
+    stations = [icao.upper() for icao in args.icao]
+    if args.file:
+        with open(args.file) as file:
+            stations += [line.split('#')[0].strip().upper() for line in file if line.split('#')[0].strip()]
+    if args.country:
+        stations += StationCatalog().by_country([country.upper() for country in args.country])
+    return list(dict.fromkeys(stations))
+
+
+def failed_result(icao, error):
+    """
+    :return: result of a station which could not be processed (see process_station)
+    """
+    return {'icao': icao, 'status': 'failed', 'rows': 0, 'figures': 0, 'seconds': 0, 'error': error}
+
+
+def process_station(icao, render_workers=1, offline=False, figures=True, runways=None, archive=False,
+                    figure_format='png', panels=False, validation=None):
+    """
+    Downloads, extracts and plots the climatology of one station.
+    Any error is reported in the result instead of being raised, so one station never stops the batch.
+    :param offline: skip the download and use the raw files already in data/01_raw
+    :param figures: render the figures of the station (otherwise the data is only processed)
+    :param runways: dictionary with the runway designators and headings, to compute the runway usability
+    :param archive: extract the raw files through the raw archive (see RawArchive), creating it when needed
+    :param figure_format: format of the figures (png, svg, pdf, or json for their data alone)
+    :param panels: draw the monthly and hourly wind roses as two multi-panel figures
+    :param validation: action of the DataValidator applied to the data (flag, mask or drop), None to skip it
+    :return: dictionary with the station, status, rows processed, figures rendered, elapsed seconds, error
+    and the metrics of its stages
+    """
+    from d01_data.get_data import GetIsdData
+    from d01_data.validation import DataValidator
+    from d03_visualisation.plot_climatology import Climatology
+
+    start = time.time()
+    # The locale of the month names is set in every process, as pool workers may not inherit it
+    configure_locale()
+    # Pool workers process many stations, so the metrics are collected one station at a time
+    metrics.reset()
+    result = {'icao': icao, 'status': 'ok', 'rows': 0, 'figures': 0, 'seconds': 0, 'error': ''}
+    try:
+        validator = DataValidator(action=validation) if validation else None
+        isd = GetIsdData(icao, archive=archive, validator=validator)
+        data = isd.load_processed() if offline else isd.download_isd_data()
+        result['rows'] = len(data)
+        if figures:
+            climatology = Climatology(data, icao, workers=render_workers, runways=runways,
+                                      figure_format=figure_format, panels=panels, settings=isd.settings())
+            result['figures'] = len(climatology.plot_all())
+    except Exception as exception:
+        result['status'] = 'failed'
+        result['error'] = f'{type(exception).__name__}: {exception}'
+        traceback.print_exc()
+    result['seconds'] = time.time() - start
+    result['metrics'] = metrics.to_dict()
+    return result
+
+
+def read_runways(filename):
+    """
+    Reads a CSV file with the icao, runway designator and heading (degrees) of every runway direction,
+    one per line (e.g. SBGR,09L,94). Without a heading, the one of the designator is used (09L: 90).
+    :return: dictionary with the ICAO as key and a dictionary with the designators and headings as value
+    """
+    import pandas as pd
+    from d02_processing.runway_usability import RunwayUsability
+
+    runways = pd.read_csv(filename, dtype={'icao': str, 'runway': str})
+    if 'heading' not in runways:
+        runways['heading'] = None
+    headings = runways['runway'].map(RunwayUsability.runway_headings(runways['runway'].unique()))
+    runways['heading'] = runways['heading'].fillna(headings).astype(float)
+    return {icao.upper(): dict(zip(station['runway'], station['heading']))
+            for icao, station in runways.groupby('icao', sort=False)}
+
+
+def compare_stations(name, stations, runways=None, workers=None):
+    """
+    Compares the processed data of the stations, storing the tables and figures of the comparison
+    :return: list with the filenames rendered
+    """
+    import pandas as pd
+    from d01_data.get_data import GetIsdData
+    from d02_processing.comparison import StationComparison
+    from d03_visualisation.plot_comparison import ComparisonPlots
+
+    # Only the columns compared are loaded (memory-mapped when cached)
+    datasets = {icao: pd.concat(list(GetIsdData(icao).stream_data(columns=StationComparison.columns)))
+                for icao in stations}
+    comparison = StationComparison.compute(datasets, {icao: list(headings.values())
+                                                     for icao, headings in (runways or {}).items()})
+    return ComparisonPlots(comparison, name, workers).plot_all()
+
+
+def print_summary(results, elapsed):
+    for result in results:
+        print(f"{result['icao']}: {result['status']}, {result['rows']} rows, {result['figures']} figures, "
+              f"{result['seconds']:.1f} s {result['error']}".rstrip())
+    ok = [result for result in results if result['status'] == 'ok']
+    rows = sum(result['rows'] for result in results)
+    print(f'{len(ok)} of {len(results)} stations processed in {elapsed:.1f} s: '
+          f'{len(results) / elapsed * 60:.1f} stations/min, {rows / elapsed:.0f} rows/s.')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Downloads ISD data and plots the climatology of airports.')
+    parser.add_argument('icao', nargs='*', help='ICAO codes of the airports (e.g. SBGR)')
+    parser.add_argument('--file', help='file with one ICAO code per line')
+    parser.add_argument('--country', nargs='+', help='process every airport of these countries (e.g. BR)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of stations processed in parallel (default: number of CPUs)')
+    parser.add_argument('--render-workers', type=int, default=1,
+                        help='number of processes rendering the figures of each station (default: 1)')
+    parser.add_argument('--offline', action='store_true',
+                        help='do not download, process the raw files already in data/01_raw')
+    parser.add_argument('--skip-figures', action='store_true',
+                        help='only download and process the data, without the figures of each station')
+    parser.add_argument('--raw-archive', action='store_true',
+                        help='convert the raw files into a memory-mapped archive (data/02_processed/ICAO/raw) and '
+                             'extract them from it, so they can be extracted again with other cleaning rules quickly')
+    parser.add_argument('--figure-format', choices=['png', 'svg', 'pdf', 'json'], default='png',
+                        help='format of the figures; json writes the data of each figure for client-side rendering '
+                             '(default: png)')
+    parser.add_argument('--panels', action='store_true',
+                        help='draw the 12 monthly and 24 hourly wind roses as two multi-panel figures')
+    parser.add_argument('--validate', choices=['flag', 'mask', 'drop'],
+                        help='check the data against the validation rules (see DataValidator), flagging, masking '
+                             'or dropping the observations breaking them; the counts of each year are stored in '
+                             'data/02_processed/ICAO/quality.csv')
+    parser.add_argument('--compare', metavar='NAME',
+                        help='compare the stations processed, storing tables and figures in '
+                             'data/03_img_output/comparison/NAME')
+    parser.add_argument('--runways',
+                        help='CSV file with the icao, runway and heading of every runway direction, used for the '
+                             'runway usability and by --compare (default: the best runway orientation)')
+    parser.add_argument('--metrics',
+                        help='JSON file where the metrics of the run are written '
+                             '(default: data/04_metrics/run_<date and time>.json)')
+    parser.add_argument('--root', default=os.path.dirname(src_dir),
+                        help='project directory containing data/ (default: parent of src/)')
+    args = parser.parse_args(argv)
 
+    # The files given are relative to where the command was run, not to the project directory
+    for option in ['file', 'runways', 'metrics']:
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+    os.chdir(args.root)
+    stations = read_stations(args)
+    if not stations:
+        parser.error('no station was given')
 
-airport = 'SBGR'
+    from d01_data.stations import StationCatalog
 
+    if configure_locale() is None:
+        print('No Portuguese locale is available, the month names are in the default locale.')
+    started = datetime.datetime.now()
+    start = time.time()
+    # Unknown stations are reported at once instead of failing inside the pool
+    codes = StationCatalog().resolve(stations)
+    results = [failed_result(icao, 'not an ISD station') for icao in stations if codes[icao] is None]
+    stations = [icao for icao in stations if codes[icao] is not None]
+    runways = read_runways(args.runways) if args.runways else {}
+    if args.workers == 1 or len(stations) <= 1:
+        results += [process_station(icao, args.render_workers, args.offline, not args.skip_figures, runways.get(icao),
+                                    args.raw_archive, args.figure_format, args.panels, args.validate)
+                    for icao in stations]
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(stations))) as executor:
+            futures = {executor.submit(process_station, icao, args.render_workers, args.offline,
+                                       not args.skip_figures, runways.get(icao), args.raw_archive,
+                                       args.figure_format, args.panels, args.validate): icao for icao in stations}
+            completed = {}
+            for future in as_completed(futures):
+                # A worker dying (or a result failing to come back) only fails its own stations
+                try:
+                    completed[futures[future]] = future.result()
+                except Exception as exception:
+                    completed[futures[future]] = failed_result(futures[future],
+                                                               f'{type(exception).__name__}: {exception}')
+            results += [completed[icao] for icao in stations]
+    print_summary(results, time.time() - start)
+    comparison_metrics = None
+    if args.compare:
+        metrics.reset()
+        processed = [result['icao'] for result in results if result['status'] == 'ok']
+        compare_stations(args.compare, processed, runways, args.workers)
+        comparison_metrics = metrics.to_dict()
+    metrics_file = args.metrics or f'data/04_metrics/run_{started:%Y%m%dT%H%M%S}.json'
+    # The counters of all the stations are added up, their stages are kept with each station
+    run_metrics = RunMetrics()
+    for result in results:
+        for counter, value in result.get('metrics', {}).get('counters', {}).items():
+            run_metrics.count(counter, value)
+    run_metrics.write(metrics_file, started=started.isoformat(), seconds=time.time() - start,
+                      argv=sys.argv[1:] if argv is None else argv, stations=results,
+                      comparison=comparison_metrics)
+    print(f'Metrics stored in {metrics_file}.')
+    print('Done!')
+    return 0 if all(result['status'] == 'ok' for result in results) else 1
 
-data = GetIsdData(airport).download_isd_data()
 
-climatology = Climatology(data, airport)
-climatology.plot_variables_climatology()
-# Plot wx
-climatology.plot_wx()
-# Plot all time windroses
-climatology.plot_windrose()
-# Plot monthly windroses
-climatology.plot_monthly_windrose()
-# Plot hourly windroses
-climatology.plot_hourly_windrose()
-print('Done!')
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import argparse
+import os
+import sys
+
+src_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(src_dir)
+
+from d00_utils.locale_settings import configure_locale
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serves the climatology products of the processed stations over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on (default: 8000)')
+    parser.add_argument('--cache-mb', type=int, default=256,
+                        help='memory used to keep aggregates and products built (default: 256 MB)')
+    parser.add_argument('--workers', type=int, default=2, help='number of threads building the tables (default: 2)')
+    parser.add_argument('--root', default=os.path.dirname(src_dir),
+                        help='project directory containing data/ (default: parent of src/)')
+    args = parser.parse_args(argv)
+
+    os.chdir(args.root)
+    if configure_locale() is None:
+        print('No Portuguese locale is available, the month names are in the default locale.')
+
+    from d04_service.products import ClimatologyProducts
+    from d04_service.server import ClimatologyServer
+
+    products = ClimatologyProducts(cache_bytes=args.cache_mb << 20)
+    ClimatologyServer(products, args.host, args.port, args.workers).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
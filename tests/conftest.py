@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The packages live in src/ and are imported as d0X_..., as in the scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from matplotlib import cbook
+
+from d02_processing.aggregates import ClimatologyAggregates
+from d02_processing.yearly_aggregates import YearlyAggregates
+
+
+@pytest.fixture(scope='module')
+def data():
+    index = pd.date_range('2020-01-01', '2020-12-31 23:00', freq='H', name='DATE')
+    rng = np.random.default_rng(3)
+    variables = pd.DataFrame({variable: np.nan for variable in YearlyAggregates.grids}, index=index)
+    variables['temperature'] = rng.normal(20, 5, len(index)).round(1)
+    variables['slp'] = rng.normal(1015, 4, len(index)).round()
+    variables.iloc[::7, variables.columns.get_loc('temperature')] = np.nan
+    phenomena = pd.Series(rng.choice(['fog', 'rain', None], len(index)), index=index)
+    return variables, phenomena
+
+
+@pytest.fixture(scope='module')
+def aggregates(data):
+    variables, phenomena = data
+    winds = pd.DataFrame({'direction': np.nan, 'speed': np.nan}, index=variables.index)
+    # The values are on the grids of the variables, so the statistics are exact
+    return YearlyAggregates.compute(winds, variables, phenomena).climatology()
+
+
+@pytest.mark.parametrize('variable', ['temperature', 'slp'])
+def test_boxplot_stats_match_matplotlib(data, aggregates, variable):
+    variables, _ = data
+    boxes = aggregates.boxplot_stats(variable)
+    assert [box['label'] for box in boxes] == list(range(1, 13))
+    for box in boxes:
+        values = variables.loc[variables.index.month == box['label'], variable].dropna()
+        reference = cbook.boxplot_stats(values.values)[0]
+        for stat in ['mean', 'med', 'q1', 'q3', 'whislo', 'whishi']:
+            assert np.isclose(box[stat], reference[stat])
+        assert np.array_equal(np.sort(box['fliers']), np.unique(reference['fliers']))
+
+
+def test_phenomenon_matrix(data, aggregates):
+    _, phenomena = data
+    matrix = aggregates.phenomenon_matrix('fog')
+    assert matrix.shape == (24, 12)
+    fog = phenomena[phenomena == 'fog']
+    assert matrix.loc[6, 3] == ((fog.index.hour == 6) & (fog.index.month == 3)).sum()
+    assert matrix.values.sum() == len(fog)
+    assert (aggregates.phenomenon_matrix('hail').values == 0).all()
+
+
+def test_save_and_load(tmp_path, aggregates):
+    aggregates.save(tmp_path / 'aggregates')
+    loaded = ClimatologyAggregates.load(tmp_path / 'aggregates')
+    for table in ClimatologyAggregates.tables:
+        pd.testing.assert_frame_equal(getattr(loaded, table), getattr(aggregates, table), check_dtype=False)
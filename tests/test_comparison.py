@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from d02_processing.comparison import StationComparison
+from d03_visualisation.plot_comparison import ComparisonPlots
+
+
+def station(direction, speed, periods=48, start='2020-01-01'):
+    index = pd.date_range(start, periods=periods, freq='H', name='DATE')
+    return pd.DataFrame({'direction': float(direction), 'speed': float(speed),
+                         'visibility': np.where(index.hour < 6, 500.0, 9999.0),
+                         'ceiling': np.where(index.hour < 3, 200.0, np.nan)}, index=index)
+
+
+@pytest.fixture
+def comparison():
+    return StationComparison.compute({'AAAA': station(90, 20), 'BBBB': station(90, 20), 'CCCC': station(180, 5)},
+                                     runways={'BBBB': [0]})
+
+
+def test_frequencies(comparison):
+    frequencies = comparison.frequencies().set_index(['station', 'month', 'hour'])
+    assert frequencies.loc[('AAAA', 1, 2)].tolist() == [2, 100, 100]
+    assert frequencies.loc[('AAAA', 1, 4)].tolist() == [2, 100, 0]
+    assert frequencies.loc[('AAAA', 1, 12)].tolist() == [2, 0, 0]
+    assert np.isnan(frequencies.loc[('AAAA', 2, 12), 'fog'])
+    summary = comparison.summary()
+    assert summary.loc['AAAA', 'observations'] == 48
+    assert summary.loc['AAAA', 'fog'] == pytest.approx(25)
+    assert summary.loc['AAAA', 'low_ceiling'] == pytest.approx(12.5)
+
+
+def test_crosswind_exceedance(comparison):
+    exceedance = comparison.crosswind_exceedance()
+    # Without runways, the best orientation is close to the wind (within 30 degrees at 20 kt)
+    assert exceedance.loc['AAAA', 'crosswind_10kt'] == 0
+    assert 60 <= exceedance.loc['AAAA', 'orientation_10kt'] <= 120
+    # A runway across the wind has all of it as crosswind
+    assert exceedance.loc['BBBB', ['crosswind_10kt', 'crosswind_15kt', 'crosswind_20kt']].tolist() == [100, 100, 0]
+    assert np.isnan(exceedance.loc['BBBB', 'orientation_10kt'])
+
+
+def test_divergence(comparison):
+    divergence = comparison.divergence()
+    assert divergence.loc['AAAA', 'BBBB'] == pytest.approx(0)
+    assert divergence.loc['AAAA', 'CCCC'] == pytest.approx(1)
+    assert np.allclose(divergence.values, divergence.values.T)
+    assert np.allclose(comparison.roses().sum(axis=1), 1)
+
+
+def test_plots_are_paged(comparison, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    filenames = ComparisonPlots(comparison, 'test', workers=1, per_page=2).plot_all()
+    output = tmp_path / 'data' / '03_img_output' / 'comparison' / 'test'
+    assert sorted(filenames) == sorted(str(Path('data/03_img_output/comparison/test') / name) for name in
+                                       ['fog_01.png', 'fog_02.png', 'low_ceiling_01.png', 'low_ceiling_02.png',
+                                        'divergencia_rosas_dos_ventos.png'])
+    assert all((output / table).exists() for table in ['summary.csv', 'frequencies.csv', 'divergence.csv'])
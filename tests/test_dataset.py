@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from d01_data.dataset import IsdDataset
+
+
+@pytest.fixture(scope='module')
+def data():
+    index = pd.date_range('2015-11-01', '2017-02-28 23:00', freq='H', name='DATE')
+    rng = np.random.default_rng(2)
+    # Shuffled, so the dataset has to sort it
+    return pd.DataFrame({'value': np.arange(len(index))}, index=index).iloc[rng.permutation(len(index))]
+
+
+@pytest.fixture(scope='module')
+def dataset(data):
+    return IsdDataset(data)
+
+
+def test_keys(data, dataset):
+    index = dataset.data.index
+    assert index.is_monotonic_increasing
+    assert np.array_equal(dataset.year, index.year)
+    assert np.array_equal(dataset.month, index.month)
+    assert np.array_equal(dataset.hour, index.hour)
+    assert np.array_equal(dataset.day_of_year, index.dayofyear)
+    assert dataset.years() == [2015, 2016, 2017]
+    assert dataset.months() == list(range(1, 13))
+    assert dataset.hours() == list(range(24))
+
+
+@pytest.mark.parametrize('selection', [{'years': [2016]},
+                                       {'months': [12, 1, 2]},
+                                       {'years': [2016], 'months': [3], 'hours': range(6, 10)},
+                                       {'days': [60, 366]},
+                                       {'years': [2020]}])
+def test_select(data, dataset, selection):
+    index = data.index
+    mask = np.ones(len(data), dtype=bool)
+    for key, attribute in [('years', 'year'), ('months', 'month'), ('hours', 'hour'), ('days', 'dayofyear')]:
+        if key in selection:
+            mask &= np.isin(getattr(index, attribute), list(selection[key]))
+    pd.testing.assert_frame_equal(dataset.select(**selection), data[mask].sort_index())
+
+
+def test_single_ranges_are_views(data, dataset):
+    assert np.shares_memory(dataset.select(years=[2016]).values, dataset.data.values)
+    window = dataset.window('2016-06-01', '2016-09-01')
+    assert np.shares_memory(window.values, dataset.data.values)
+    assert window.index.min() == pd.Timestamp('2016-06-01') and window.index.max() == pd.Timestamp('2016-08-31 23:00')
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from d01_data.decode_isd import IsdDecoder, as_bytes, parse_int
+
+
+def raw():
+    return pd.DataFrame({'WND': ['310,1,N,0015,1', '999,1,C,0000,1', '090,1,N,9999,9'],
+                         'VIS': ['004000,1,N,1', '999999,9,9,9', '025000,1,N,1'],
+                         'MW1': ['10,1', np.nan, '45,1'],
+                         'GA1': ['07,1,+00450,1,99,9', '99,9,+99999,9,99,9', np.nan],
+                         'CIG': ['00450,1,9,N', '22000,1,9,Y', '99999,9,9,9'],
+                         'TMP': ['+0250,1', '-0015,1', '+9999,9'],
+                         'DEW': ['+0180,1', '-0030,1', '+9999,9'],
+                         'REM': ['MET059METAR SBGR 010000Z 31003KT 4000 BR BKN015 25/18 Q1017=',
+                                 'MET049METAR SBGR 010100Z 00000KT CAVOK M01/M03 Q1020=', np.nan]},
+                        index=pd.Index(['2019-01-01T00:00:00', '2019-01-01T01:00:00', '2019-01-01T02:00:00'],
+                                       name='DATE'))
+
+
+def test_fields_are_parsed_at_their_offsets():
+    chars = as_bytes(pd.Series(['+0250,1', '-0015,1', 'abc', np.nan]), 7)
+    assert np.allclose(parse_int(chars, 0, 5, signed=True), [250, -15, np.nan, np.nan], equal_nan=True)
+
+
+def test_decode():
+    decoded = IsdDecoder().decode(raw())
+    assert list(decoded.columns) == IsdDecoder.columns
+    assert decoded.index.equals(raw().index)
+    # 1.5 m/s is 2 kt; missing speeds stay missing
+    assert np.allclose(decoded['speed'], [2, 0, np.nan], equal_nan=True)
+    assert np.allclose(decoded['visibility'], [4000, np.nan, 10000], equal_nan=True)
+    assert np.allclose(decoded['phenomenon'], [10, np.nan, 45], equal_nan=True)
+    assert np.allclose(decoded['coverage'], [7, np.nan, np.nan], equal_nan=True)
+    # Ceilings in feet, only up to 1599 m
+    assert np.allclose(decoded['ceiling'], [450 * 3.28084, np.nan, np.nan], equal_nan=True)
+    assert decoded['cavok'].tolist()[:2] == ['N', 'Y'] and pd.isna(decoded['cavok'].iloc[2])
+    assert np.allclose(decoded['temperature'], [25, -1.5, np.nan], equal_nan=True)
+    assert np.allclose(decoded['dew'], [18, -3, np.nan], equal_nan=True)
+    assert np.allclose(decoded['slp'], [1017, 1020, np.nan], equal_nan=True)
+    rh = 100 * np.exp(17.625 * 18 / (243.04 + 18)) / np.exp(17.625 * 25 / (243.04 + 25))
+    assert np.isclose(decoded['rh'].iloc[0], rh) and np.isnan(decoded['rh'].iloc[2])
+
+
+def test_calm_winds_have_no_direction():
+    decoded = IsdDecoder().decode(raw(), ['direction', 'speed'])
+    assert list(decoded.columns) == ['direction', 'speed']
+    assert np.allclose(decoded['direction'], [310, np.nan, 90], equal_nan=True)
+
+
+def test_cleaning_rules():
+    decoder = IsdDecoder(missing_speed=0, visibility_cap=5000, ceiling_cutoff=99998, slp_limits=(1000, 1018))
+    assert decoder.custom_rules and not IsdDecoder().custom_rules
+    decoded = decoder.decode(raw())
+    assert np.allclose(decoded['speed'], [2, 0, 0])
+    assert np.allclose(decoded['visibility'], [4000, np.nan, 5000], equal_nan=True)
+    assert np.allclose(decoded['ceiling'], [450 * 3.28084, 22000 * 3.28084, np.nan], equal_nan=True)
+    assert np.allclose(decoded['slp'], [1017, np.nan, np.nan], equal_nan=True)
+    with pytest.raises(ValueError):
+        IsdDecoder(calm_speed=0)
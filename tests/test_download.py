@@ -0,0 +1,117 @@
+import datetime
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from d01_data.download import DownloadError, IsdDownloader
+from d01_data.get_data import GetIsdData
+
+CONTENT = b''.join(f'"2019-01-01T{hour:02}:00:00","FM-15","090,1,N,0051,1"\n'.encode() for hour in range(24)) * 50
+ETAG = '"isd-2019"'
+
+
+class IsdHandler(BaseHTTPRequestHandler):
+    """
+    Serves CONTENT at /2019/station.csv with an ETag, answering Range and If-None-Match requests;
+    every other path is missing
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.path != '/2019/station.csv':
+            self.reply(404, b'not found')
+        elif self.headers.get('If-None-Match') == ETAG:
+            self.reply(304, b'')
+        elif self.headers.get('Range'):
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+            self.reply(206, CONTENT[start:], {'Content-Range': f'bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}'})
+        else:
+            self.reply(200, CONTENT)
+
+    def reply(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('ETag', ETAG)
+        for field, value in (headers or {}).items():
+            self.send_header(field, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), IsdHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def downloader(server):
+    return IsdDownloader(f'http://127.0.0.1:{server.server_port}', workers=2, retries=2, backoff=0)
+
+
+def test_download(downloader, tmp_path):
+    filename = str(tmp_path / '2019.csv')
+    assert downloader.fetch(downloader.url(2019, 'station'), filename) == 'downloaded'
+    assert open(filename, 'rb').read() == CONTENT
+    assert json.load(open(f'{filename}.meta'))['etag'] == ETAG
+    assert downloader.fetch(downloader.url(2019, 'station'), filename) == 'skipped'
+
+
+def test_partial_download_is_resumed(downloader, server, tmp_path):
+    filename = str(tmp_path / '2019.csv')
+    with open(f'{filename}.part', 'wb') as file:
+        file.write(CONTENT[:1000])
+    with open(f'{filename}.meta', 'w') as file:
+        json.dump({'etag': ETAG, 'last_modified': None}, file)
+    assert downloader.fetch(downloader.url(2019, 'station'), filename) == 'resumed'
+    assert open(filename, 'rb').read() == CONTENT
+    headers = server.requests[-1][1]
+    assert headers['Range'] == 'bytes=1000-' and headers['If-Range'] == ETAG
+
+
+def test_unchanged_file_is_not_downloaded_again(downloader, server, tmp_path):
+    filename = str(tmp_path / '2019.csv')
+    downloader.fetch(downloader.url(2019, 'station'), filename)
+    with open(filename, 'ab') as file:
+        file.write(b'local')
+    assert downloader.fetch(downloader.url(2019, 'station'), filename, revalidate=True) == 'not modified'
+    assert server.requests[-1][1]['If-None-Match'] == ETAG
+    assert open(filename, 'rb').read().endswith(b'local')
+
+
+def test_missing_file_is_not_retried(downloader, server, tmp_path):
+    with pytest.raises(DownloadError) as error:
+        downloader.fetch(downloader.url(2018, 'station'), str(tmp_path / '2018.csv'))
+    assert error.value.code == 404
+    assert len(server.requests) == 1
+    results = downloader.download([(downloader.url(2017, 'station'), str(tmp_path / '2017.csv'), False)])
+    assert isinstance(results[str(tmp_path / '2017.csv')], DownloadError)
+
+
+class ActiveStation:
+    # Catalog of a station reporting up to now
+
+    def lookup(self, icao):
+        return {'code': 'station'}
+
+    def years(self, icao, start_year, end_year):
+        return range(start_year, end_year)
+
+
+def test_last_year_is_revalidated():
+    jobs = GetIsdData('TEST', IsdDownloader('http://127.0.0.1'), ActiveStation()).download_jobs()
+    last_year = datetime.datetime.today().year - 1
+    assert [filename for _, filename, revalidate in jobs if revalidate] == [f'data/01_raw/TEST/{last_year}.csv']
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from d01_data.decode_isd import IsdDecoder
+from d01_data.get_data import GetIsdData
+from d01_data.validation import DataValidator
+
+
+@pytest.fixture
+def station(tmp_path, monkeypatch):
+    """
+    Two raw yearly files of a station, with synoptic reports mixed with the METAR and a group never decoded
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data' / '01_raw' / 'TEST').mkdir(parents=True)
+    for year in [2018, 2019]:
+        dates = pd.date_range(f'{year}-01-01', periods=100, freq='H')
+        raw = pd.DataFrame({'DATE': dates.strftime('%Y-%m-%dT%H:%M:%S'),
+                            'REPORT_TYPE': ['FM-15', 'FM-12'] * 50,
+                            'WND': '090,1,N,0051,1',
+                            'CIG': '22000,1,9,Y',
+                            'VIS': '010000,1,N,1',
+                            'TMP': '+0250,1',
+                            'DEW': '+0180,1',
+                            'AA1': '01,0000,9,1',
+                            'REM': 'MET059METAR TEST 010000Z 09010KT CAVOK 25/18 Q1017='})
+        raw.to_csv(tmp_path / 'data' / '01_raw' / 'TEST' / f'{year}.csv', index=False)
+    return GetIsdData('TEST')
+
+
+def test_groups():
+    assert IsdDecoder().groups(['speed', 'direction', 'rh', 'cavok']) == ['WND', 'TMP', 'DEW', 'CIG']
+
+
+def test_stream_data_yields_one_year_at_a_time(station):
+    years = list(station.stream_data(columns=['speed'], chunksize=7))
+    assert [list(data.columns) for data in years] == [['speed'], ['speed']]
+    # Only the METAR observations are kept
+    assert [len(data) for data in years] == [50, 50]
+    assert [data.index.year.unique().tolist() for data in years] == [[2018], [2019]]
+    assert (years[0]['speed'] == 9).all()
+    # Only complete years are cached
+    assert station.extracted_years == [2018, 2019] and station.cached_years == []
+    assert not (station.cache.path / '2018').exists()
+
+
+def test_load_processed_caches_the_years(station):
+    data = station.load_processed()
+    assert len(data) == 100 and set(data.columns) >= {'speed', 'slp'}
+    # Groups absent from the files (MW1, GA1) are missing
+    assert data['phenomenon'].isna().all()
+    again = station.load_processed()
+    assert station.cached_years == [2018, 2019]
+    assert np.allclose(again['slp'], 1017)
+
+
+def test_raw_archive_extracts_the_same_data(station):
+    expected = station.load_processed()
+    archived = GetIsdData('TEST', archive=True)
+    archived.cache.path = archived.cache.path.parent / 'archived'
+    pd.testing.assert_frame_equal(archived.load_processed(), expected)
+    assert sorted(path.name for path in archived.archive.path.iterdir()) == ['2018', '2019']
+    # Stale years are converted again
+    assert archived.archive.load(2018, 'another hash') is None
+
+    # Custom rules are extracted from the archive and never cached
+    custom = GetIsdData('TEST', decoder=IsdDecoder(slp_limits=(960, 1000)), archive=True)
+    data = pd.concat(list(custom.stream_data()))
+    assert custom.cached_years == [] and data['slp'].isna().all()
+    assert data['temperature'].equals(expected['temperature'])
+
+
+def test_validation_report_is_stored(station):
+    station.load_processed()
+    validated = GetIsdData('TEST', validator=DataValidator(action='drop'))
+    data = validated.load_processed()
+    # The cache keeps the data before the validation
+    assert validated.cached_years == [2018, 2019]
+    assert len(data) == 100
+    report = pd.read_csv(validated.cache.path / 'quality.csv', index_col='year')
+    assert report['observations'].tolist() == [50, 50]
+    assert report['invalid'].tolist() == [0, 0]
@@ -0,0 +1,40 @@
+import subprocess
+import sys
+from pathlib import Path
+
+src = Path(__file__).parent.parent / 'src'
+
+
+def modules_loaded(code):
+    # A new interpreter, as the test session has already imported everything;
+    # the modules are listed on the last line, after anything the code printed
+    code = f'import sys\n{code}\nprint()\nprint(" ".join(sys.modules))'
+    output = subprocess.run([sys.executable, '-c', code], cwd=src, capture_output=True, text=True, check=True).stdout
+    return set(output.splitlines()[-1].split())
+
+
+def test_building_specs_does_not_load_matplotlib():
+    loaded = modules_loaded('import d01_data.get_data, d02_processing.yearly_aggregates, d03_visualisation.render')
+    assert 'pandas' in loaded
+    assert 'matplotlib' not in loaded and 'seaborn' not in loaded
+
+
+def test_help_does_not_load_pandas():
+    loaded = modules_loaded('import runpy\n'
+                            'sys.argv = ["run.py", "--help"]\n'
+                            'try:\n'
+                            '    runpy.run_path("run.py", run_name="__main__")\n'
+                            'except SystemExit:\n'
+                            '    pass')
+    assert 'argparse' in loaded
+    assert 'pandas' not in loaded and 'numpy' not in loaded
+
+
+def test_figures_as_data_do_not_load_matplotlib(tmp_path):
+    filename = tmp_path / 'heatmap.json'
+    loaded = modules_loaded('import pandas as pd\n'
+                            'from d03_visualisation.render import PlotSpec, render_all\n'
+                            f'spec = PlotSpec("heatmap", pd.DataFrame([[1]]), r"{filename}", "", {{}})\n'
+                            'render_all([spec], workers=2)')
+    assert filename.exists()
+    assert 'matplotlib' not in loaded
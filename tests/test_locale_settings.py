@@ -0,0 +1,12 @@
+import locale
+
+from d00_utils.locale_settings import configure_locale
+
+
+def test_configure_locale_tries_each_name():
+    current = locale.setlocale(locale.LC_ALL)
+    try:
+        assert configure_locale(['xx_XX.UTF-8', 'C']) == 'C'
+        assert configure_locale(['xx_XX.UTF-8']) is None
+    finally:
+        locale.setlocale(locale.LC_ALL, current)
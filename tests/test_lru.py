@@ -0,0 +1,25 @@
+import numpy as np
+
+from d00_utils.lru import SizedLRU, size_of
+
+
+def test_evicts_the_least_recently_used_by_size():
+    cache = SizedLRU(100)
+    cache.put('a', b'a' * 40)
+    cache.put('b', b'b' * 40)
+    assert cache.get('a') == b'a' * 40
+    # 'b' is the least recently used, so it makes room for 'c'
+    cache.put('c', b'c' * 40)
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.bytes == 80
+    # Values larger than the cache are returned but not kept
+    assert cache.put('d', b'd' * 200) == b'd' * 200
+    assert 'd' not in cache
+    cache.put('a', b'a' * 10)
+    assert cache.stats() == {'items': 2, 'bytes': 50, 'max_bytes': 100, 'hits': 1, 'misses': 0, 'evictions': 1}
+    assert cache.get('b') is None and cache.misses == 1
+
+
+def test_size_of():
+    assert size_of(np.zeros(10)) == 80
+    assert size_of({'a': b'12', 'b': [np.zeros(2), b'3']}) == 2 + 16 + 1
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from d01_data.decode_isd import IsdDecoder, MetarParser
+
+messages = ['METAR SBGR 010000Z 31003KT CAVOK 25/19 Q1017=',
+            'METAR KJFK 010051Z 31010G25KT 280V350 10SM R04R/1200FT R22L/0800FT -SHRA BR FEW010 SCT025CB BKN040 '
+            'BKN080 OVC120 OVC250 10/05 A2992',
+            'METAR SBGR 150000Z 11005KT 8000 SCT005 BKN010 OVC020 16/16 Q1012;',
+            'METAR UUEE 010000Z 27008G13MPS 0800 R06L/0550 +TSRA FG VV002 05/05 Q0998 TEMPO 0300 FG=',
+            'METAR SBGR 021100Z 07009KT 6000 NSC 17/16 Q1017 RMK Q1020 FG=']
+
+
+def test_parse():
+    parsed = MetarParser(messages).parse()
+    assert list(parsed) == MetarParser.columns
+    # A groups are in inHg; remarks and trends are not read
+    assert np.allclose(parsed['qnh'], [1017, 1013.2, 1012, 998, 1017])
+    # Gusts in m/s are converted to kt
+    assert np.allclose(parsed['gust'], [np.nan, 25, np.nan, 25, np.nan], equal_nan=True)
+    assert np.allclose(parsed['wind_variable_from'], [np.nan, 280, np.nan, np.nan, np.nan], equal_nan=True)
+    assert np.allclose(parsed['wind_variable_to'], [np.nan, 350, np.nan, np.nan, np.nan], equal_nan=True)
+    # The lowest RVR of the message
+    assert np.allclose(parsed['rvr'], [np.nan, 800, np.nan, 550, np.nan], equal_nan=True)
+    assert pd.isna(parsed['weather'][[0, 2, 4]]).all()
+    assert list(parsed['weather'][[1, 3]]) == ['-SHRA BR', '+TSRA FG']
+
+
+def test_slp_is_the_metar_qnh():
+    raw = pd.DataFrame({'REM': messages + ['METAR SBGR 150000Z 11005KT 8000 SCT005 16/16 Q10123;',
+                                           'METAR SBGR 131600Z 28010KT 9999 BKN040 FEW050TCU 30/200Q1009=']})
+    decoded = IsdDecoder().decode(raw, ['slp', 'qnh'])
+    assert np.allclose(decoded['slp'], decoded['qnh'], equal_nan=True)
+    # Malformed pressure groups are missing
+    assert np.allclose(decoded['slp'], [1017, 1013.2, 1012, 998, 1017, np.nan, np.nan], equal_nan=True)
+    limited = IsdDecoder(slp_limits=(1015, 1040)).decode(raw, ['slp', 'qnh'])
+    assert np.isnan(limited['slp'][1]) and limited['qnh'][1] == decoded['qnh'][1]
+
+
+def test_clouds():
+    clouds = MetarParser(messages).clouds()
+    assert [clouds[f'cloud_amount_{layer}'][1] for layer in range(1, MetarParser.max_layers + 1)] == \
+           ['FEW', 'SCT', 'BKN', 'BKN', 'OVC', 'OVC']
+    assert clouds['cloud_height_6'][1] == 25000
+    assert np.allclose(clouds['cloud_height_1'], [np.nan, 1000, 500, 200, np.nan], equal_nan=True)
+    assert clouds['cloud_type_2'][1] == 'CB' and pd.isna(clouds['cloud_type_1'][1])
+    assert clouds['cloud_amount_1'][3] == 'VV'
+
+
+def test_metar_columns_are_opt_in():
+    raw = pd.DataFrame({'REM': messages})
+    assert 'qnh' not in IsdDecoder.columns
+    decoded = IsdDecoder().decode(raw, ['gust', 'cloud_amount_1'])
+    assert list(decoded.columns) == ['gust', 'cloud_amount_1']
+    assert decoded['cloud_amount_1'].tolist()[1:4] == ['FEW', 'SCT', 'VV']
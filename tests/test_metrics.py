@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from d00_utils.metrics import RunMetrics
+
+
+def test_stages_and_counters(tmp_path):
+    metrics = RunMetrics()
+    with metrics.stage('extract', year=2020) as stage:
+        stage['rows'] = 10
+    metrics.count('bytes_read', 100)
+    metrics.count('bytes_read', 50)
+    metrics.count('cache_hits')
+
+    @metrics.instrumented('plot')
+    def plot(value):
+        return value * 2
+
+    assert plot(2) == 4
+    with pytest.raises(ValueError):
+        with metrics.stage('failing'):
+            raise ValueError
+    stages = metrics.to_dict()['stages']
+    assert [stage['stage'] for stage in stages] == ['extract', 'plot', 'failing']
+    assert stages[0]['year'] == 2020 and stages[0]['rows'] == 10 and stages[0]['seconds'] >= 0
+
+    metrics.write(tmp_path / 'metrics' / 'run.json', started='today')
+    with open(tmp_path / 'metrics' / 'run.json') as file:
+        written = json.load(file)
+    assert written['started'] == 'today'
+    assert written['counters'] == {'bytes_read': 150, 'cache_hits': 1}
+
+    metrics.reset()
+    assert metrics.to_dict() == {'stages': [], 'counters': {}}
+
+
+def test_profiles_are_dumped_for_the_outer_stages(tmp_path, monkeypatch):
+    monkeypatch.setenv('ISD_PROFILE', str(tmp_path))
+    metrics = RunMetrics()
+    with metrics.stage('outer'):
+        with metrics.stage('inner'):
+            sum(range(1000))
+    assert [path.name.split('-')[0] for path in tmp_path.glob('*.prof')] == ['outer']
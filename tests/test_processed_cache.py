@@ -0,0 +1,40 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from d01_data.processed_cache import ProcessedCache
+
+
+def extracted():
+    index = pd.date_range('2019-01-01', periods=4, freq='H', name='DATE')
+    return pd.DataFrame({'speed': [0.0, 5.0, np.nan, 12.0],
+                         'phenomenon': ['BR', None, 'FG', None]}, index=index)
+
+
+def test_year_is_loaded_back_for_the_same_raw_file(tmp_path):
+    cache = ProcessedCache('TEST', tmp_path)
+    data = extracted()
+    cache.store(2019, 'hash', data)
+    loaded = cache.load(2019, 'hash')
+    assert loaded.index.equals(data.index)
+    assert np.allclose(loaded['speed'], data['speed'], equal_nan=True)
+    assert loaded['phenomenon'].tolist()[::2] == ['BR', 'FG']
+    assert loaded['phenomenon'].isna().tolist() == [False, True, False, True]
+    # Nothing is left behind by the atomic write
+    assert sorted(path.name for path in (tmp_path / 'TEST').iterdir()) == ['2019']
+
+
+def test_stale_or_missing_years_are_not_loaded(tmp_path, monkeypatch):
+    cache = ProcessedCache('TEST', tmp_path)
+    cache.store(2019, 'hash', extracted())
+    assert cache.load(2019, 'other hash') is None
+    assert cache.load(2018, 'hash') is None
+    monkeypatch.setattr(ProcessedCache, 'version', ProcessedCache.version + 1)
+    assert cache.load(2019, 'hash') is None
+
+
+def test_file_hash(tmp_path):
+    raw = tmp_path / '2019.csv'
+    raw.write_bytes(b'DATE,WND\n' * 100000)
+    assert ProcessedCache.file_hash(raw, block_size=4096) == hashlib.sha1(raw.read_bytes()).hexdigest()
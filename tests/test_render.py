@@ -0,0 +1,84 @@
+import json
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from d02_processing.windrose_cube import WindRoseCube
+from d02_processing.yearly_aggregates import YearlyAggregates
+from d03_visualisation.manifest import BuildManifest
+from d03_visualisation.plot_climatology import Climatology
+from d03_visualisation.render import PlotSpec, render_all
+
+
+def heatmap(tmp_path, name):
+    return PlotSpec('heatmap', pd.DataFrame([[1, 2], [3, 4]]), str(tmp_path / name), 'Heatmap',
+                    {'xticklabels': ['a', 'b'], 'xlabel': 'x', 'ylabel': 'y'})
+
+
+def test_render_all_in_a_pool(tmp_path):
+    specs = [heatmap(tmp_path, 'figures/first.png'), heatmap(tmp_path, 'figures/second.png')]
+    assert render_all(specs, workers=2) == [spec.filename for spec in specs]
+    for spec in specs:
+        with open(spec.filename, 'rb') as file:
+            assert file.read(4) == b'\x89PNG'
+
+
+def test_render_all_in_this_process(tmp_path):
+    spec = heatmap(tmp_path, 'heatmap.png')
+    assert render_all([spec], workers=1) == [spec.filename]
+    assert (tmp_path / 'heatmap.png').exists()
+
+
+def test_manifest_skips_unchanged_figures(tmp_path):
+    manifest = BuildManifest(tmp_path / 'manifest.json')
+    spec = heatmap(tmp_path, 'heatmap.png')
+    assert render_all([spec], workers=1, manifest=manifest) == [spec.filename]
+    # A new manifest read from disk knows the figure is up to date
+    assert render_all([spec], workers=1, manifest=BuildManifest(tmp_path / 'manifest.json')) == []
+
+    changed = spec._replace(data=spec.data + 1)
+    assert render_all([changed], workers=1, manifest=manifest) == [spec.filename]
+    (tmp_path / 'heatmap.png').unlink()
+    assert render_all([changed], workers=1, manifest=manifest) == [spec.filename]
+
+
+def test_render_box_plots_from_statistics(tmp_path):
+    index = pd.date_range('2020-01-01', '2020-12-31 23:00', freq='H')
+    variables = pd.DataFrame({variable: np.nan for variable in YearlyAggregates.grids}, index=index)
+    variables['slp'] = np.arange(len(index)) % 40 + 990.0
+    winds = pd.DataFrame({'direction': np.nan, 'speed': np.nan}, index=index)
+    aggregates = YearlyAggregates.compute(winds, variables, pd.Series(None, index=index, dtype=object)).climatology()
+    spec = PlotSpec('bxp', aggregates.boxplot_table('slp'), str(tmp_path / 'qnh.png'), 'QNH',
+                    {'labels': list('JFMAMJJASOND'), 'xlabel': 'Mês', 'ylabel': 'QNH (hPa)'})
+    assert render_all([spec], workers=1) == [spec.filename]
+    assert (tmp_path / 'qnh.png').exists()
+
+
+def test_windrose_panels(tmp_path):
+    index = pd.date_range('2019-01-01', periods=24 * 60, freq='H', name='DATE')
+    rng = np.random.default_rng(7)
+    cube = WindRoseCube(pd.DataFrame({'direction': rng.integers(1, 37, len(index)) * 10.0,
+                                      'speed': rng.integers(1, 35, len(index)).astype(float)}, index=index))
+    roses = {f'{hour:02}00 UTC': cube.rose(hours=[hour]) for hour in range(5)}
+    spec = Climatology.windrose_grid_spec(roses, str(tmp_path / 'roses.svg'), 'Roses', ncols=3)
+    assert list(dict.fromkeys(spec.data.index.get_level_values('panel'))) == list(roses)
+    assert render_all([spec], workers=1) == [spec.filename]
+    assert (tmp_path / 'roses.svg').read_text().startswith('<?xml')
+
+
+def test_figures_as_data(tmp_path):
+    specs = [heatmap(tmp_path, 'first.json'), heatmap(tmp_path, 'second.json')]
+    assert render_all(specs, workers=2) == [spec.filename for spec in specs]
+    with open(specs[0].filename) as file:
+        content = json.load(file)
+    assert content['kind'] == 'heatmap' and content['title'] == 'Heatmap'
+    assert content['data']['data'] == [[1, 2], [3, 4]]
+
+
+def test_figures_rendered_in_process_use_agg(tmp_path):
+    matplotlib.use('svg', force=True)
+    spec = heatmap(tmp_path, 'heatmap.png')
+    assert render_all([spec], workers=1) == [spec.filename]
+    assert matplotlib.get_backend().lower() == 'agg'
+    assert (tmp_path / 'heatmap.png').read_bytes()[:4] == b'\x89PNG'
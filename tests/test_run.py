@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+import run
+
+header = 'CODE,COUNTRY,ICAO,LAT,LON,ELEV(M),BEGIN,END\n'
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    (tmp_path / 'data' / '01_raw').mkdir(parents=True)
+    (tmp_path / 'data' / '01_raw' / 'isd_all_stations.csv').write_text(
+        header +
+        '83075099999,BR,SBGR,-23.432,-046.470,+0749.5,20050101,20200808\n'
+        '83780099999,BR,SBSP,-23.627,-046.655,+0801.9,19310101,20200808\n'
+        '83721099999,BR,SBKP,-23.007,-047.134,+0661.0,19730101,20200808\n'
+        '72503014732,US,KLGA,+40.779,-073.880,+0003.4,19730101,20200808\n')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def fake_process_station(icao, *args):
+    status = 'failed' if icao == 'SBSP' else 'ok'
+    return {'icao': icao, 'status': status, 'rows': 1, 'figures': 0, 'seconds': 0, 'error': ''}
+
+
+def test_stations_from_arguments_file_and_country(root, monkeypatch):
+    (root / 'stations.txt').write_text('sbkp  # Campinas\n\n# comment only\nSBGR\n')
+    processed = []
+    monkeypatch.setattr(run, 'process_station', lambda icao, *args: processed.append(icao) or
+                        fake_process_station(icao))
+
+    status = run.main(['sbgr', '--file', str(root / 'stations.txt'), '--country', 'br',
+                       '--root', str(root), '--workers', '1'])
+
+    assert status == 1
+    assert processed == ['SBGR', 'SBKP', 'SBSP']
+
+
+def test_unknown_stations_are_not_processed(root, monkeypatch, capsys):
+    processed = []
+    monkeypatch.setattr(run, 'process_station', lambda icao, *args: processed.append(icao) or
+                        fake_process_station(icao))
+    assert run.main(['KLGA', 'ZZZZ', '--root', str(root), '--workers', '1']) == 1
+    assert processed == ['KLGA']
+    assert 'ZZZZ: failed, 0 rows, 0 figures, 0.0 s not an ISD station' in capsys.readouterr().out
+
+
+def test_options_reach_the_stations(root, monkeypatch):
+    calls = []
+    monkeypatch.setattr(run, 'process_station', lambda icao, *args: calls.append((icao,) + args) or
+                        fake_process_station(icao))
+    assert run.main(['SBGR', '--offline', '--render-workers', '2', '--root', str(root), '--workers', '1']) == 0
+    assert calls == [('SBGR', 2, True, True, None, False, 'png', False, None)]
+    assert run.main(['SBGR', '--skip-figures', '--raw-archive', '--figure-format', 'svg', '--panels',
+                     '--validate', 'mask', '--root', str(root), '--workers', '1']) == 0
+    assert calls[-1] == ('SBGR', 1, False, False, None, True, 'svg', True, 'mask')
+
+
+def test_compare_the_stations_processed(root, monkeypatch):
+    (root / 'runways.csv').write_text('icao,runway,heading\nSBGR,09L,94\nSBGR,27R,274\nSBKP,15,\n')
+    compared, station_runways = [], {}
+    monkeypatch.setattr(run, 'process_station', lambda icao, *args: station_runways.update({icao: args[3]}) or
+                        fake_process_station(icao))
+    monkeypatch.setattr(run, 'compare_stations', lambda *args: compared.append(args))
+    run.main(['SBGR', 'SBSP', 'SBKP', '--compare', 'sp', '--runways', str(root / 'runways.csv'),
+              '--root', str(root), '--workers', '1'])
+    runways = {'SBGR': {'09L': 94, '27R': 274}, 'SBKP': {'15': 150}}
+    assert station_runways == {'SBGR': runways['SBGR'], 'SBSP': None, 'SBKP': runways['SBKP']}
+    assert compared == [('sp', ['SBGR', 'SBKP'], runways, 1)]
+
+
+def test_metrics_add_up_the_counters_of_the_stations(root, monkeypatch):
+    def process_station(icao, *args):
+        result = fake_process_station(icao)
+        result['metrics'] = {'stages': [{'stage': 'extract', 'seconds': 1}], 'counters': {'bytes_read': 10}}
+        return result
+
+    monkeypatch.setattr(run, 'process_station', process_station)
+    run.main(['SBGR', 'SBKP', '--metrics', 'metrics.json', '--root', str(root), '--workers', '1'])
+
+    with open(root / 'metrics.json') as file:
+        written = json.load(file)
+    assert written['counters'] == {'bytes_read': 20}
+    assert [station['icao'] for station in written['stations']] == ['SBGR', 'SBKP']
+    assert written['stations'][0]['metrics']['stages'] == [{'stage': 'extract', 'seconds': 1}]
+
+
+def test_relative_paths_are_taken_from_the_working_directory(root, tmp_path_factory, monkeypatch):
+    work = tmp_path_factory.mktemp('work')
+    (work / 'stations.txt').write_text('ZZZZ  # not an ISD station\n')
+    (work / 'runways.csv').write_text('icao,runway\nZZZZ,09\n')
+    monkeypatch.chdir(work)
+
+    run.main(['--file', 'stations.txt', '--runways', 'runways.csv', '--metrics', 'metrics.json',
+              '--root', str(root), '--workers', '1'])
+
+    with open(work / 'metrics.json') as file:
+        stations = json.load(file)['stations']
+    assert [(station['icao'], station['error']) for station in stations] == [('ZZZZ', 'not an ISD station')]
+
+
+def crashing_process_station(icao, *args):
+    if icao == 'SBSP':
+        raise RuntimeError('worker crashed')
+    return fake_process_station(icao)
+
+
+def test_a_crashing_station_does_not_lose_the_batch(root, monkeypatch):
+    # The pool workers are forked, so they run the patched function
+    monkeypatch.setattr(run, 'process_station', crashing_process_station)
+
+    status = run.main(['SBGR', 'SBSP', 'SBKP', '--metrics', 'metrics.json', '--root', str(root),
+                       '--workers', '2', '--skip-figures'])
+
+    with open(root / 'metrics.json') as file:
+        stations = json.load(file)['stations']
+    assert status == 1
+    assert [(station['icao'], station['status'], station['error']) for station in stations] == \
+           [('SBGR', 'ok', ''), ('SBSP', 'failed', 'RuntimeError: worker crashed'), ('SBKP', 'ok', '')]
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from d01_data.schema import apply_schema
+from d02_processing.runway_usability import RunwayUsability
+
+
+def winds(direction, speed):
+    index = pd.date_range('2020-01-01', periods=len(speed), freq='H', name='DATE')
+    return apply_schema(pd.DataFrame({'direction': np.array(direction, dtype=float),
+                                      'speed': np.array(speed, dtype=float)}, index=index))
+
+
+def test_runway_headings():
+    assert RunwayUsability.runway_headings(['09L', '27R', '36', '18']) == {'09L': 90, '27R': 270, '36': 0, '18': 180}
+
+
+def test_usability_matches_the_observations():
+    rng = np.random.default_rng(5)
+    data = winds(rng.integers(0, 37, 3000) * 10.0, rng.integers(1, 40, 3000).astype(float))
+    runways = {'09': 90, '27': 270, '15': 150}
+    usability = RunwayUsability.compute(data)
+    table = usability.usability(runways, tailwind_limit=5, by=('month',))
+    components = usability.observation_components(data, runways)
+    month = data.index.month
+    for limit in RunwayUsability.crosswind_limits:
+        usable = pd.DataFrame({runway: (components[f'crosswind_{runway}'] <= limit) &
+                                       (-components[f'headwind_{runway}'] <= 5) for runway in runways})
+        for runway in runways:
+            expected = usable[runway].groupby(month).mean() * 100
+            assert np.allclose(table.loc[limit, runway].loc[expected.index], expected)
+        expected = usable.any(axis=1).groupby(month).mean() * 100
+        assert np.allclose(table.loc[limit, 'usability'].loc[expected.index], expected)
+        assert (table.loc[limit, 'observations'].loc[expected.index] == month.value_counts().sort_index()).all()
+
+
+def test_calm_and_variable_winds():
+    # A 09/27 runway with: a calm, a northerly 20 kt wind, variable 5 kt and 20 kt winds and a missing wind
+    data = winds([np.nan, 0, np.nan, np.nan, np.nan], [0, 20, 5, 20, np.nan])
+    usability = RunwayUsability.compute(data).usability({'09': 90, '27': 270}, crosswind_limits=[10], by=())
+    row = usability.iloc[0]
+    assert row['observations'] == 4
+    # The calm and the slow variable wind are usable; the northerly and the fast variable wind are not
+    assert row['usability'] == row['09'] == row['27'] == 50
+    assert row['variable'] == 50
+
+    components = RunwayUsability(np.zeros((37, 61, 12, 24))).observation_components(data, {'09': 90})
+    assert components['crosswind_09'].iloc[0] == 0
+    assert np.isclose(components['crosswind_09'].iloc[1], 20)
+    assert components['crosswind_09'].iloc[2:].isna().all()
+
+
+def test_breakdowns_match():
+    rng = np.random.default_rng(3)
+    direction = rng.integers(0, 37, 2000) * 10.0
+    speed = rng.integers(0, 30, 2000).astype(float)
+    direction[rng.random(2000) < 0.1] = np.nan
+    direction[speed == 0] = np.nan
+    runways = RunwayUsability.compute(winds(direction, speed))
+    monthly = runways.usability({'09': 90, '27': 270}, by=('month',))
+    total = runways.usability({'09': 90, '27': 270}, by=())
+    for limit in RunwayUsability.crosswind_limits:
+        weights = monthly.loc[limit, 'observations']
+        row = total.loc[limit].iloc[0]
+        assert weights.sum() == row['observations'] == 2000
+        for column in ['usability', 'variable']:
+            assert np.isclose((monthly.loc[limit, column] * weights).sum() / weights.sum(), row[column])
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from d01_data.processed_cache import ProcessedCache
+from d01_data.schema import SCHEMA, apply_schema, to_physical
+
+
+def processed():
+    index = pd.date_range('2019-01-01', periods=3, freq='H', name='DATE')
+    return pd.DataFrame({'direction': [90.0, np.nan, 360.0],
+                         'speed': [5.0, 300.0, 0.0],
+                         'phenomenon': [10.0, np.nan, 45.0],
+                         'cavok': ['N', np.nan, 'Y'],
+                         'temperature': [25.3, -1.5, np.nan],
+                         'slp': [1017.0, np.nan, 1020.0]}, index=index)
+
+
+def test_apply_schema():
+    data = apply_schema(processed())
+    assert all(data[column].dtype == SCHEMA[column] for column in data)
+    # Speeds which do not fit UInt8 are missing
+    assert data['speed'].isna().tolist() == [False, True, False]
+    assert data['phenomenon'].tolist()[::2] == [10, 45]
+    # Temperatures are kept in tenths of degree and given back in ºC
+    assert data['temperature'].tolist()[:2] == [253, -15]
+    assert np.allclose(to_physical(data, 'temperature'), [25.3, -1.5, np.nan], equal_nan=True)
+    assert apply_schema(data).equals(data)
+
+
+def test_typed_columns_are_cached(tmp_path):
+    data = apply_schema(processed())
+    cache = ProcessedCache('TEST', tmp_path)
+    cache.store(2019, 'hash', data)
+    loaded = cache.load(2019, 'hash')
+    pd.testing.assert_frame_equal(loaded, data, check_freq=False)
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from d02_processing.yearly_aggregates import AggregateStore, YearlyAggregates
+from d04_service.products import ClimatologyProducts, Product
+from d04_service.server import ClimatologyServer, parse_numbers
+
+
+@pytest.fixture
+def products(tmp_path):
+    index = pd.date_range('2019-01-01', '2020-12-31 23:00', freq='H', name='DATE')
+    rng = np.random.default_rng(4)
+    data = pd.DataFrame({'direction': rng.integers(1, 37, len(index)) * 10.0,
+                         'speed': rng.integers(0, 30, len(index)).astype(float),
+                         'temperature': np.round(rng.normal(20, 5, len(index)), 1)}, index=index)
+
+    def prepare(rows):
+        variables = pd.DataFrame({variable: rows['temperature'] if variable == 'temperature' else np.nan
+                                  for variable in YearlyAggregates.grids}, index=rows.index)
+        return variables, pd.Series(np.where(rows.index.hour < 6, 'fog', None), index=rows.index)
+
+    AggregateStore('TEST', tmp_path).update(data, prepare)
+    return ClimatologyProducts(path=tmp_path)
+
+
+def answer(server, target):
+    return asyncio.run(server.answer('GET', target))
+
+
+def test_parse_numbers():
+    assert parse_numbers('7') == (7,)
+    assert parse_numbers('12,1,2') == (1, 2, 12)
+    assert parse_numbers('2015-2017,2020') == (2015, 2016, 2017, 2020)
+
+
+def test_products(products):
+    server = ClimatologyServer(products)
+    assert answer(server, '/') == (200, 'application/json', b'["TEST"]')
+
+    status, content_type, body = answer(server, '/test/windrose.json?month=7&hour=6')
+    assert (status, content_type) == (200, 'application/json')
+    rose = json.loads(body)
+    assert len(rose['index']) == 24 and rose['columns'][0] == 'calm'
+    assert np.isclose(np.sum(rose['data']), 100)
+    assert answer(server, '/TEST/phenomena.json')[2] == b'["fog"]'
+    matrix = pd.read_csv(pd.io.common.BytesIO(answer(server, '/TEST/phenomena/fog.csv?years=2020')[2]),
+                         index_col=0)
+    assert matrix.loc[0].tolist() == [31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+    assert matrix.loc[12].sum() == 0
+    status, content_type, body = answer(server, '/TEST/variables/temperature.png?month=1,2')
+    assert (status, content_type, body[:4]) == (200, 'image/png', b'\x89PNG')
+
+    assert answer(server, '/TEST/variables/pressure.json')[0] == 404
+    assert answer(server, '/TEST/windrose.json?years=2010')[0] == 404
+    assert answer(server, '/TEST/windrose.json?month=13')[0] == 400
+    assert answer(server, '/TEST/windrose.gif')[0] == 400
+    assert answer(server, '/TEST/rose.json')[0] == 404
+
+
+def test_updated_aggregates_are_built_again(products):
+    product = Product('TEST', 'windrose', None, None, None, None, 'json')
+    first = products.get(product)
+    assert products.cached(product) == first
+    # A batch run stores the year again
+    store = AggregateStore('TEST', products.path)
+    stat = os.stat(store.year_file(2020))
+    os.utime(store.year_file(2020), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert products.cached(product) is None
+    assert products.get(product) == first
+
+
+def test_icao_path_segment_is_validated(tmp_path):
+    products = ClimatologyProducts(path=tmp_path)
+    server = ClimatologyServer(products)
+    for path in ['/..%2F..%2Fetc/windrose', '/SBGR1/windrose', '/SB.R/windrose']:
+        with pytest.raises(LookupError):
+            server.product(path, {})
+    assert server.product('/sbgr/windrose', {}).icao == 'SBGR'
+    with pytest.raises(LookupError):
+        products.aggregates('../SBGR')
+
+
+def test_station_aggregates_are_built_once(tmp_path, monkeypatch):
+    products = ClimatologyProducts(path=tmp_path)
+    builds = []
+
+    def build_aggregates(icao):
+        builds.append(icao)
+        time.sleep(0.2)
+        store = AggregateStore(icao, tmp_path)
+        store.path.mkdir(parents=True)
+        np.savez(store.year_file(2020), empty=np.zeros(0))
+
+    monkeypatch.setattr(products, 'build_aggregates', build_aggregates)
+    monkeypatch.setattr(AggregateStore, 'window', lambda self, years: years)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(products.aggregates('SBGR'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert builds == ['SBGR']
+    assert [aggregates for aggregates, _ in results] == [[2020]] * 4
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from d01_data.stations import StationCatalog
+
+header = 'CODE,COUNTRY,ICAO,LAT,LON,ELEV(M),BEGIN,END\n'
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = tmp_path / 'isd_all_stations.csv'
+    path.write_text(header +
+                    '00701899999,,,+00.000,+000.000,+7018.0,20110309,20130730\n'
+                    '83780099999,BR,SBSP,-23.627,-046.655,+0801.9,19310101,20200808\n'
+                    '83075099999,BR,SBGR,-23.432,-046.470,+0749.5,20050101,20200808\n'
+                    '83075199999,BR,SBGR,-23.432,-046.470,+0749.5,19990101,20041231\n'
+                    '08221099999,SP,LEMD,+40.472,-003.561,+0609.6,19450101,20151231\n')
+    return StationCatalog(path, tmp_path / 'isd_stations.npy')
+
+
+def test_lookup(catalog):
+    assert catalog.lookup('LEMD') == {'icao': 'LEMD', 'code': '08221099999', 'country': 'SP',
+                                      'begin': 1945, 'end': 2015, 'lat': pytest.approx(40.472),
+                                      'lon': pytest.approx(-3.561)}
+    # The first station of the list is kept for a repeated ICAO code
+    assert catalog.lookup('SBGR')['code'] == '83075099999'
+    with pytest.raises(KeyError):
+        catalog.lookup('ZZZZ')
+
+
+def test_resolve_and_by_country(catalog):
+    assert catalog.resolve(['SBSP', 'ZZZZ', 'LEMD']) == {'SBSP': '83780099999', 'ZZZZ': None,
+                                                        'LEMD': '08221099999'}
+    assert catalog.by_country(['BR']) == ['SBGR', 'SBSP']
+
+
+def test_years(catalog):
+    assert catalog.years('LEMD', 2010, 2025) == range(2010, 2016)
+    # Stations reporting up to the last year of the list are still active
+    assert catalog.years('SBSP', 2010, 2025) == range(2010, 2025)
+    assert catalog.years('SBGR', 2000, 2025) == range(2005, 2025)
+
+
+def test_index_is_rebuilt_when_the_list_changes(catalog):
+    assert catalog.lookup('SBSP')['begin'] == 1931
+    with open(catalog.path, 'a') as file:
+        file.write('83779099999,BR,SBMT,-23.509,-046.638,+0722.0,19730101,20200808\n')
+    os.utime(catalog.path, (catalog.index_path.stat().st_mtime + 10,) * 2)
+    assert StationCatalog(catalog.path, catalog.index_path).lookup('SBMT')['code'] == '83779099999'
+
+
+def test_codes_are_never_cut(tmp_path):
+    path = tmp_path / 'isd_all_stations.csv'
+    path.write_text(header +
+                    '13009099999,SI,13009,+46.000,+015.000,+0003.0,19930101,19960118\n'
+                    '83779099999,BR,1300,-23.500,-046.600,+0803.0,19730101,20200101\n'
+                    '589740999991,TW,RCKK,+22.000,+120.000,+0010.0,20000101,20200101\n')
+    catalog = StationCatalog(path, tmp_path / 'isd_stations.npy')
+    assert catalog.lookup('13009')['code'] == '13009099999'
+    assert catalog.lookup('1300')['code'] == '83779099999'
+    assert catalog.lookup('RCKK')['code'] == '589740999991'
+    assert catalog.resolve(['13009', '1300', 'SBGR']) == {'13009': '13009099999', '1300': '83779099999',
+                                                          'SBGR': None}
+
+
+def test_lookup_searches_the_index(catalog):
+    assert catalog.lookup('SBSP')['begin'] == 1931
+    # Codes before the first, between two and after the last of the index
+    for icao in ['AAAA', 'LEMC', 'SBGS', 'ZZZZ', '']:
+        with pytest.raises(KeyError):
+            catalog.lookup(icao)
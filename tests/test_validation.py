@@ -0,0 +1,97 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import run
+from d01_data.decode_isd import IsdDecoder
+from d01_data.validation import DataValidator, Rule
+from d02_processing.yearly_aggregates import AggregateStore
+
+
+@pytest.fixture
+def station(tmp_path, monkeypatch):
+    """
+    Raw ISD file of a station with three days of hourly METAR, in a project directory of its own.
+    The observation at 12 UTC of the second day has a dew point above the temperature.
+    """
+    monkeypatch.chdir(tmp_path)
+    dates = pd.date_range('2019-03-01', periods=72, freq='H')
+    dew = ['+0180,1'] * len(dates)
+    dew[36] = '+0270,1'
+    raw = pd.DataFrame({'DATE': dates.strftime('%Y-%m-%dT%H:%M:%S'),
+                        'REPORT_TYPE': 'FM-15',
+                        'WND': '090,1,N,0051,1',
+                        'CIG': '22000,1,9,Y',
+                        'VIS': '010000,1,N,1',
+                        'TMP': '+0250,1',
+                        'DEW': dew,
+                        'MW1': '',
+                        'GA1': '',
+                        'REM': 'MET059METAR TEST 010000Z 09010KT CAVOK 25/18 Q1017='})
+    (tmp_path / 'data' / '01_raw' / 'TEST').mkdir(parents=True)
+    # Names of the phenomena codes
+    shutil.copy(Path(run.src_dir).parent / 'data' / '01_raw' / 'wx_codes.csv', tmp_path / 'data' / '01_raw')
+    raw.to_csv(tmp_path / 'data' / '01_raw' / 'TEST' / '2019.csv', index=False)
+    return 'TEST'
+
+
+def test_rules_are_evaluated_per_year():
+    data = pd.DataFrame({'temperature': [25.0, 25.0, np.nan], 'dew': [18.0, 27.0, 10.0]},
+                        index=pd.to_datetime(['2018-12-31 23:00', '2019-01-01', '2019-01-01 01:00']))
+    validator = DataValidator([Rule('dew_above_temperature', 'order', ['dew'], 'temperature')], action='mask')
+    validated, report = validator.validate(data)
+    assert validated['dew'].isna().tolist() == [False, True, False]
+    assert report['dew_above_temperature'].tolist() == [0, 1]
+    assert report['observations'].tolist() == [1, 2]
+
+
+@pytest.fixture
+def data():
+    raw = pd.DataFrame({'WND': ['090,1,N,0051,1', '090,1,N,0051,1', '090,3,N,0051,1'],
+                        'TMP': ['+0250,1', '+0250,1', '+0250,2'],
+                        'DEW': ['+0180,1', '+0270,1', '+0180,1'],
+                        'REM': ['Q1017', 'Q1017', 'Q0900']},
+                       index=pd.date_range('2019-01-01', periods=3, freq='H'))
+    return IsdDecoder().decode(raw, ['direction', 'speed', 'temperature', 'dew', 'rh', 'slp', 'direction_quality',
+                                     'speed_quality', 'temperature_quality', 'dew_quality'])
+
+
+def test_quality_flags_are_decoded(data):
+    assert data['direction_quality'].tolist() == ['1', '1', '3']
+    assert data['temperature_quality'].tolist() == ['1', '1', '2']
+
+
+def test_actions(data):
+    flagged, report = DataValidator(action='flag').validate(data)
+    broken = [DataValidator().broken_rules(flags) for flags in flagged['quality_flags']]
+    assert broken == [[], ['dew_above_temperature'],
+                      ['slp_out_of_range', 'wind_suspect', 'temperature_suspect']]
+    assert report.loc[2019, 'invalid'] == 2
+
+    masked, _ = DataValidator(action='mask').validate(data)
+    assert masked['dew'].isna().tolist() == [False, True, False]
+    # The relative humidity is derived from the dew point and the temperature
+    assert masked['rh'].isna().tolist() == [False, True, True]
+    assert masked['speed'].isna().tolist() == [False, False, True]
+
+    dropped, _ = DataValidator(action='drop').validate(data)
+    assert len(dropped) == 1
+    with pytest.raises(ValueError):
+        DataValidator(action='fix')
+
+
+def test_switching_validation_changes_stored_aggregates(station):
+    aggregates = {}
+    for validation in [None, 'flag', 'mask']:
+        result = run.process_station(station, offline=True, figure_format='json', validation=validation)
+        assert result['status'] == 'ok', result['error']
+        aggregates[validation] = AggregateStore(station).load(2019)
+    # Every change of the validation is summarised again, even with the same number of rows
+    assert len({stored.digest for stored in aggregates.values()}) == 3
+    # Masking removes the dew point above the temperature from the summaries
+    assert aggregates[None].histograms['dew'].sum() == 72
+    assert aggregates['mask'].histograms['dew'].sum() == 71
+    assert aggregates['flag'].histograms['dew'].sum() == 72
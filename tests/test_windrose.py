@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from d01_data.decode_isd import IsdDecoder
+from d01_data.schema import apply_schema
+from d02_processing.calculate_windrose import WindRose
+from d02_processing.windrose_cube import WindRoseCube
+
+
+def winds(n=500):
+    index = pd.date_range('2019-01-01', periods=n, freq='H', name='DATE')
+    rng = np.random.default_rng(6)
+    return pd.DataFrame({'direction': rng.integers(1, 37, n) * 10.0,
+                         'speed': rng.integers(1, 35, n).astype(float)}, index=index)
+
+
+def decode_winds(groups):
+    raw = pd.DataFrame({'WND': groups},
+                       index=pd.date_range('2019-01-01', periods=len(groups), freq='H').strftime('%Y-%m-%dT%H:%M:%S'))
+    data = apply_schema(IsdDecoder().decode(raw, ['direction', 'speed']))
+    data.index = pd.to_datetime(data.index)
+    return data
+
+
+def test_calm_and_variable_winds_have_no_direction():
+    data = decode_winds(['999,1,C,0000,1', '999,1,V,0031,1', '090,1,N,0051,1'])
+    assert data['direction'].isna().tolist() == [True, True, False]
+
+
+def test_rose_sums_to_100_percent():
+    # Calm winds (direction 999) and winds from every direction
+    data = decode_winds(['999,1,C,0000,1'] * 30 + [f'{direction:03},1,N,0051,1' for direction in range(0, 360, 5)])
+    rose = WindRoseCube(data).rose()
+    assert np.isclose(rose.values.sum(), 100)
+    # The calm winds are only in the calm ring, not as a bar at North
+    assert np.isclose(rose['calm'].sum(), 30 / len(data) * 100)
+    assert list(rose.columns) == ['calm'] + WindRose().speed_labels(WindRose.spd_bins, units='nós')
+    assert rose.columns[1] == '0 - 5 nós'
+
+
+def test_missing_speed_is_not_calm():
+    data = decode_winds(['999,9,9,9999,9', '999,1,C,0000,1', '090,1,N,0051,1'])
+    assert data['speed'].isna().tolist() == [True, False, False]
+    assert np.isclose(WindRoseCube(data).rose()['calm'].sum(), 1 / 3 * 100)
+
+
+def test_wedges_are_stacked():
+    import matplotlib.pyplot as plt
+
+    rose = WindRoseCube(winds()).rose()
+    fig, ax = plt.subplots(subplot_kw=dict(polar=True))
+    WindRose().draw_windrose(ax, rose)
+    # One collection of wedges per speed bin, the outer edge of the last one at the total of each direction
+    assert [collection.get_label() for collection in ax.collections] == list(rose.columns)
+    outer = [path.vertices[:, 1].max() for path in ax.collections[-1].get_paths()]
+    assert np.allclose(outer, rose.sum(axis=1))
+    assert np.isclose(ax.get_ylim()[1], rose.sum(axis=1).max())
+    plt.close(fig)
+
+
+def test_empty_rose_is_drawn():
+    import warnings
+
+    import matplotlib.pyplot as plt
+
+    # Variable winds have no direction bin and are not calm, so every bar is zero
+    data = decode_winds(['999,1,V,0031,1'] * 5)
+    rose = WindRoseCube(data).rose()
+    fig, ax = plt.subplots(subplot_kw=dict(polar=True))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        WindRose().draw_windrose(ax, rose)
+    assert ax.get_ylim()[1] > 0
+    plt.close(fig)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from d01_data.schema import apply_schema
+from d02_processing.calculate_windrose import WindRose
+from d02_processing.windrose_cube import WindRoseCube
+
+
+@pytest.fixture(scope='module')
+def data():
+    # Three years of 3-hourly winds with calm, missing and 357-360 degrees directions, and missing speeds
+    index = pd.date_range('2017-01-01', '2019-12-31 21:00', freq='3H', name='DATE')
+    rng = np.random.default_rng(1)
+    direction = rng.integers(0, 37, len(index)) * 10.0
+    direction[rng.random(len(index)) < 0.05] = 357
+    direction[rng.random(len(index)) < 0.05] = np.nan
+    speed = rng.integers(0, 40, len(index)).astype(float)
+    speed[rng.random(len(index)) < 0.1] = 0
+    speed[rng.random(len(index)) < 0.03] = np.nan
+    # Calm winds have no direction
+    direction[speed == 0] = np.nan
+    return apply_schema(pd.DataFrame({'direction': direction, 'speed': speed}, index=index))
+
+
+@pytest.fixture(scope='module')
+def cube(data):
+    return WindRoseCube(data, by_year=True)
+
+
+def compare(rose, reference):
+    assert list(rose.columns) == list(reference.columns)
+    assert np.allclose(rose.index.values, reference.index.values)
+    assert np.allclose(rose.values, reference.values)
+
+
+def test_all_time(data, cube):
+    compare(cube.rose(), WindRose().create_rosedata(data))
+
+
+@pytest.mark.parametrize('month', [1, 7, 12])
+def test_month(data, cube, month):
+    compare(cube.rose(months=[month]), WindRose().create_rosedata(data[data.index.month == month]))
+
+
+@pytest.mark.parametrize('hour', [0, 9, 21])
+def test_hour(data, cube, hour):
+    compare(cube.rose(hours=[hour]), WindRose().create_rosedata(data[data.index.hour == hour]))
+
+
+def test_years(data, cube):
+    selected = data[data.index.year.isin([2018, 2019])]
+    compare(cube.rose(years=[2018, 2019]), WindRose().create_rosedata(selected))
+    compare(cube.rose(years=[2018], months=[6], hours=[12]),
+            WindRose().create_rosedata(selected[(selected.index.year == 2018) & (selected.index.month == 6) &
+                                                (selected.index.hour == 12)]))
+
+
+def test_357_degrees_are_north(data, cube):
+    north = data[(data['direction'] == 357) & (data['speed'] > 0)]
+    assert np.isclose(WindRoseCube(north).rose().loc[0].sum(), 100)
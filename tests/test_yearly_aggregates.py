@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+from matplotlib import cbook
+
+from d02_processing.windrose_cube import WindRoseCube
+from d02_processing.yearly_aggregates import AggregateStore, YearlyAggregates
+
+
+def observations(periods=200, start='2019-01-01'):
+    index = pd.date_range(start, periods=periods, freq='H', name='DATE')
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'direction': rng.integers(0, 36, periods) * 10.0,
+                         'speed': rng.integers(0, 20, periods).astype(float),
+                         'temperature': np.round(rng.normal(20, 5, periods), 1)}, index=index)
+
+
+def prepare(rows):
+    variables = pd.DataFrame({variable: rows['temperature'] if variable == 'temperature' else np.nan
+                              for variable in YearlyAggregates.grids}, index=rows.index)
+    return variables, pd.Series([None] * len(rows), index=rows.index, dtype=object)
+
+
+def test_update_only_summarises_what_changed(tmp_path):
+    store = AggregateStore('TEST', tmp_path)
+    data = observations(250)
+    assert store.update(data.iloc[:200], prepare) == {2019: 'computed'}
+    assert store.update(data.iloc[:200], prepare) == {2019: 'current'}
+    assert store.update(data, prepare) == {2019: 'updated'}
+    assert store.load(2019).rows == 250
+
+
+def test_window_merges_the_stored_years(tmp_path):
+    store = AggregateStore('TEST', tmp_path)
+    data = observations(24 * 500, start='2019-06-01')
+    assert store.update(data, prepare) == {2019: 'computed', 2020: 'computed'}
+    window = store.window(range(2015, 2025))
+    assert list(window.years) == [2019, 2020]
+    assert window.rows == len(data)
+
+    rose = window.windrose_cube().rose()
+    assert np.allclose(rose.values, WindRoseCube(data).rose().values)
+
+    # The temperatures are on the grid, so the box plot statistics are exact
+    for box in window.climatology().boxplot_stats('temperature'):
+        reference = cbook.boxplot_stats(data.loc[data.index.month == box['label'], 'temperature'].values)[0]
+        for stat in ['mean', 'med', 'q1', 'q3', 'whislo', 'whishi']:
+            assert np.isclose(box[stat], reference[stat])
+        assert np.allclose(np.sort(box['fliers']), np.unique(reference['fliers']))
+
+
+def test_changed_values_are_summarised_again(tmp_path):
+    store = AggregateStore('TEST', tmp_path)
+    data = observations()
+    store.update(data, prepare)
+    before = store.load(2019).histograms['temperature'].copy()
+    # Same number of rows, one value masked (e.g. by the validation)
+    data.iloc[10, data.columns.get_loc('temperature')] = np.nan
+    assert store.update(data, prepare) == {2019: 'computed'}
+    assert store.load(2019).histograms['temperature'].sum() == before.sum() - 1